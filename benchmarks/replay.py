@@ -0,0 +1,189 @@
+# benchmarks/replay.py
+"""
+Прогон журнала реальных сообщений через полный путь решения бота офлайн.
+
+Каждое сообщение проходит те же шаги, что в handle_document_request:
+приветствие, кнопки меню, решение «ИИ или поиск» (classify_intent) и
+hybrid_search с фильтром нерелевантных файлов. Вызов ИИ не выполняется —
+учитывается только то, что сообщение до него дошло.
+
+Печатает долю сообщений по веткам и задержку каждой ветки (p50/p95),
+с --report пишет по каждому сообщению ветку и топ-3, а с --diff сравнивает
+их с отчётом другой версии движка.
+
+    python benchmarks/replay.py messages.log --report new.json
+    python benchmarks/replay.py messages.log --report new.json --diff old.json
+
+Журнал — текст (одно сообщение в строке) или JSONL с полем text/query/message.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_benchmarks import percentile  # noqa: E402  (готовит окружение и chdir в корень)
+
+from bot.utils.intent_classifier import BRAND_KEYWORDS, KEYWORD_CLASSES, IntentClassifier, is_greeting  # noqa: E402
+from bot.utils.search_engine import (  # noqa: E402
+    BRANCH_NOT_FOUND, SEARCH_BRANCHES, SEARCH_INDEX_FILE, SearchEngine, load_search_index,
+)
+
+# Ветки до поиска; BRANCH_NOT_FOUND в боте тоже заканчивается вызовом ИИ
+BRANCH_EMPTY = "empty"
+BRANCH_GREETING = "greeting"
+BRANCH_MENU_BUTTON = "menu_button"
+BRANCH_AI = "ai"
+REPLAY_BRANCHES = (BRANCH_EMPTY, BRANCH_GREETING, BRANCH_MENU_BUTTON, BRANCH_AI) + SEARCH_BRANCHES
+
+MENU_BUTTONS = {"📚 База документации", "🎓 Обучающие материалы", "📞 Тех. специалист"}
+MESSAGE_FIELDS = ("text", "query", "message")
+TOP_N = 3
+
+
+def load_messages(path: str) -> List[str]:
+    messages = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("{"):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    line = next((record[field] for field in MESSAGE_FIELDS if isinstance(record.get(field), str)), "")
+            messages.append(line)
+    return messages
+
+
+def replay_message(engine: SearchEngine, classifier: IntentClassifier, message: str) -> Dict[str, Any]:
+    """Ветка и топ результатов одного сообщения"""
+    text = message.strip()
+    results: List[Dict[str, Any]] = []
+    if not text:
+        branch = BRANCH_EMPTY
+    elif is_greeting(text):
+        branch = BRANCH_GREETING
+    elif text in MENU_BUTTONS:
+        branch = BRANCH_MENU_BUTTON
+    elif classifier.decide(text).use_ai:
+        branch = BRANCH_AI
+    else:
+        branch, results = engine.hybrid_search_branch(text, TOP_N)
+    return {
+        "query": text,
+        "branch": branch,
+        "top": [result.get("folder_link") or result.get("path") for result in results[:TOP_N]],
+    }
+
+
+def replay(engine: SearchEngine, messages: List[str]) -> List[Dict[str, Any]]:
+    # Свой классификатор без кэша: повторы в журнале не должны мериться как попадания
+    classifier = IntentClassifier(KEYWORD_CLASSES, BRAND_KEYWORDS, cache_size=0)
+    records = []
+    for message in messages:
+        t0 = time.perf_counter_ns()
+        record = replay_message(engine, classifier, message)
+        record["ms"] = round((time.perf_counter_ns() - t0) / 1e6, 4)
+        records.append(record)
+    return records
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    by_branch: Dict[str, List[float]] = {}
+    for record in records:
+        by_branch.setdefault(record["branch"], []).append(record["ms"])
+    summary = {}
+    for branch in REPLAY_BRANCHES:
+        latencies = sorted(by_branch.get(branch, []))
+        if not latencies:
+            continue
+        summary[branch] = {
+            "count": len(latencies),
+            "share": round(len(latencies) / len(records), 4),
+            "p50_ms": round(percentile(latencies, 50), 4),
+            "p95_ms": round(percentile(latencies, 95), 4),
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, Dict[str, float]], total: int):
+    header = f"{'ветка':<18}{'сообщений':>11}{'доля':>9}{'p50 мс':>10}{'p95 мс':>10}"
+    print(header)
+    print("-" * len(header))
+    for branch, s in summary.items():
+        print(f"{branch:<18}{s['count']:>11}{s['share']:>9.1%}{s['p50_ms']:>10.3f}{s['p95_ms']:>10.3f}")
+    print(f"Всего сообщений: {total}; после {BRANCH_NOT_FOUND} бот переходит к ИИ")
+
+
+def diff_records(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Сообщения, у которых изменились ветка или топ результатов (сопоставление по порядку)"""
+    changes = []
+    for position, (before, after) in enumerate(zip(old, new)):
+        if before["query"] != after["query"]:
+            raise ValueError(f"Отчёты построены по разным журналам: строка {position + 1}")
+        if before["branch"] != after["branch"] or before["top"] != after["top"]:
+            changes.append({"line": position + 1, "query": after["query"], "before": before, "after": after})
+    return changes
+
+
+def print_diff(changes: List[Dict[str, Any]], total: int, limit: int):
+    print(f"Изменились {len(changes)} из {total} сообщений")
+    for change in changes[:limit]:
+        before, after = change["before"], change["after"]
+        print(f"\n#{change['line']} {change['query']}")
+        if before["branch"] != after["branch"]:
+            print(f"  ветка: {before['branch']} → {after['branch']}")
+        if before["top"] != after["top"]:
+            print(f"  было:  {before['top']}")
+            print(f"  стало: {after['top']}")
+    if len(changes) > limit:
+        print(f"\n… и ещё {len(changes) - limit}")
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Прогон журнала сообщений через путь решения бота")
+    parser.add_argument("log", help="журнал сообщений (текст или JSONL)")
+    parser.add_argument("--index", default=SEARCH_INDEX_FILE, help="файл индекса (file_index.json)")
+    parser.add_argument("--report", help="записать отчёт (сводка и каждое сообщение) в JSON")
+    parser.add_argument("--diff", help="отчёт другой версии движка для сравнения топ-3")
+    parser.add_argument("--show", type=int, default=50, help="сколько изменений печатать")
+    args = parser.parse_args()
+
+    messages = load_messages(args.log)
+    engine = SearchEngine(args.index, search_index=load_search_index(args.index))
+    for message in messages[:20]:  # прогрев
+        if message.strip():
+            engine.hybrid_search(message.strip(), TOP_N)
+
+    records = replay(engine, messages)
+    summary = summarize(records)
+    print_summary(summary, len(records))
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"index": args.index, "summary": summary, "messages": records}, f, ensure_ascii=False, indent=2)
+
+    exit_code = 0
+    if args.diff:
+        other = load_report(args.diff)
+        if len(other["messages"]) != len(records):
+            print(f"⚠️ В отчётах разное число сообщений: {len(other['messages'])} и {len(records)}")
+        changes = diff_records(other["messages"], records)
+        print()
+        print_diff(changes, len(records), args.show)
+        exit_code = 1 if changes else 0
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
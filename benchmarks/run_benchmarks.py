@@ -0,0 +1,268 @@
+# benchmarks/run_benchmarks.py
+"""
+Бенчмарк поиска и маршрутизации на реальном data/cache/file_index.json.
+
+Для каждого этапа прогоняет корпус benchmarks/queries.txt и печатает
+p50/p95/p99 (мс), запросы в секунду и пик памяти (tracemalloc). С --check
+сравнивает p95 с сохранённым benchmarks/baseline.json и завершается с кодом 1,
+если этап стал медленнее больше чем на --tolerance.
+
+Миллисекунды зависят от машины, поэтому вместе с baseline записывается время
+калибровки — фиксированной работы, похожей на поиск (регулярки, словари,
+NumPy). При проверке baseline масштабируется отношением калибровки этой машины
+к калибровке машины, где он записан.
+
+В baseline записан и топ-3 hybrid_search по каждому запросу корпуса: --check
+падает и при изменении ранжирования. Если изменение намеренное, baseline
+перезаписывается вместе с ним.
+
+    python benchmarks/run_benchmarks.py                   # отчёт
+    python benchmarks/run_benchmarks.py --check           # отчёт + проверка регрессий
+    python benchmarks/run_benchmarks.py --update-baseline # записать новый baseline
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+QUERIES_FILE = os.path.join(BENCH_DIR, "queries.txt")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+
+# Модули бота проверяют эти переменные при импорте; сеть бенчмарку не нужна
+os.environ.setdefault("YANDEX_DISK_TOKEN", "benchmark")
+os.environ.setdefault("DOCS_PUBLIC_KEY", "benchmark")
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import logging  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+from bot.utils.intent_classifier import BRAND_KEYWORDS, KEYWORD_CLASSES, IntentClassifier  # noqa: E402
+from bot.utils.search_engine import SEARCH_INDEX_FILE, SearchEngine, load_search_index  # noqa: E402
+from bot.utils.synonyms import normalize_with_synonyms  # noqa: E402
+
+
+def load_queries(path: str = QUERIES_FILE) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def relevance_stage(engine: SearchEngine) -> Callable[[str], Callable[[], object]]:
+    """calculate_relevance по всем кандидатам запроса; подготовка вне замера"""
+
+    def prepare(query: str):
+        variants = [variant for variant in engine.expand_synonyms(query) if variant]
+        candidates = sorted(engine._relevance_candidates(variants)) if variants else []
+        rows = [engine.index.fields(doc_id) for doc_id in candidates]
+
+        def run():
+            for fields in rows:
+                engine.calculate_relevance(None, variants, fields)
+
+        return run
+
+    return prepare
+
+
+def build_stages(engine: SearchEngine) -> Dict[str, Callable[[str], Callable[[], object]]]:
+    """Этап -> подготовка вызова для запроса"""
+    # Без кэша разборов, иначе после прогрева мерились бы только попадания в кэш
+    classifier = IntentClassifier(KEYWORD_CLASSES, BRAND_KEYWORDS, cache_size=0)
+    return {
+        "normalize_with_synonyms": lambda q: lambda: normalize_with_synonyms(q),
+        "should_use_ai_improved": lambda q: lambda: classifier.decide(q),
+        "route_query": lambda q: lambda: engine.route_query(q),
+        "calculate_relevance": relevance_stage(engine),
+        "hybrid_search": lambda q: lambda: engine.hybrid_search(q, 3),
+    }
+
+
+CALIBRATION_KEY = "_calibration_ms"
+CALIBRATION_RUNS = 15
+TOP3_KEY = "_top3"
+
+
+def calibration_ms() -> float:
+    """Лучшее время фиксированной работы (мс): мерило скорости машины, минимум меньше всего шумит"""
+    word_re = re.compile(r"[0-9a-zа-яё]+")
+    texts = [f"HDL-MPL{i}.46 панель управления knx модуль {i % 97} реле dali шлюз" for i in range(2000)]
+    matrix = np.random.default_rng(0).random((512, 512), dtype=np.float32)
+    timings = []
+    for _ in range(CALIBRATION_RUNS):
+        t0 = time.perf_counter()
+        counts: Dict[str, int] = {}
+        for text in texts:
+            for word in word_re.findall(text.lower()):
+                counts[word] = counts.get(word, 0) + 1
+        (matrix @ matrix).argmax()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return round(min(timings), 3)
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def measure(prepare: Callable[[str], Callable[[], object]], queries: List[str], iterations: int) -> Dict[str, float]:
+    calls = [prepare(query) for query in queries]
+    for call in calls:  # прогрев
+        call()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for call in calls:
+            t0 = time.perf_counter_ns()
+            call()
+            latencies.append((time.perf_counter_ns() - t0) / 1e6)
+    elapsed = time.perf_counter() - started
+
+    # Память — отдельным проходом: tracemalloc сильно замедляет вызовы
+    tracemalloc.start()
+    for call in calls:
+        call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 4),
+        "p95_ms": round(percentile(latencies, 95), 4),
+        "p99_ms": round(percentile(latencies, 99), 4),
+        "qps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def top3(engine: SearchEngine, queries: List[str]) -> Dict[str, List[str]]:
+    """Имена первых трёх результатов hybrid_search по каждому запросу"""
+    return {query: [r.get("name", "") for r in engine.hybrid_search(query, 3)] for query in queries}
+
+
+def run(index_file: str, iterations: int, stages: List[str]) -> Tuple[Dict[str, Dict[str, float]], Dict[str, List[str]]]:
+    """Замеры этапов и топ-3 по каждому запросу"""
+    queries = load_queries()
+    t0 = time.perf_counter()
+    engine = SearchEngine(index_file, search_index=load_search_index(index_file))
+    load_ms = (time.perf_counter() - t0) * 1000
+    print(f"Индекс: {index_file}, {len(engine.file_index)} файлов, загрузка {load_ms:.1f} мс; запросов: {len(queries)}")
+
+    report = {}
+    for name, prepare in build_stages(engine).items():
+        if stages and name not in stages:
+            continue
+        report[name] = measure(prepare, queries, iterations)
+    return report, top3(engine, queries)
+
+
+def print_report(report: Dict[str, Dict[str, float]]):
+    header = f"{'этап':<26}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'qps':>11}{'пик КиБ':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, r in report.items():
+        print(f"{name:<26}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['qps']:>11.1f}{r['peak_kib']:>10.1f}")
+
+
+def check_regressions(report: Dict[str, Dict[str, float]], baseline: Dict[str, Any],
+                      tolerance: float, min_delta_ms: float, scale: float = 1.0) -> List[str]:
+    """
+    Этапы, у которых p95 вырос больше чем в (1 + tolerance) раз и больше чем
+    на min_delta_ms: у этапов в микросекунды относительный шум слишком велик.
+    p95 из baseline сначала умножается на scale (поправка на скорость машины).
+    """
+    failures = []
+    for name, r in report.items():
+        base = baseline.get(name)
+        if not isinstance(base, dict):
+            continue
+        base_p95 = base["p95_ms"] * scale
+        limit = max(base_p95 * (1 + tolerance), base_p95 + min_delta_ms)
+        if r["p95_ms"] > limit:
+            failures.append(f"{name}: p95 {r['p95_ms']:.3f} мс > {limit:.3f} мс (baseline {base_p95:.3f} мс)")
+    return failures
+
+
+def check_rankings(rankings: Dict[str, List[str]], baseline: Dict[str, Any]) -> List[str]:
+    """Запросы, у которых топ-3 отличается от записанного в baseline"""
+    return [
+        f"«{query}»: {expected} -> {rankings[query]}"
+        for query, expected in baseline.get(TOP3_KEY, {}).items()
+        if query in rankings and rankings[query] != expected
+    ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска и маршрутизации")
+    parser.add_argument("--index", default=SEARCH_INDEX_FILE, help="файл индекса (file_index.json)")
+    parser.add_argument("--iterations", type=int, default=5, help="проходов по корпусу на этап")
+    parser.add_argument("--stage", action="append", default=[], help="только указанные этапы")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--check", action="store_true", help="сравнить с baseline и упасть при регрессии")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="допустимый рост p95 (0.5 = +50%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="рост p95 меньше этого не считается регрессией")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", help="записать отчёт в JSON")
+    args = parser.parse_args()
+
+    report, rankings = run(args.index, args.iterations, args.stage)
+    print_report(report)
+    calibration = calibration_ms()
+    print(f"Калибровка машины: {calibration:.3f} мс")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({CALIBRATION_KEY: calibration, **report, TOP3_KEY: rankings}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Baseline записан: {args.baseline}")
+        return 0
+
+    if args.check:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except OSError:
+            print(f"Нет baseline: {args.baseline} (запустите с --update-baseline)")
+            return 1
+        scale = 1.0
+        if baseline.get(CALIBRATION_KEY):
+            scale = calibration / baseline[CALIBRATION_KEY]
+            print(f"Поправка на машину: ×{scale:.2f} (калибровка baseline {baseline[CALIBRATION_KEY]:.3f} мс)")
+        else:
+            print("⚠️ В baseline нет калибровки: сравнение в абсолютных мс")
+        failures = check_regressions(report, baseline, args.tolerance, args.min_delta_ms, scale)
+        ranking_changes = check_rankings(rankings, baseline)
+        if failures:
+            print("❌ Регрессии производительности:")
+            for failure in failures:
+                print(f"  {failure}")
+        if ranking_changes:
+            print(f"❌ Изменился топ-3 у {len(ranking_changes)} из {len(rankings)} запросов:")
+            for change in ranking_changes:
+                print(f"  {change}")
+        if failures or ranking_changes:
+            return 1
+        print("✅ Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,10 +2,40 @@ import os
 import httpx
 import logging
 import asyncio
-from typing import Optional
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from bot.utils.answer_cache import AnswerCache, answer_key
+from bot.utils.intent_classifier import extract_brands
+from bot.utils.model_scheduler import ModelScheduler
 
 logger = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401  (httpx поддерживает HTTP/2 только с этим пакетом)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+AI_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Пул соединений с OpenRouter: таймауты (секунды) и лимиты соединений
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "30"))
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "5"))
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "20"))
+AI_MAX_KEEPALIVE = int(os.getenv("AI_MAX_KEEPALIVE", "10"))
+AI_KEEPALIVE_EXPIRY = float(os.getenv("AI_KEEPALIVE_EXPIRY", "60"))
+
+# Сколько букв недописанного ответа должно не пройти проверку, чтобы оборвать поток
+# (в начале ответа латинские названия брендов ещё могут перевешивать русский текст)
+AI_STREAM_ABORT_LETTERS = int(os.getenv("AI_STREAM_ABORT_LETTERS", "60"))
+
+# Через сколько секунд без проходящего проверку текста запрос дублируется следующей модели
+AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "4"))
+
+# Версия системного промпта: меняется вместе с промптом, чтобы кэш не отдавал старые ответы
+AI_PROMPT_VERSION = "1"
+
 class StableAIService:
     def __init__(self):
         self.request_count = 0
@@ -15,18 +45,74 @@ class StableAIService:
             "alibaba/tongyi-deepresearch-30b-a3b:free",
             "google/gemma-7b-it"
         ]
-        self.current_model_index = 0
+        # Выбор модели по задержке и здоровью (вместо общего указателя на текущую модель)
+        self.scheduler = ModelScheduler(self.available_models)
         self.max_retries = 2
-        self.timeout = 30.0
+        self.timeout = AI_TIMEOUT
         self.api_key = os.getenv("OPENROUTER_API_KEY")
+        self._client: Optional[httpx.AsyncClient] = None
+        self.cache = AnswerCache()
+        # Счётчики по моделям: запросы, дублирующие запросы (хеджи), выигранные ответы
+        self.model_stats: Dict[str, Dict[str, int]] = {
+            model: {"requests": 0, "hedges": 0, "wins": 0} for model in self.available_models
+        }
+
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://t.me/HDL_Assistant_Bot",
+                "X-Title": "HDL Assistant Bot",
+            },
+            timeout=httpx.Timeout(self.timeout, connect=AI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=AI_MAX_CONNECTIONS,
+                max_keepalive_connections=AI_MAX_KEEPALIVE,
+                keepalive_expiry=AI_KEEPALIVE_EXPIRY,
+            ),
+            http2=HTTP2_AVAILABLE,
+        )
+
+    async def start(self):
+        """Открывает общий пул соединений (хук запуска диспетчера)"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+            logger.info(f"🌐 HTTP-клиент ИИ открыт (HTTP/2: {'да' if HTTP2_AVAILABLE else 'нет'})")
+
+    async def aclose(self):
+        """Закрывает пул соединений (хук остановки диспетчера)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("🌐 HTTP-клиент ИИ закрыт")
+        logger.info(f"📊 Модели ИИ: {self.models_stats()}")
+        self.cache.close()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Без хука запуска (скрипты, отладка) клиент создаётся при первом запросе
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
 
-    def get_current_model(self) -> str:
-        return self.available_models[self.current_model_index]
+    def answer_key(self, user_query: str, passages: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Ключ ответа в кэше: вопрос, его бренды, список моделей, версия промпта и фрагменты"""
+        version = f"{AI_PROMPT_VERSION}:{'|'.join(self.available_models)}"
+        sources = [f"{passage['path']}\x1e{passage['text']}" for passage in passages or ()]
+        return answer_key(user_query, extract_brands(user_query), version, sources)
 
-    def switch_to_next_model(self) -> str:
-        self.current_model_index = (self.current_model_index + 1) % len(self.available_models)
-        logger.info(f"🔄 Переключение на модель: {self.get_current_model()}")
-        return self.get_current_model()
+    async def _cached_answer(self, key: str) -> Optional[str]:
+        try:
+            return await asyncio.to_thread(self.cache.get, key)
+        except Exception as e:
+            logger.warning(f"⚠️ Кэш ответов ИИ недоступен: {e}")
+            return None
+
+    async def _store_answer(self, key: str, user_query: str, model: str, answer: str):
+        try:
+            await asyncio.to_thread(self.cache.set, key, user_query, model, answer)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить ответ ИИ в кэш: {e}")
 
     def _prepare_system_prompt(self) -> str:
         """Улучшенный системный промпт"""
@@ -70,74 +156,232 @@ class StableAIService:
         
         return True, answer
 
-    async def ask_ai(self, user_query: str, context: str = "") -> str:
-        """Асинхронная версия с httpx"""
+    def _prepare_user_message(self, user_query: str, passages: Optional[List[Dict[str, Any]]]) -> str:
+        """Вопрос пользователя с фрагментами документации, если они найдены"""
+        if not passages:
+            return user_query
+        excerpts = "\n\n".join(
+            f"[{i}] {passage['name']}:\n{passage['text']}" for i, passage in enumerate(passages, 1)
+        )
+        return (
+            f"Фрагменты документации:\n\n{excerpts}\n\n"
+            "Ответь кратко, опираясь на фрагменты, если они относятся к вопросу.\n\n"
+            f"Вопрос: {user_query}"
+        )
+
+    def _letter_count(self, text: str) -> int:
+        return sum(1 for c in text if c.isalpha())
+
+    async def _read_stream(self, response: httpx.Response) -> AsyncIterator[str]:
+        """Накопленный текст ответа после каждого фрагмента SSE-потока OpenRouter"""
+        answer = ""
+        usage: Dict[str, Any] = {}
+        async for line in response.aiter_lines():
+            # Пустые строки разделяют события, строки с ":" — служебные комментарии
+            if not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            chunk = json.loads(payload)
+            if "error" in chunk:
+                raise RuntimeError(f"ошибка в потоке: {chunk['error']}")
+            usage = chunk.get("usage") or usage
+            choices = chunk.get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content") or ""
+            if delta:
+                answer += delta
+                yield answer
+        if usage:
+            logger.info(f"📝 Использовано токенов: {usage.get('total_tokens', 0)}")
+
+    def _hedge_order(self) -> List[str]:
+        """Модели в порядке запуска по оценке планировщика (не больше max_retries)"""
+        return self.scheduler.order()[:self.max_retries]
+
+    async def _attempt(self, model: str, system_prompt: str, user_message: str, events: asyncio.Queue):
+        """
+        Один запрос к модели. Кладёт в очередь события (модель, вид, текст):
+        partial — недописанный ответ, уже проходящий проверку; done — проверенный
+        ответ целиком; failed — ошибка или невалидный ответ.
+        """
+        self.model_stats[model]["requests"] += 1
+        self.scheduler.started(model)
+        started_at = asyncio.get_running_loop().time()
+        first_text_at: Optional[float] = None
+        try:
+            logger.info(f"🔄 Запрос к модели: {model}")
+            async with self._get_client().stream(
+                "POST",
+                AI_API_URL,
+                json={
+                    "model": model,
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_message}
+                    ],
+                    "temperature": 0.7,
+                    "max_tokens": 500,
+                    "stream": True,
+                }
+            ) as response:
+                if response.status_code == 404:
+                    logger.warning(f"Модель {model} недоступна")
+                    self.scheduler.record_failure(model)
+                    await events.put((model, "failed", "404"))
+                    return
+                if response.status_code != 200:
+                    await response.aread()
+                    logger.error(f"Ошибка API {response.status_code}: {response.text}")
+                    self.scheduler.record_failure(model)
+                    await events.put((model, "failed", str(response.status_code)))
+                    return
+
+                answer = ""
+                aborted = False
+                async for answer in self._read_stream(response):
+                    is_valid, _ = self._validate_ai_response(answer)
+                    if is_valid:
+                        if first_text_at is None:
+                            first_text_at = asyncio.get_running_loop().time()
+                        await events.put((model, "partial", answer.strip()))
+                    elif self._letter_count(answer) >= AI_STREAM_ABORT_LETTERS:
+                        aborted = True
+                        break
+
+            # Валидируем ответ
+            is_valid, validated_answer = self._validate_ai_response(answer)
+            if is_valid and not aborted:
+                logger.info(f"✅ Успешный ответ от {model}")
+                logger.info(f"📄 Ответ: {validated_answer[:100]}...")
+                # Задержка модели — время до первого показанного текста: его и ждёт пользователь
+                self.scheduler.record_success(model, (first_text_at or started_at) - started_at)
+                await events.put((model, "done", validated_answer))
+            else:
+                logger.warning(f"Невалидный ответ: {validated_answer}")
+                self.scheduler.record_failure(model, validation=True)
+                await events.put((model, "failed", "invalid"))
+        except asyncio.CancelledError:
+            self.scheduler.cancelled(model)
+            raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка при запросе к ИИ ({model}): {e}")
+            self.scheduler.record_failure(model)
+            await events.put((model, "failed", str(e)))
+
+    async def stream_ai(self, user_query: str, context: str = "",
+                        passages: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[str]:
+        """
+        Ответ ИИ по мере генерации (потоковый режим OpenRouter) с хеджированием.
+
+        Выдаёт текущий текст ответа целиком; последнее выданное значение —
+        окончательный ответ (проверенный, из кэша или запасной). Если основная
+        модель за AI_HEDGE_DELAY секунд не выдала проходящего проверку текста,
+        тот же запрос уходит следующей модели; чей поток первым пройдёт
+        проверку, тот и показывается (ведущий). Остальные запросы работают,
+        пока ведущий не закончит: если он оборвётся, показывается готовый
+        ответ другой модели или поток следующей, прошедший проверку.
+        """
         if not user_query or len(user_query.strip()) < 3:
-            return "Пожалуйста, уточните ваш вопрос"
+            yield "Пожалуйста, уточните ваш вопрос"
+            return
+
+        key = self.answer_key(user_query, passages)
+        cached = await self._cached_answer(key)
+        if cached is not None:
+            logger.info(f"💾 Ответ ИИ из кэша: {key}")
+            yield cached
+            return
 
         system_prompt = self._prepare_system_prompt()
+        user_message = self._prepare_user_message(user_query, passages)
 
-        for attempt in range(self.max_retries):
-            current_model = self.get_current_model()
-            
-            try:
-                logger.info(f"🔄 Попытка {attempt + 1} с моделью: {current_model}")
-                
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    response = await client.post(
-                        url="https://openrouter.ai/api/v1/chat/completions",
-                        headers={
-                            "Authorization": f"Bearer {self.api_key}",
-                            "Content-Type": "application/json",
-                            "HTTP-Referer": "https://t.me/HDL_Assistant_Bot",
-                            "X-Title": "HDL Assistant Bot",
-                        },
-                        json={
-                            "model": current_model,
-                            "messages": [
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": user_query}
-                            ],
-                            "temperature": 0.7,
-                            "max_tokens": 500,
-                        }
-                    )
-
-                    if response.status_code == 200:
-                        data = response.json()
-                        answer = data["choices"][0]["message"]["content"].strip()
-                        
-                        # Логируем использование токенов
-                        usage = data.get('usage', {})
-                        if usage:
-                            logger.info(f"📝 Использовано токенов: {usage.get('total_tokens', 0)}")
-                        
-                        # Валидируем ответ
-                        is_valid, validated_answer = self._validate_ai_response(answer)
-                        
-                        if is_valid:
-                            logger.info(f"✅ Успешный ответ от {current_model}")
-                            logger.info(f"📄 Ответ: {validated_answer[:100]}...")
-                            return validated_answer
-                        else:
-                            logger.warning(f"Невалидный ответ: {validated_answer}")
-                            self.switch_to_next_model()
-                    
-                    elif response.status_code == 404:
-                        logger.warning(f"Модель {current_model} недоступна")
-                        self.switch_to_next_model()
-                    else:
-                        logger.error(f"Ошибка API {response.status_code}: {response.text}")
-                        if attempt == self.max_retries - 1:
-                            break
-                            
-            except Exception as e:
-                logger.error(f"❌ Ошибка при запросе к ИИ: {e}")
-                if attempt == self.max_retries - 1:
-                    break
-                await asyncio.sleep(1)
-
-        return self._get_smart_fallback(user_query)
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        pending = self._hedge_order()
+        running: Dict[str, asyncio.Task] = {}
+        # Готовые ответы моделей, закончивших раньше ведущего
+        finished: Dict[str, str] = {}
+        winner: Optional[str] = None
+        hedge_at = 0.0
+
+        def launch(hedge: bool):
+            nonlocal hedge_at
+            model = pending.pop(0)
+            if hedge:
+                self.model_stats[model]["hedges"] += 1
+                logger.info(f"⏱️ Нет ответа за {AI_HEDGE_DELAY} с, дублирую запрос модели {model}")
+            running[model] = asyncio.create_task(self._attempt(model, system_prompt, user_message, events))
+            hedge_at = loop.time() + AI_HEDGE_DELAY
+
+        launch(hedge=False)
+        try:
+            while running:
+                timeout = None
+                if winner is None and pending:
+                    timeout = max(0.0, hedge_at - loop.time())
+                try:
+                    model, kind, text = await asyncio.wait_for(events.get(), timeout)
+                except asyncio.TimeoutError:
+                    launch(hedge=True)
+                    continue
+
+                if model not in running:
+                    continue  # событие отменённого запроса
+                if kind == "failed":
+                    running.pop(model)
+                    if winner == model:
+                        winner = None
+                        if finished:
+                            # Ведущий оборвался, а другая модель уже ответила целиком
+                            model, text = next(iter(finished.items()))
+                            self.model_stats[model]["wins"] += 1
+                            await self._store_answer(key, user_query, model, text)
+                            yield text
+                            return
+                    # Упавший запрос сразу заменяется следующей моделью
+                    if not running and pending:
+                        launch(hedge=False)
+                    continue
+
+                if winner is None:
+                    winner = model
+                if model != winner:
+                    if kind == "done":
+                        running.pop(model)
+                        finished[model] = text
+                    continue
+                if kind == "partial":
+                    yield text
+                else:
+                    self.model_stats[model]["wins"] += 1
+                    running.pop(model)
+                    await self._store_answer(key, user_query, model, text)
+                    yield text
+                    return
+        finally:
+            for task in running.values():
+                task.cancel()
+
+        yield self._get_smart_fallback(user_query)
+
+    def models_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Счётчики хеджирования и здоровье каждой модели"""
+        return {
+            model: {**counters, **self.scheduler.health[model].to_dict()}
+            for model, counters in self.model_stats.items()
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"models": self.models_stats(), "cache": self.cache.stats()}
+
+    async def ask_ai(self, user_query: str, context: str = "",
+                     passages: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Ответ ИИ целиком (последнее значение stream_ai)"""
+        answer = ""
+        async for answer in self.stream_ai(user_query, context, passages):
+            pass
+        return answer
 
     def _get_smart_fallback(self, user_query: str) -> str:
         """Умный запасной ответ на основе запроса"""
@@ -188,8 +432,38 @@ class StableAIService:
 # Глобальный экземпляр
 _ai_service = StableAIService()
 
-async def ask_ai(user_query: str, context: str = "") -> str:
-    return await _ai_service.ask_ai(user_query, context)
+async def start_ai_client():
+    await _ai_service.start()
+
+
+async def close_ai_client():
+    await _ai_service.aclose()
+
+
+def get_ai_stats() -> Dict[str, Any]:
+    """Счётчики запросов, хеджей и побед по моделям и статистика кэша ответов"""
+    return _ai_service.stats()
+
+
+def ai_answer_key(user_query: str, passages: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Ключ, под которым ответ на вопрос по этим фрагментам лежит в кэше (для кнопки «Нет»)"""
+    return _ai_service.answer_key(user_query, passages)
+
+
+def forget_ai_answer(key: str) -> bool:
+    """Удаляет ответ из кэша, чтобы плохой ответ не отдавался повторно"""
+    return _ai_service.cache.delete(key)
+
+
+async def stream_ai(user_query: str, context: str = "",
+                    passages: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[str]:
+    async for answer in _ai_service.stream_ai(user_query, context, passages):
+        yield answer
+
+
+async def ask_ai(user_query: str, context: str = "",
+                 passages: Optional[List[Dict[str, Any]]] = None) -> str:
+    return await _ai_service.ask_ai(user_query, context, passages)
 
 def get_fallback_response() -> str:
     return _ai_service._get_smart_fallback("")
\ No newline at end of file
@@ -0,0 +1,150 @@
+# bot/utils/answer_cache.py
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from bot.utils.cache import CACHE_DIR
+
+AI_CACHE_FILE = os.getenv("AI_CACHE_FILE", os.path.join(CACHE_DIR, "ai_answers.sqlite3"))
+
+# Время жизни ответа (секунды, по умолчанию неделя) и сколько ответов хранить
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", str(7 * 24 * 3600)))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "2000"))
+
+# Длина ключа в hex-символах: ключ уходит в callback_data кнопки «Нет» (лимит Telegram — 64 байта)
+AI_CACHE_KEY_LENGTH = 16
+
+_WORD_RE = re.compile(r"[0-9a-zа-яё]+")
+
+
+def normalize_question(question: str) -> str:
+    """Вопрос без регистра, знаков препинания и лишних пробелов"""
+    return " ".join(_WORD_RE.findall(question.lower().replace("ё", "е")))
+
+
+def answer_key(question: str, brands: Sequence[str], version: str, sources: Sequence[str] = ()) -> str:
+    """
+    Ключ ответа: нормализованный вопрос, бренды (без порядка), версия моделей
+    и промпта и источники из промпта (в их порядке): после переиндексации
+    документации тот же вопрос получает новый ключ
+    """
+    raw = "\x1f".join([normalize_question(question), ",".join(sorted(set(brands))), version, *sources])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:AI_CACHE_KEY_LENGTH]
+
+
+class AnswerCache:
+    """
+    Ответы ИИ в SQLite: переживают перезапуск бота.
+
+    Запись устаревает через ttl после сохранения; сверх max_entries
+    вытесняются давно не запрашивавшиеся. Файл открывается при первом
+    обращении, доступ из потоков — под блокировкой.
+    """
+
+    def __init__(self, path: str = AI_CACHE_FILE, ttl: float = AI_CACHE_TTL,
+                 max_entries: int = AI_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, question TEXT NOT NULL, model TEXT NOT NULL, "
+                "answer TEXT NOT NULL, created_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS answers_used_at ON answers (used_at)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT answer, created_at FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            answer, created_at = row
+            now = time.time()
+            if now - created_at >= self.ttl:
+                connection.execute("DELETE FROM answers WHERE key = ?", (key,))
+                connection.commit()
+                self.expirations += 1
+                self.misses += 1
+                return None
+            connection.execute("UPDATE answers SET used_at = ? WHERE key = ?", (now, key))
+            connection.commit()
+            self.hits += 1
+            return answer
+
+    def set(self, key: str, question: str, model: str, answer: str):
+        with self._lock:
+            connection = self._connect()
+            now = time.time()
+            connection.execute(
+                "INSERT OR REPLACE INTO answers (key, question, model, answer, created_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, question, model, answer, now, now),
+            )
+            connection.execute("DELETE FROM answers WHERE created_at <= ?", (now - self.ttl,))
+            excess = connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+            if excess > 0:
+                connection.execute(
+                    "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY used_at LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+            connection.commit()
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            connection = self._connect()
+            deleted = connection.execute("DELETE FROM answers WHERE key = ?", (key,)).rowcount
+            connection.commit()
+        if deleted:
+            logging.info(f"🗑️ Ответ ИИ {key} удалён из кэша по отзыву «Нет»")
+        return bool(deleted)
+
+    def clear(self):
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM answers")
+            connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
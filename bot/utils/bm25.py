@@ -0,0 +1,121 @@
+# bot/utils/bm25.py
+import math
+import re
+from bisect import bisect_left
+from collections import Counter
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Параметры Okapi BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TERM_RE = re.compile(r"[0-9a-zа-яё]+")
+
+# Служебные слова запросов: есть почти в любом тексте и документ по ним не ищут
+STOPWORDS = frozenset({
+    "в", "во", "на", "по", "с", "со", "к", "ко", "от", "до", "из", "у", "о", "об", "за", "при",
+    "и", "или", "а", "но", "не", "ни", "ли", "же", "бы", "то", "для", "как", "что", "это",
+    "где", "когда", "какой", "какая", "какое", "какие", "мне", "меня", "нам", "есть", "нужен",
+    "нужна", "нужно", "можно", "найди", "дай", "скинь", "сбрось", "отправь",
+    "the", "an", "and", "or", "of", "for", "to", "in", "on", "with", "is", "are", "how", "what",
+})
+
+
+def content_terms(text: str) -> List[str]:
+    """Слова текста для полнотекстового индекса (латиница, кириллица, цифры)"""
+    return [term for term in _TERM_RE.findall(text.lower()) if len(term) >= 2]
+
+
+def query_terms(text: str) -> List[str]:
+    """Слова запроса для поиска по тексту: content_terms без служебных слов"""
+    return [term for term in content_terms(text) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Инвертированный индекс BM25 по тексту документов.
+
+    Словарь отсортирован (поиск термина — бинарный поиск, что работает и для
+    строк из mmap), списки документов и частоты хранятся в CSR-массивах.
+    Оценки для всех документов считаются векторно по спискам терминов запроса.
+    """
+
+    def __init__(self, vocab: Sequence[str], offsets: np.ndarray, docs: np.ndarray,
+                 tfs: np.ndarray, doc_lengths: np.ndarray):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        indexed = doc_lengths[doc_lengths > 0]
+        self.doc_count = len(indexed)
+        self.avg_length = float(indexed.mean()) if len(indexed) else 0.0
+
+    @classmethod
+    def build(cls, texts: Iterable[Optional[str]]) -> "BM25Index":
+        """
+        texts[i] — текст документа i или None, если текста нет.
+
+        Тексты перебираются по одному (подходит генератор, читающий их с диска):
+        в памяти остаются только частоты терминов, а не сами документы.
+        """
+        terms: List[str] = []
+        docs: List[int] = []
+        tfs: List[int] = []
+        doc_lengths: List[int] = []
+        for doc_id, text in enumerate(texts):
+            counts = Counter(content_terms(text)) if text else Counter()
+            for term, tf in counts.items():
+                terms.append(term)
+                docs.append(doc_id)
+                tfs.append(tf)
+            doc_lengths.append(sum(counts.values()))
+
+        vocab = sorted(set(terms))
+        term_ids = {term: i for i, term in enumerate(vocab)}
+        keys = [term_ids[term] for term in terms]
+
+        keys_array = np.asarray(keys, dtype=np.int64)
+        order = np.argsort(keys_array, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys_array, minlength=len(vocab)), out=offsets[1:])
+        return cls(vocab, offsets,
+                   np.asarray(docs, dtype=np.int32)[order],
+                   np.asarray(tfs, dtype=np.int32)[order],
+                   np.asarray(doc_lengths, dtype=np.int32))
+
+    def term_id(self, term: str) -> Optional[int]:
+        i = bisect_left(self.vocab, term)
+        if i < len(self.vocab) and self.vocab[i] == term:
+            return i
+        return None
+
+    def scores(self, terms: Iterable[str]) -> np.ndarray:
+        """Оценка BM25 запроса для каждого документа"""
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        if not self.doc_count:
+            return scores
+        for term in set(terms):
+            term_id = self.term_id(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.docs[start:end]
+            tfs = self.tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1.0 + (self.doc_count - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_lengths[docs] / self.avg_length)
+            # Документы в списке термина уникальны, поэтому сложение по индексу безопасно
+            scores[docs] += idf * tfs * (BM25_K1 + 1.0) / (tfs + norm)
+        return scores
+
+    def top(self, terms: Iterable[str], k: int) -> List[Tuple[int, float]]:
+        """k лучших документов с положительной оценкой"""
+        scores = self.scores(terms)
+        positive = np.flatnonzero(scores > 0)
+        if len(positive) > k:
+            positive = positive[np.argpartition(-scores[positive], k - 1)[:k]]
+        order = positive[np.argsort(-scores[positive], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in order]
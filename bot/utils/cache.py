@@ -1,7 +1,9 @@
 import json
 import os
+import threading
 import time
-from typing import Any, Dict
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
 
 CACHE_DIR = "data/cache"
 CACHE_FILE = os.path.join(CACHE_DIR, "relevance_cache.json")
@@ -38,4 +40,64 @@ def get_cache_key(query: str, filename: str) -> str:
 
 def is_cache_valid(timestamp: float) -> bool:
     """Проверяет валидность кэша по времени"""
-    return time.time() - timestamp < CACHE_DURATION
\ No newline at end of file
+    return time.time() - timestamp < CACHE_DURATION
+
+class LRUTTLCache:
+    """
+    Ограниченный LRU-кэш в памяти с временем жизни записей.
+
+    Потокобезопасен: к нему обращаются и цикл событий, и пул поиска.
+    Считает попадания, промахи, вытеснения и устаревшие записи.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = CACHE_DURATION):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            stored_at, value = item
+            if time.monotonic() - stored_at >= self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,202 @@
+# bot/utils/intent_classifier.py
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from bot.utils.cache import LRUTTLCache
+from bot.utils.routing import AhoCorasick
+
+# Классы ключевых слов запроса. Все шаблоны всех классов собираются в один
+# автомат, и за один проход по тексту становится известно, какие классы сработали.
+KEYWORD_CLASSES: Dict[str, List[str]] = {
+    # Запросы, которые НИКОГДА не идут к ИИ (документация и бренды)
+    "never_ai": [
+        # Бренды и продукты
+        "изикул", "easycool", "урри", "urri", "хдл", "hdl", "баспро", "buspro",
+        "матек", "matech", "йилайт", "yeelight", "изи кул", "карниз", "карнизы", "радиусный",
+        "спецификация карнизов", "паспорт карнизов",
+        # Документация
+        "техничка", "документация", "паспорт", "инструкция", "руководство", "manual",
+        "скачать", "файл", "pdf", "схема", "чертеж", "техническ",
+        # Конкретные запросы документации
+        "техничка на", "документация на", "паспорт на", "инструкция на",
+    ],
+    # Сложные технические вопросы, которые сразу идут к ИИ
+    "ai_direct": [
+        # Общие технические вопросы
+        "как интегрировать", "как подключить", "как настроить", "как работает",
+        "как сделать", "как использовать", "как реализовать", "как объединить",
+        # Сравнения и выбор
+        "какой лучше", "что выбрать", "сравните", "отличия", "разница между",
+        "преимущества", "недостатки", "плюсы и минусы",
+        # Проблемы и ошибки
+        "проблема с", "ошибка", "не работает", "не подключается",
+        "не настраивается", "сломал", "не отвечает",
+        # Объяснения
+        "почему", "зачем", "как устроен", "принцип работы", "объясните",
+        "расскажите о", "что такое", "в чем разница",
+        # Сложные технические темы
+        "протокол", "интеграци", "api", "rest api", "websocket", "mqtt",
+        "knx ip", "bacnet", "modbus", "zigbee", "z-wave", "wi-fi",
+        "автоматизаци", "сценарий", "сценар", "логика",
+    ],
+    # Алиса и голосовые ассистенты
+    "alisa": ["алис", "яндекс алис", "yandex alice", "alisa", "mgwip", "голосов", "голосовой", "ассистент", "шлюз"],
+    # Алиса + интеграция — это запрос документации
+    "alisa_integration": ["интеграци", "настрои", "подключи"],
+    # Глаголы запроса документации в длинных сообщениях
+    "doc_verbs": ["найди", "скинь", "дай", "сбрось", "отправь"],
+    # Вопросы для should_use_ai_directly: Алиса/интеграции исключаются, жалобы и сравнения — к ИИ
+    "direct_exclude": ["алис", "яндекс алис", "yandex alice", "alisa", "mgwip", "голосов", "голосовой", "ассистент", "шлюз", "интеграци"],
+    "complex": ["почему", "какой лучше", "что выбрать", "сравни", "отличия", "проблема", "ошибка", "не работает", "не подключается", "сломал"],
+}
+
+# Ключевое слово -> бренд для контекста ИИ (порядок задаёт порядок брендов в ответе)
+BRAND_KEYWORDS: Dict[str, str] = {
+    "hdl": "HDL",
+    "урри": "URRI",
+    "urri": "URRI",
+    "баспро": "Buspro",
+    "buspro": "Buspro",
+    "матек": "Matech",
+    "matech": "Matech",
+    "иот": "iOT Systems",
+    "iot": "iOT Systems",
+    "алис": "Яндекс Алиса",
+    "alisa": "Яндекс Алиса",
+    "yeelight": "Yeelight Pro",
+    "йилайт": "Yeelight Pro",
+    "coolautomation": "CoolAutomation",
+    "dali": "Dali",
+    "дали": "Dali",
+    "easycool": "Easycool",
+    "изикул": "Easycool",
+}
+
+BRAND_CLASS = "brand"
+
+GREETINGS = {
+    "привет", "здравствуйте", "добрый день", "доброе утро", "добрый вечер",
+    "доброй ночи", "доброго дня", "приятного обеда", "приветствую", "хай", "hello", "hi"
+}
+
+# Сколько разобранных запросов держать в памяти
+INTENT_CACHE_SIZE = 1024
+
+
+class IntentMatch:
+    """Результат одного прохода автомата по запросу: сработавшие шаблоны по классам"""
+
+    def __init__(self, query: str, hits: Dict[str, List[str]]):
+        self.query = query
+        self.hits = hits
+        self.word_count = len(query.lower().split())
+
+    def has(self, keyword_class: str) -> bool:
+        return keyword_class in self.hits
+
+    @property
+    def brands(self) -> List[str]:
+        found = set(self.hits.get(BRAND_CLASS, ()))
+        return list(dict.fromkeys(brand for keyword, brand in BRAND_KEYWORDS.items() if keyword in found))
+
+
+class IntentDecision:
+    """Решение «ИИ или поиск» с трассировкой: какое правило сработало и на каких словах"""
+
+    def __init__(self, match: IntentMatch, use_ai: bool, rule: str, reason: str):
+        self.match = match
+        self.use_ai = use_ai
+        self.rule = rule
+        self.reason = reason
+
+    def trace(self) -> Dict[str, Any]:
+        return {
+            "query": self.match.query,
+            "use_ai": self.use_ai,
+            "rule": self.rule,
+            "reason": self.reason,
+            "hits": self.match.hits,
+            "brands": self.match.brands,
+            "word_count": self.match.word_count,
+        }
+
+
+class IntentClassifier:
+    """Все классы ключевых слов и бренды в одном автомате Ахо-Корасик"""
+
+    def __init__(self, keyword_classes: Dict[str, List[str]], brand_keywords: Dict[str, str],
+                 cache_size: int = INTENT_CACHE_SIZE):
+        classes: Dict[str, List[str]] = {name: list(patterns) for name, patterns in keyword_classes.items()}
+        classes[BRAND_CLASS] = list(brand_keywords)
+        self._pattern_classes: Dict[str, List[str]] = {}
+        for name, patterns in classes.items():
+            for pattern in patterns:
+                self._pattern_classes.setdefault(pattern, []).append(name)
+        self._automaton = AhoCorasick(self._pattern_classes)
+        self._cache = LRUTTLCache(cache_size, float("inf"))
+
+    def match(self, query: str) -> IntentMatch:
+        cached = self._cache.get(query)
+        if cached is not None:
+            return cached
+        hits: Dict[str, List[str]] = {}
+        for pattern_id in sorted(self._automaton.find(query.lower())):
+            pattern = self._automaton.patterns[pattern_id]
+            for name in self._pattern_classes[pattern]:
+                hits.setdefault(name, []).append(pattern)
+        result = IntentMatch(query, hits)
+        self._cache.set(query, result)
+        return result
+
+    def decide(self, query: str) -> IntentDecision:
+        """Нужен ли запросу ИИ (логика бывшей should_use_ai_improved)"""
+        match = self.match(query)
+        if match.has("never_ai"):
+            return IntentDecision(match, False, "never_ai", "запрос документации")
+        if match.has("alisa"):
+            # Для Алисы с интеграцией - поиск, для сложных вопросов - ИИ
+            if match.has("alisa_integration"):
+                return IntentDecision(match, False, "alisa_integration", "запрос про интеграцию Алисы")
+            return IntentDecision(match, True, "alisa", "сложный вопрос про Алису")
+        if match.has("ai_direct"):
+            return IntentDecision(match, True, "ai_direct", "сложный технический запрос")
+        if match.word_count <= 2:
+            return IntentDecision(match, False, "short", "короткий запрос")
+        if match.word_count >= 4:
+            if match.has("doc_verbs"):
+                return IntentDecision(match, False, "doc_verbs", "запрос на поиск документации")
+            return IntentDecision(match, True, "long", "длинный сложный запрос")
+        return IntentDecision(match, False, "default", "обычный запрос")
+
+    def use_ai_directly(self, query: str) -> bool:
+        """Жалобы и сравнения без упоминания Алисы и интеграций (логика should_use_ai_directly)"""
+        match = self.match(query)
+        return match.has("complex") and not match.has("direct_exclude")
+
+
+_classifier: Optional[IntentClassifier] = None
+
+
+def get_intent_classifier() -> IntentClassifier:
+    global _classifier
+    if _classifier is None:
+        _classifier = IntentClassifier(KEYWORD_CLASSES, BRAND_KEYWORDS)
+    return _classifier
+
+
+def classify_intent(query: str) -> IntentDecision:
+    """Решение «ИИ или поиск» для сообщения с записью в лог"""
+    decision = get_intent_classifier().decide(query)
+    mark = "✅" if decision.use_ai else "❌"
+    target = "к ИИ" if decision.use_ai else "обычный поиск"
+    logging.info(f"{mark} Решение: {decision.reason} '{query}' → {target}")
+    logging.debug(f"Трассировка решения: {decision.trace()}")
+    return decision
+
+
+def is_greeting(text: str) -> bool:
+    return text.lower().strip(".,!?") in GREETINGS
+
+
+def extract_brands(query: str) -> Tuple[str, ...]:
+    return tuple(get_intent_classifier().match(query).brands)
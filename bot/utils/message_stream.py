@@ -0,0 +1,78 @@
+# bot/utils/message_stream.py
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+# Не чаще одного промежуточного редактирования за столько секунд (лимиты Telegram на правки)
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+# Промежуточная правка не отправляется, пока текст не вырос хотя бы на столько символов
+STREAM_MIN_GROWTH = int(os.getenv("STREAM_MIN_GROWTH", "40"))
+
+STREAM_CURSOR = " ▌"
+
+
+class ThrottledEditor:
+    """
+    Постепенно показывает растущий ответ в одном сообщении.
+
+    Промежуточные тексты объединяются: правка уходит не чаще раза в
+    STREAM_EDIT_INTERVAL секунд, остальные просто заменяют ожидающий текст.
+    Промежуточные правки идут без разметки (недописанный HTML Telegram не
+    примет), их ошибки не прерывают ответ; последнюю правку делает finish().
+    """
+
+    def __init__(self, message: Message, prefix: str = "", interval: float = STREAM_EDIT_INTERVAL,
+                 min_growth: int = STREAM_MIN_GROWTH):
+        self.message = message
+        self.prefix = prefix
+        self.interval = interval
+        self.min_growth = min_growth
+        self.edits = 0
+        self._shown = ""
+        self._next_edit_at = 0.0
+
+    async def update(self, text: str):
+        if not text or text == self._shown:
+            return
+        if time.monotonic() < self._next_edit_at:
+            return
+        # Дописанный текст показываем порциями; новый текст (смена модели) — сразу
+        if text.startswith(self._shown) and len(text) - len(self._shown) < self.min_growth:
+            return
+        try:
+            await self.message.edit_text(f"{self.prefix}{text}{STREAM_CURSOR}", parse_mode=None)
+            self._shown = text
+            self.edits += 1
+            self._next_edit_at = time.monotonic() + self.interval
+        except TelegramRetryAfter as e:
+            self._next_edit_at = time.monotonic() + e.retry_after
+            logging.warning(f"⏳ Telegram ограничил правки на {e.retry_after} с")
+        except TelegramBadRequest as e:
+            logging.debug(f"Промежуточная правка не принята: {e}")
+            self._next_edit_at = time.monotonic() + self.interval
+
+    async def finish(self, text: str, reply_markup: Optional[Any] = None, **kwargs):
+        """
+        Окончательный текст с кнопками (с разметкой по умолчанию). Если Telegram
+        не принял разметку, текст отправляется без неё: кнопки не теряются
+        """
+        try:
+            await self._edit(text, reply_markup, **kwargs)
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                return
+            logging.warning(f"⚠️ Окончательная правка не принята, отправляю без разметки: {e}")
+            await self._edit(text, reply_markup, **{**kwargs, "parse_mode": None})
+
+    async def _edit(self, text: str, reply_markup: Optional[Any], **kwargs):
+        try:
+            await self.message.edit_text(text, reply_markup=reply_markup, **kwargs)
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            await self.message.edit_text(text, reply_markup=reply_markup, **kwargs)
+
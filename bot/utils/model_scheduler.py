@@ -0,0 +1,141 @@
+# bot/utils/model_scheduler.py
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Вес нового замера в скользящем среднем задержки (EWMA)
+AI_LATENCY_ALPHA = float(os.getenv("AI_LATENCY_ALPHA", "0.3"))
+# Задержка модели без замеров (секунды): новые модели тоже получают запросы
+AI_LATENCY_PRIOR = float(os.getenv("AI_LATENCY_PRIOR", "3"))
+
+# Столько неудач подряд размыкают цепь; через AI_BREAKER_COOLDOWN секунд — пробный запрос
+AI_BREAKER_THRESHOLD = int(os.getenv("AI_BREAKER_THRESHOLD", "3"))
+AI_BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "60"))
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class ModelHealth:
+    """Состояние одной модели: исходы запросов, EWMA задержки и автомат размыкателя"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.validation_failures = 0
+        self.consecutive_failures = 0
+        self.latency: Optional[float] = None
+        self.state = CIRCUIT_CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+
+    @property
+    def success_rate(self) -> float:
+        # Сглаживание (+1/+2): у модели без истории доля успехов 0.5, а не 0 или 1
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    def score(self) -> float:
+        """Ожидаемое время до годного ответа: задержка, делённая на долю успехов (меньше — лучше)"""
+        latency = self.latency if self.latency is not None else AI_LATENCY_PRIOR
+        return latency / self.success_rate
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+            "validation_failures": self.validation_failures,
+            "latency_ewma": round(self.latency, 3) if self.latency is not None else None,
+            "success_rate": round(self.success_rate, 3),
+        }
+
+
+class ModelScheduler:
+    """
+    Выбор модели для запроса по здоровью и скорости вместо общего указателя.
+
+    Модели с замкнутой цепью упорядочиваются по score(). После
+    AI_BREAKER_THRESHOLD неудач подряд цепь размыкается, и модель не получает
+    запросов; через AI_BREAKER_COOLDOWN секунд она переходит в полуоткрытое
+    состояние и получает один пробный запрос первой: успех замыкает цепь,
+    неудача снова размыкает. Все методы вызываются из цикла событий.
+    """
+
+    def __init__(self, models: Sequence[str], alpha: float = AI_LATENCY_ALPHA,
+                 threshold: int = AI_BREAKER_THRESHOLD, cooldown: float = AI_BREAKER_COOLDOWN,
+                 clock: Callable[[], float] = time.monotonic):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.health: Dict[str, ModelHealth] = {model: ModelHealth(model) for model in models}
+
+    def order(self) -> List[str]:
+        """
+        Модели в порядке запуска: сначала одна модель для пробного запроса
+        (если чья-то пауза истекла), затем замкнутые по score(). Если все цепи
+        разомкнуты, возвращаются все модели: лучше попытаться, чем сразу
+        отдать запасной ответ.
+        """
+        now = self.clock()
+        probes = []
+        closed = []
+        for health in self.health.values():
+            if health.state == CIRCUIT_OPEN and now - health.opened_at >= self.cooldown:
+                health.state = CIRCUIT_HALF_OPEN
+                logging.info(f"🟡 Модель {health.model}: пробный запрос после паузы")
+            if health.state == CIRCUIT_CLOSED:
+                closed.append(health)
+            elif health.state == CIRCUIT_HALF_OPEN and not health.probing:
+                probes.append(health)
+        closed.sort(key=ModelHealth.score)
+        ordered = probes[:1] + closed
+        if not ordered:
+            ordered = sorted(self.health.values(), key=ModelHealth.score)
+        return [health.model for health in ordered]
+
+    def started(self, model: str):
+        health = self.health[model]
+        health.requests += 1
+        if health.state == CIRCUIT_HALF_OPEN:
+            health.probing = True
+
+    def cancelled(self, model: str):
+        """Запрос отменён (выиграла другая модель) — исход неизвестен, проба остаётся за следующим"""
+        self.health[model].probing = False
+
+    def record_success(self, model: str, latency: float):
+        health = self.health[model]
+        health.successes += 1
+        health.consecutive_failures = 0
+        health.probing = False
+        if health.latency is None:
+            health.latency = latency
+        else:
+            health.latency += self.alpha * (latency - health.latency)
+        if health.state != CIRCUIT_CLOSED:
+            health.state = CIRCUIT_CLOSED
+            logging.info(f"🟢 Модель {model} снова доступна")
+
+    def record_failure(self, model: str, validation: bool = False):
+        health = self.health[model]
+        health.failures += 1
+        health.consecutive_failures += 1
+        if validation:
+            health.validation_failures += 1
+        was_probe = health.state == CIRCUIT_HALF_OPEN
+        health.probing = False
+        if was_probe or health.consecutive_failures >= self.threshold:
+            if health.state != CIRCUIT_OPEN:
+                logging.warning(f"🔴 Модель {model} отключена на {self.cooldown:.0f} с "
+                                f"(неудач подряд: {health.consecutive_failures})")
+            health.state = CIRCUIT_OPEN
+            health.opened_at = self.clock()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {model: health.to_dict() for model, health in self.health.items()}
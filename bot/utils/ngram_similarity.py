@@ -0,0 +1,92 @@
+# bot/utils/ngram_similarity.py
+import zlib
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Размер n-граммы: похожесть по символам (с повторами) — это SequenceMatcher.quick_ratio()
+NGRAM_SIZE = 1
+
+# n-граммы хешируются в фиксированное число корзин: словарь n-грамм не нужен,
+# а номера корзин одинаковы во всех процессах и при повторной сборке.
+# Совпадение корзин только увеличивает оценку, верхней границей она остаётся
+NGRAM_BUCKETS = 1 << 18
+
+
+def ngram_counts(text: str, size: int = NGRAM_SIZE, cache: Optional[Dict[str, int]] = None) -> List[Tuple[int, int]]:
+    """Номера корзин n-грамм строки и число вхождений каждой (по возрастанию номера)"""
+    counts: Counter = Counter()
+    for i in range(len(text) - size + 1):
+        gram = text[i:i + size]
+        bucket = cache.get(gram) if cache is not None else None
+        if bucket is None:
+            bucket = zlib.crc32(gram.encode("utf-8")) % NGRAM_BUCKETS
+            if cache is not None:
+                cache[gram] = bucket
+        counts[bucket] += 1
+    return sorted(counts.items())
+
+
+def similarity(a: str, b: str) -> float:
+    """Нечёткая похожесть запроса на имя или путь файла — SequenceMatcher.ratio()"""
+    return SequenceMatcher(None, a, b).ratio()
+
+
+class NgramMatrix:
+    """
+    Разреженная матрица «n-грамма -> строки» в формате CSR с числом вхождений.
+
+    Для всех строк сразу считает 2·|A∩B| / (|A|+|B|) по мультимножествам
+    n-грамм: для символов это SequenceMatcher.quick_ratio(), верхняя граница
+    ratio(). Пересечение копится векторно по спискам строк для n-грамм
+    запроса, а точный ratio() считается только для документов, которые эта
+    граница не отсекла.
+    """
+
+    def __init__(self, offsets: np.ndarray, rows: np.ndarray, counts: np.ndarray, lengths: np.ndarray):
+        self.offsets = offsets
+        self.rows = rows
+        self.counts = counts
+        self.lengths = lengths
+        self.size = len(lengths)
+
+    @classmethod
+    def build(cls, texts: Sequence[str]) -> "NgramMatrix":
+        gram_cache: Dict[str, int] = {}
+        rows: List[np.ndarray] = []
+        buckets: List[np.ndarray] = []
+        counts: List[np.ndarray] = []
+        lengths = np.zeros(len(texts), dtype=np.int32)
+        for row, text in enumerate(texts):
+            text_counts = ngram_counts(text, cache=gram_cache)
+            lengths[row] = sum(count for _, count in text_counts)
+            buckets.append(np.asarray([bucket for bucket, _ in text_counts], dtype=np.int64))
+            counts.append(np.asarray([count for _, count in text_counts], dtype=np.int32))
+            rows.append(np.full(len(text_counts), row, dtype=np.int32))
+
+        all_buckets = np.concatenate(buckets) if buckets else np.zeros(0, dtype=np.int64)
+        all_rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int32)
+        all_counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int32)
+        order = np.argsort(all_buckets, kind="stable")
+        offsets = np.zeros(NGRAM_BUCKETS + 1, dtype=np.int64)
+        np.cumsum(np.bincount(all_buckets, minlength=NGRAM_BUCKETS), out=offsets[1:])
+        return cls(offsets, all_rows[order], all_counts[order], lengths)
+
+    def similarity(self, text: str) -> np.ndarray:
+        """Оценка сверху похожести запроса на каждую строку матрицы"""
+        return self.similarity_batch([text])[0]
+
+    def similarity_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Матрица оценок (len(texts), size)"""
+        overlap = np.zeros((len(texts), self.size))
+        query_lengths = np.zeros(len(texts))
+        for query_row, text in enumerate(texts):
+            for bucket, count in ngram_counts(text):
+                query_lengths[query_row] += count
+                start, end = self.offsets[bucket], self.offsets[bucket + 1]
+                # Строки в списке одной n-граммы не повторяются, поэтому += по индексам корректен
+                overlap[query_row, self.rows[start:end]] += np.minimum(self.counts[start:end], count)
+        denominator = query_lengths[:, None] + self.lengths[None, :]
+        return np.divide(2.0 * overlap, denominator, out=np.zeros_like(overlap), where=denominator > 0)
@@ -0,0 +1,226 @@
+# bot/utils/passages.py
+import logging
+import math
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from bot.utils.bm25 import content_terms
+from bot.utils.text_store import TextStore
+
+# Размер фрагмента (символы) и сколько фрагментов прикладывать к вопросу ИИ
+PASSAGE_CHARS = int(os.getenv("PASSAGE_CHARS", "700"))
+PASSAGE_TOP_K = int(os.getenv("PASSAGE_TOP_K", "3"))
+
+# Фрагменты с меньшим косинусным сходством с вопросом не прикладываются
+PASSAGE_MIN_SCORE = float(os.getenv("PASSAGE_MIN_SCORE", "0.15"))
+
+
+def split_passages(text: str, size: int = PASSAGE_CHARS) -> List[Tuple[int, int]]:
+    """
+    Границы фрагментов текста (начало, конец): строки PDF собираются во
+    фрагменты до size символов, слишком длинные строки режутся.
+    """
+    passages = []
+    start = end = 0
+    for line in text.splitlines(keepends=True):
+        line_end = end + len(line)
+        if line_end - start > size and end > start:
+            passages.append((start, end))
+            start = end
+        while line_end - start > size:
+            passages.append((start, start + size))
+            start += size
+        end = line_end
+    if text[start:end].strip():
+        passages.append((start, end))
+    return [(s, e) for s, e in passages if text[s:e].strip()]
+
+
+class PassageIndex:
+    """
+    Фрагменты извлечённых текстов PDF в векторах TF-IDF.
+
+    Матрица фрагментов (фрагменты × термины) — разреженная CSR из SciPy,
+    строки нормированы, поэтому косинусное сходство всех фрагментов со всеми
+    запросами пакета — одно умножение разреженных матриц. Сам текст
+    фрагментов не хранится: только путь документа и границы в его тексте.
+    """
+
+    def __init__(self, vocab: np.ndarray, idf: np.ndarray, matrix: sparse.csr_matrix,
+                 paths: np.ndarray, passage_docs: np.ndarray, bounds: np.ndarray):
+        self.vocab = vocab
+        self.idf = idf
+        self.matrix = matrix
+        self.paths = paths
+        self.passage_docs = passage_docs
+        self.bounds = bounds
+        self._term_ids = {term: i for i, term in enumerate(vocab.tolist())}
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @classmethod
+    def build(cls, paths: Sequence[str], text_store: TextStore) -> "PassageIndex":
+        doc_paths: List[str] = []
+        passage_docs: List[int] = []
+        bounds: List[Tuple[int, int]] = []
+        passage_terms: List[Counter] = []
+        for path in paths:
+            text = text_store.load(path)
+            if not text:
+                continue
+            doc_id = len(doc_paths)
+            doc_paths.append(path)
+            for start, end in split_passages(text):
+                passage_docs.append(doc_id)
+                bounds.append((start, end))
+                passage_terms.append(Counter(content_terms(text[start:end])))
+
+        document_frequency: Counter = Counter()
+        for counts in passage_terms:
+            document_frequency.update(counts.keys())
+        vocab = sorted(document_frequency)
+        term_ids = {term: i for i, term in enumerate(vocab)}
+        idf = np.array(
+            [math.log((1 + len(passage_terms)) / (1 + document_frequency[term])) + 1 for term in vocab],
+            dtype=np.float32,
+        )
+
+        rows: List[int] = []
+        cols: List[int] = []
+        values: List[float] = []
+        for row, counts in enumerate(passage_terms):
+            for term, tf in counts.items():
+                rows.append(row)
+                cols.append(term_ids[term])
+                values.append(1.0 + math.log(tf))
+        matrix = sparse.csr_matrix(
+            (np.asarray(values, dtype=np.float32), (rows, cols)),
+            shape=(len(passage_terms), len(vocab)),
+        )
+        matrix = _normalize_rows(matrix.multiply(idf).tocsr())
+        return cls(np.array(vocab, dtype=str), idf, matrix, np.array(doc_paths, dtype=str),
+                   np.asarray(passage_docs, dtype=np.int32), np.asarray(bounds, dtype=np.int64).reshape(-1, 2))
+
+    def save(self, path: str):
+        """Запись в .npz (через временный файл и атомарную подмену)"""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path, vocab=self.vocab, idf=self.idf, paths=self.paths,
+            passage_docs=self.passage_docs, bounds=self.bounds,
+            data=self.matrix.data, indices=self.matrix.indices, indptr=self.matrix.indptr,
+            shape=np.asarray(self.matrix.shape),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PassageIndex":
+        with np.load(path, allow_pickle=False) as data:
+            matrix = sparse.csr_matrix((data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"]))
+            return cls(data["vocab"], data["idf"], matrix, data["paths"], data["passage_docs"], data["bounds"])
+
+    def query_matrix(self, queries: Sequence[str]) -> sparse.csr_matrix:
+        """Запросы в том же пространстве TF-IDF (строки нормированы)"""
+        rows: List[int] = []
+        cols: List[int] = []
+        values: List[float] = []
+        for row, query in enumerate(queries):
+            for term, tf in Counter(content_terms(query)).items():
+                term_id = self._term_ids.get(term)
+                if term_id is not None:
+                    rows.append(row)
+                    cols.append(term_id)
+                    values.append((1.0 + math.log(tf)) * float(self.idf[term_id]))
+        matrix = sparse.csr_matrix(
+            (np.asarray(values, dtype=np.float32), (rows, cols)),
+            shape=(len(queries), len(self.vocab)),
+        )
+        return _normalize_rows(matrix)
+
+    def top_many(self, queries: Sequence[str], k: int = PASSAGE_TOP_K,
+                 min_score: float = PASSAGE_MIN_SCORE) -> List[List[Tuple[int, float]]]:
+        """Для каждого запроса — до k лучших фрагментов (номер, сходство), одно умножение на весь пакет"""
+        if not len(self) or not queries:
+            return [[] for _ in queries]
+        scores = (self.query_matrix(queries) @ self.matrix.T).tocsr()
+        results = []
+        for row in range(scores.shape[0]):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            passage_ids = scores.indices[start:end]
+            values = scores.data[start:end]
+            keep = values >= min_score
+            passage_ids, values = passage_ids[keep], values[keep]
+            if len(values) > k:
+                best = np.argpartition(-values, k - 1)[:k]
+                passage_ids, values = passage_ids[best], values[best]
+            order = np.lexsort((passage_ids, -values))
+            results.append([(int(passage_ids[i]), float(values[i])) for i in order])
+        return results
+
+    def passage(self, passage_id: int, text_store: TextStore) -> Optional[Dict[str, Any]]:
+        """Текст фрагмента и путь его документа"""
+        path = str(self.paths[self.passage_docs[passage_id]])
+        text = text_store.load(path)
+        if text is None:
+            return None
+        start, end = self.bounds[passage_id].tolist()
+        return {"path": path, "name": os.path.basename(path), "text": " ".join(text[start:end].split())}
+
+
+def _normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms).dot(matrix).tocsr().astype(np.float32)
+
+
+def passage_index_path(index_file: str) -> str:
+    """Путь индекса фрагментов рядом с file_index.json"""
+    return f"{os.path.splitext(index_file)[0]}.passages.npz"
+
+
+class PassageSearch:
+    """Индекс фрагментов процесса: загружается при первом вопросе и перечитывается после пересборки"""
+
+    def __init__(self, path: str, text_store: TextStore):
+        self.path = path
+        self.text_store = text_store
+        self._index: Optional[PassageIndex] = None
+        self._signature: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[PassageIndex]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._index = PassageIndex.load(self.path)
+                    self.text_store = TextStore(self.text_store.directory)
+                    self._signature = signature
+                    logging.info(f"📑 Индекс фрагментов загружен: {len(self._index)} фрагментов")
+        return self._index
+
+    def find_many(self, queries: Sequence[str], k: int = PASSAGE_TOP_K) -> List[List[Dict[str, Any]]]:
+        index = self.get()
+        if index is None:
+            return [[] for _ in queries]
+        results = []
+        for top in index.top_many(queries, k):
+            passages = []
+            for passage_id, score in top:
+                passage = index.passage(passage_id, self.text_store)
+                if passage is not None:
+                    passages.append({**passage, "score": score})
+            results.append(passages)
+        return results
+
+    def find(self, query: str, k: int = PASSAGE_TOP_K) -> List[Dict[str, Any]]:
+        return self.find_many([query], k)[0]
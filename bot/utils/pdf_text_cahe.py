@@ -1,18 +1,211 @@
 # bot/utils/pdf_text_cache.py
+import os
+import resource
+import signal
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
 import fitz  # pymupdf
-from io import BytesIO
+
+# Процессы извлечения (по умолчанию — по числу ядер)
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or os.cpu_count() or 1
+
+# Ограничения на один документ: время (секунды), память процесса сверх исходной (МБ)
+# и объём текста (символы)
+PDF_EXTRACT_TIMEOUT = int(os.getenv("PDF_EXTRACT_TIMEOUT", "120"))
+PDF_EXTRACT_MEMORY_MB = int(os.getenv("PDF_EXTRACT_MEMORY_MB", "1024"))
+PDF_EXTRACT_MAX_CHARS = int(os.getenv("PDF_EXTRACT_MAX_CHARS", "2000000"))
+
+# Процесс пересоздаётся после стольких документов, чтобы не копить память MuPDF
+PDF_EXTRACT_TASKS_PER_CHILD = 50
+
+# SIGALRM не прерывает долгий вызов MuPDF в C: зависший процесс завершается
+# из основного, когда задача идёт дольше PDF_EXTRACT_TIMEOUT + этот запас (секунды)
+PDF_EXTRACT_KILL_GRACE = 10
+
+
+class PdfExtractTimeout(Exception):
+    """Документ извлекается дольше PDF_EXTRACT_TIMEOUT"""
+
+
+def iter_pdf_pages(doc: "fitz.Document") -> Iterator[str]:
+    """Текст PDF постранично"""
+    for page in doc:
+        yield page.get_text()
+
 
 def extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
     """
     Извлекает текст из PDF, переданного как bytes.
     """
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
-        return text
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            return "".join(iter_pdf_pages(doc))
     except Exception as e:
         print(f"⚠️ Ошибка при извлечении текста из PDF: {e}")
-        return ""
\ No newline at end of file
+        return ""
+
+
+def write_pdf_text(pdf_path: str, text_path: str, max_chars: int = PDF_EXTRACT_MAX_CHARS) -> Tuple[int, int]:
+    """
+    Пишет текст PDF в файл по мере чтения страниц, не собирая его в памяти.
+    Возвращает (число символов, число страниц); текст обрезается на max_chars.
+    """
+    chars = pages = 0
+    tmp_path = f"{text_path}.tmp"
+    with fitz.open(pdf_path) as doc, open(tmp_path, "w", encoding="utf-8") as out:
+        for page_text in iter_pdf_pages(doc):
+            page_text = page_text[:max_chars - chars]
+            out.write(page_text)
+            chars += len(page_text)
+            pages += 1
+            if chars >= max_chars:
+                break
+    os.replace(tmp_path, text_path)
+    return chars, pages
+
+
+def _current_address_space() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError):
+        return None
+
+
+def _init_extract_worker(memory_mb: int):
+    """Ограничение памяти процесса извлечения (только где доступен /proc)"""
+    # Модули задачи импортируются до замера, чтобы лимит приходился на сам документ
+    import bot.utils.yandex_disk_client  # noqa: F401
+
+    base = _current_address_space()
+    if base is None or memory_mb <= 0:
+        return
+    limit = base + memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _on_timeout(signum, frame):
+    raise PdfExtractTimeout(f"дольше {PDF_EXTRACT_TIMEOUT} с")
+
+
+def _extract_document(disk_path: str, text_path: str, timeout: int, max_chars: int) -> Tuple[int, int]:
+    """Задача процесса: скачать PDF во временный файл и записать его текст"""
+    from bot.utils.yandex_disk_client import download_to_file
+
+    signal.signal(signal.SIGALRM, _on_timeout)
+    signal.alarm(timeout)
+    fd, pdf_path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        download_to_file(disk_path, pdf_path)
+        return write_pdf_text(pdf_path, text_path, max_chars)
+    finally:
+        signal.alarm(0)
+        os.remove(pdf_path)
+
+
+class _PoolBroken(Exception):
+    """Процесс пула погиб (сбой MuPDF, лимит памяти) или был завершён по времени"""
+
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_extract_worker,
+        initargs=(PDF_EXTRACT_MEMORY_MB,),
+        max_tasks_per_child=PDF_EXTRACT_TASKS_PER_CHILD,
+    )
+
+
+def _kill_workers(pool: ProcessPoolExecutor):
+    # Публичного способа остановить задачу в процессе нет: завершаем процессы пула
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+
+
+def _run_pool(
+    pending: Deque[Tuple[str, str]],
+    workers: int,
+    finish: Callable[[str, Future], None],
+) -> List[Tuple[str, str]]:
+    """
+    Выполняет документы из pending, держа в работе не больше workers задач.
+    Если пул сломался, возвращает документы, которые были в работе: любой из
+    них мог быть причиной. Остальные остаются в pending для нового пула.
+    """
+    deadline = PDF_EXTRACT_TIMEOUT + PDF_EXTRACT_KILL_GRACE
+    pool = _new_pool(workers)
+    running: Dict[Future, Tuple[Tuple[str, str], float]] = {}
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                document = pending.popleft()
+                future = pool.submit(_extract_document, *document, PDF_EXTRACT_TIMEOUT, PDF_EXTRACT_MAX_CHARS)
+                running[future] = (document, time.monotonic())
+            completed, _ = wait(running, timeout=1.0, return_when=FIRST_COMPLETED)
+            try:
+                for future in completed:
+                    if isinstance(future.exception(), BrokenProcessPool):
+                        raise _PoolBroken()
+                    document, _ = running.pop(future)
+                    finish(document[0], future)
+                now = time.monotonic()
+                if any(now - started > deadline for _, started in running.values()):
+                    _kill_workers(pool)
+                    raise _PoolBroken()
+            except _PoolBroken:
+                return [document for document, _ in running.values()]
+        return []
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_documents(
+    documents: Iterable[Tuple[str, str]],
+    on_done: Callable[[str, int, int], Any],
+    on_error: Callable[[str, Exception], Any],
+    workers: int = PDF_EXTRACT_WORKERS,
+) -> Dict[str, int]:
+    """
+    Извлекает тексты пар (путь на Диске, файл для текста) в пуле процессов.
+
+    Каждый документ обрабатывается в отдельной задаче с лимитами времени,
+    памяти и объёма текста. Если процесс пула погиб или завис в MuPDF,
+    остальные документы продолжаются в новом пуле, а бывшие в работе
+    повторяются по одному: так падение одного документа не останавливает
+    сборку и не засчитывается соседям. on_done(путь, символы, страницы) и
+    on_error(путь, ошибка) вызываются в текущем процессе по мере готовности.
+    """
+    stats = {"done": 0, "failed": 0}
+
+    def finish(disk_path: str, future: Future):
+        try:
+            chars, pages = future.result()
+        except Exception as e:
+            stats["failed"] += 1
+            on_error(disk_path, e)
+            return
+        stats["done"] += 1
+        on_done(disk_path, chars, pages)
+
+    pending: Deque[Tuple[str, str]] = deque(documents)
+    suspects: List[Tuple[str, str]] = []
+    while pending:
+        suspects.extend(_run_pool(pending, workers, finish))
+
+    # Подозреваемые — по одному в своём пуле: сломавший пул документ падает один
+    for document in suspects:
+        if _run_pool(deque([document]), 1, finish):
+            stats["failed"] += 1
+            on_error(document[0], PdfExtractTimeout(
+                f"процесс извлечения погиб или не уложился в {PDF_EXTRACT_TIMEOUT} с"
+            ))
+    return stats
@@ -0,0 +1,125 @@
+# bot/utils/phonetic.py
+import os
+import re
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from bot.utils.token_index import to_csr
+
+# Слова короче не получают ключа: у коротких слов слишком много совпадений
+PHONETIC_MIN_WORD = 4
+
+_WORD_RE = re.compile(r"[a-zа-яё]+")
+_CYRILLIC_RE = re.compile(r"[а-яё]")
+
+# Кириллица -> латиница (упрощённая транслитерация названий брендов и моделей)
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "zh",
+    "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya",
+})
+
+# Латинские написания, которые звучат одинаково; применяются по порядку
+_SOUND_RULES = [
+    (re.compile(r"igh"), "i"),
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"ck|ch|q"), "k"),
+    (re.compile(r"c(?=[eiy])"), "s"),
+    (re.compile(r"c"), "k"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"(?<=[a-z])h"), ""),
+    (re.compile(r"[aeiouy]+"), "a"),
+    (re.compile(r"(.)\1+"), r"\1"),
+]
+
+
+def translit(text: str) -> str:
+    return text.lower().translate(_TRANSLIT)
+
+
+def phonetic_key(word: str) -> str:
+    """
+    Ключ звучания слова: транслитерация и сведение похожих написаний,
+    гласные — в одну букву. «изикул» и «easycool», «матек» и «matech»,
+    «йилайт» и «yeelight» дают одинаковые ключи.
+    """
+    key = translit(word)
+    for pattern, replacement in _SOUND_RULES:
+        key = pattern.sub(replacement, key)
+    return key
+
+
+def phonetic_keys(text: str) -> List[str]:
+    """Уникальные ключи всех слов текста (в порядке появления)"""
+    keys = (phonetic_key(word) for word in _WORD_RE.findall(text.lower()) if len(word) >= PHONETIC_MIN_WORD)
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+def name_keys(file_name: str) -> str:
+    """Ключи слов имени файла (без расширения) через пробел — поле keys индекса"""
+    return " ".join(phonetic_keys(os.path.splitext(file_name)[0]))
+
+
+def cyrillic_phonetic_keys(text: str) -> List[str]:
+    """
+    Ключи только кириллических слов: латинские слова запроса и так ищутся
+    в именах напрямую, а кириллица до имён доходит лишь через ключи.
+    """
+    words = [word for word in _WORD_RE.findall(text.lower()) if _CYRILLIC_RE.search(word)]
+    return phonetic_keys(" ".join(words))
+
+
+class PhoneticIndex:
+    """
+    Ключ звучания -> документы, в имени которых есть слово с этим ключом.
+
+    Словарь отсортирован (бинарный поиск работает и для строк из mmap),
+    списки документов — CSR-массивы, как в TokenIndex и BM25Index.
+    """
+
+    def __init__(self, vocab: Sequence[str], offsets: np.ndarray, docs: np.ndarray):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.docs = docs
+
+    @classmethod
+    def build(cls, keys: Sequence[str]) -> "PhoneticIndex":
+        """keys[i] — ключи документа i через пробел"""
+        doc_keys = [set(value.split()) for value in keys]
+        vocab = sorted(set().union(*doc_keys)) if doc_keys else []
+        key_ids = {key: i for i, key in enumerate(vocab)}
+        key_list: List[int] = []
+        doc_list: List[int] = []
+        for doc_id, values in enumerate(doc_keys):
+            for key in values:
+                key_list.append(key_ids[key])
+                doc_list.append(doc_id)
+        offsets, docs = to_csr(key_list, doc_list, len(vocab))
+        return cls(vocab, offsets, docs)
+
+    def docs_with(self, key: str) -> np.ndarray:
+        i = bisect_left(self.vocab, key)
+        if i < len(self.vocab) and self.vocab[i] == key:
+            return self.docs[self.offsets[i]:self.offsets[i + 1]]
+        return self.docs[:0]
+
+    def matches(self, keys: Iterable[str], max_docs: Optional[int] = None) -> Dict[int, int]:
+        """
+        doc_id -> число ключей запроса, найденных в имени документа;
+        ключи, которые есть больше чем в max_docs документах, не учитываются
+        """
+        counts: Dict[int, int] = {}
+        for key in set(keys):
+            docs = self.docs_with(key)
+            if max_docs is not None and len(docs) > max_docs:
+                continue
+            for doc_id in docs.tolist():
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+        return counts
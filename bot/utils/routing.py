@@ -0,0 +1,199 @@
+# bot/utils/routing.py
+import json
+import logging
+import os
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# Таблица правил маршрутизации запросов (ссылки на папки и особые случаи поиска)
+ROUTING_RULES_FILE = os.getenv("ROUTING_RULES_FILE", "config/routing_rules.json")
+
+# Действия правил: ответ ссылками, полный поиск без перенаправления, поиск кабеля KNX
+ROUTE_LINKS = "links"
+ROUTE_SEARCH = "search"
+ROUTE_KNX_CABLE = "knx_cable"
+ROUTE_ACTIONS = {ROUTE_LINKS, ROUTE_SEARCH, ROUTE_KNX_CABLE}
+
+
+class AhoCorasick:
+    """Автомат Ахо-Корасик: все вхождения всех шаблонов за один проход по тексту"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for pattern in dict.fromkeys(patterns):
+            if pattern:
+                self._add(pattern)
+        self._link()
+
+    def _add(self, pattern: str):
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(len(self.patterns))
+        self.patterns.append(pattern)
+
+    def _link(self):
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> Set[int]:
+        """Номера шаблонов, входящих в текст"""
+        found: Set[int] = set()
+        node = 0
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            found.update(self._out[node])
+        return found
+
+
+class RouteRule:
+    """
+    Правило маршрутизации из таблицы.
+
+    when — список альтернатив (ИЛИ), альтернатива — список условий (И),
+    условие — {"contains": [...]} (подстрока), {"words": [...]} (целое слово)
+    или {"exact": [...]} (весь запрос); условие выполнено, если сработал
+    хотя бы один его шаблон.
+    """
+
+    def __init__(self, name: str, priority: int, action: str,
+                 when: List[List[Dict[str, List[str]]]], links: Optional[List[Dict[str, str]]] = None):
+        if action not in ROUTE_ACTIONS:
+            raise ValueError(f"Правило {name}: неизвестное действие {action}")
+        if action == ROUTE_LINKS and not links:
+            raise ValueError(f"Правило {name}: нет ссылок")
+        self.name = name
+        self.priority = priority
+        self.action = action
+        self.when = when
+        self.links = links or []
+
+    def results(self, query: str) -> List[Dict[str, Any]]:
+        """Ответ ссылками на папки в формате результатов поиска"""
+        return [
+            {
+                "name": link["name"].replace("{query}", query),
+                "path": link["url"],
+                "is_folder_link": True,
+                "folder_link": link["url"],
+            }
+            for link in self.links
+        ]
+
+
+class Router:
+    """
+    Все правила таблицы, скомпилированные в один автомат.
+
+    Подстроки всех правил ищутся одним проходом Ахо-Корасик, слова —
+    по множеству слов запроса, точные совпадения — по словарю. Проверяются
+    только правила, у которых сработал хотя бы один шаблон, поэтому цена
+    маршрутизации не растёт с числом правил.
+    """
+
+    def __init__(self, rules: List[RouteRule]):
+        self.rules = sorted(rules, key=lambda rule: -rule.priority)
+        contains: Dict[str, None] = {}
+        self._words: Dict[str, Set[int]] = {}
+        self._exact: Dict[str, Set[int]] = {}
+        self._contains_rules: Dict[str, Set[int]] = {}
+        # Условие скомпилировано в (вид, множество шаблонов в нижнем регистре)
+        self._conditions: List[List[List[Tuple[str, FrozenSet]]]] = []
+        for rule_id, rule in enumerate(self.rules):
+            alternatives = []
+            for alternative in rule.when:
+                conditions = []
+                for condition in alternative:
+                    (kind, patterns), = condition.items()
+                    patterns = [p.lower().strip() if kind == "exact" else p.lower() for p in patterns]
+                    if kind == "contains":
+                        for pattern in patterns:
+                            contains[pattern] = None
+                            self._contains_rules.setdefault(pattern, set()).add(rule_id)
+                    elif kind == "words":
+                        for pattern in patterns:
+                            self._words.setdefault(pattern, set()).add(rule_id)
+                    elif kind == "exact":
+                        for pattern in patterns:
+                            self._exact.setdefault(pattern, set()).add(rule_id)
+                    else:
+                        raise ValueError(f"Правило {rule.name}: неизвестное условие {kind}")
+                    conditions.append((kind, frozenset(patterns)))
+                alternatives.append(conditions)
+            self._conditions.append(alternatives)
+        self._automaton = AhoCorasick(contains)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "Router":
+        return cls([RouteRule(**rule) for rule in config.get("rules", [])])
+
+    @classmethod
+    def from_file(cls, path: str = ROUTING_RULES_FILE) -> "Router":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_config(json.load(f))
+
+    def match(self, query: str, actions: Optional[Set[str]] = None,
+              below: Optional[int] = None) -> Optional[RouteRule]:
+        """
+        Сработавшее правило с наибольшим приоритетом; при заданных actions
+        и below — только среди правил с этими действиями и приоритетом ниже below.
+        """
+        query_lower = query.lower().strip()
+        hits = {self._automaton.patterns[i] for i in self._automaton.find(query_lower)}
+        words = set(query_lower.split())
+
+        candidates: Set[int] = set(self._exact.get(query_lower, ()))
+        for pattern in hits:
+            candidates |= self._contains_rules[pattern]
+        for word in words & self._words.keys():
+            candidates |= self._words[word]
+
+        for rule_id in sorted(candidates):
+            rule = self.rules[rule_id]
+            if actions is not None and rule.action not in actions:
+                continue
+            if below is not None and rule.priority >= below:
+                continue
+            if any(self._satisfied(conditions, query_lower, hits, words) for conditions in self._conditions[rule_id]):
+                return rule
+        return None
+
+    @staticmethod
+    def _satisfied(conditions, query_lower: str, hits: Set[str], words: Set[str]) -> bool:
+        for kind, patterns in conditions:
+            if kind == "contains":
+                if patterns.isdisjoint(hits):
+                    return False
+            elif kind == "words":
+                if patterns.isdisjoint(words):
+                    return False
+            elif query_lower not in patterns:
+                return False
+        return True
+
+
+def load_router(path: str = ROUTING_RULES_FILE) -> Router:
+    """Таблица правил из файла; без файла маршрутизация отключена"""
+    try:
+        return Router.from_file(path)
+    except FileNotFoundError:
+        logging.warning(f"Routing rules file {path} not found")
+        return Router([])
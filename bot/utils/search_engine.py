@@ -1,12 +1,27 @@
 import os
+import asyncio
 import json
 import logging
 import re
+import threading
 import requests
 import urllib.parse
-from typing import List, Dict, Any, Tuple
-from difflib import SequenceMatcher
+from typing import List, Dict, Any, Tuple, Optional, Sequence
+import numpy as np
 from dotenv import load_dotenv
+from bot.utils.synonyms import SYNONYMS, QUERY_EXPANSIONS, normalize_with_synonyms
+from bot.utils.ngram_similarity import similarity
+from bot.utils.bm25 import query_terms
+from bot.utils.search_index import SearchIndex, binary_index_path, texts_dir
+from bot.utils.token_index import INDEX_FIELDS, WORD_CACHE_LIMIT
+from bot.utils.text_store import TextStore
+from bot.utils.search_pool import SearchQueueFull, get_search_pool
+from bot.utils.cache import LRUTTLCache
+from bot.utils.spelling import SPELLING_PREFIX_LENGTH, SpellChecker, without_stems
+from bot.utils.phonetic import cyrillic_phonetic_keys
+from bot.utils.passages import PassageSearch, passage_index_path
+from bot.utils.intent_classifier import get_intent_classifier
+from bot.utils.routing import ROUTE_KNX_CABLE, ROUTE_LINKS, ROUTING_RULES_FILE, Router, load_router
 
 load_dotenv()
 
@@ -21,41 +36,73 @@ if not DOCS_PUBLIC_KEY:
     raise ValueError("❌ DOCS_PUBLIC_KEY не найден в .env")
 
 BASE_URL = "https://cloud-api.yandex.net/v1/disk"
-HEADERS = {
-    "Authorization": f"OAuth {YANDEX_DISK_TOKEN}"
-}
 
-# Глобальные синонимы для поиска
-SYNONYMS = {
-    "кабель": "cable", "кникс": "knx", "кнх": "knx", "датчик": "sensor",
-    "реле": "relay", "контроллер": "controller", "панель": "panel",
-    "инструкция": "manual", "паспорт": "datasheet", "урри": "urri",
-    "юрии": "urri", "хдл": "hdl", "баспро": "buspro", "баспр": "buspro",
-    "матек": "matech", "матеч": "matech", "йилайт": "yeelight",
-    "изикул": "easycool", "кабел": "cable", "замок": "lock",
-    "дверной": "door", "иот": "iot", "айоти": "iot", "техничка": "technical",
-    "кулплуг": "coolplug",
-    "кулплаг": "coolplug",
-    "кулплаг техничка": "coolplug manual",
-    "кулплаг мануал": "coolplug manual","кулплагтехничка": "coolplug manual","кулплагмануал": "coolplug manual",
+# Индекс файлов и период проверки его обновления (секунды)
+SEARCH_INDEX_FILE = os.getenv("SEARCH_INDEX_FILE", "data/cache/file_index.json")
+SEARCH_INDEX_RELOAD_INTERVAL = float(os.getenv("SEARCH_INDEX_RELOAD_INTERVAL", "30"))
+
+# Вклад полнотекстового поиска по PDF в релевантность и число документов-кандидатов от него
+CONTENT_WEIGHT = 8.0
+CONTENT_CANDIDATES = 50
+# Оценка BM25 ниже порога не учитывается (одно частое слово столько не набирает),
+# полный вес CONTENT_WEIGHT даёт оценка от CONTENT_FULL_SCORE (редкое слово в нескольких местах)
+CONTENT_MIN_SCORE = float(os.getenv("CONTENT_MIN_SCORE", "4.0"))
+CONTENT_FULL_SCORE = float(os.getenv("CONTENT_FULL_SCORE", "15.0"))
+
+# Вклад каждого кириллического слова запроса, совпавшего по звучанию со словом имени
+# (как совпадение слова в name и norm_name)
+PHONETIC_WEIGHT = 5.0
+# Ключи из большей доли имён («паспорт», «хдл») почти ничего не различают и не учитываются
+PHONETIC_MAX_SHARE = 0.05
+
+# Бонусы запросу «кабель knx» за признаки кабеля YE00820 в имени или пути файла
+KNX_CABLE_BONUS = {
+    "ye00820": 100,
+    "j-y(st)y": 80,
+    "2x2x0,8": 60,
+    "knx кабель": 40,
+    "кабель knx": 40
 }
 
-def normalize_with_synonyms(query: str) -> str:
-    """Нормализация текста с синонимами"""
-    query_lower = query.lower().strip()
-    for wrong, correct in sorted(SYNONYMS.items(), key=lambda x: -len(x[0])):
-        query_lower = query_lower.replace(wrong, correct)
-    cleaned = re.sub(r"[^a-z0-9\s]", " ", query_lower)
-    return re.sub(r"\s+", " ", cleaned).strip()
+# Запас к верхней оценке на погрешность сложения float
+RELEVANCE_BOUND_EPSILON = 1e-6
+
+# Кэш результатов поиска: число записей и время жизни (секунды)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+
+# Сколько запросов search_batch оценивает за один проход по матрице n-грамм
+SEARCH_BATCH_SIZE = 32
+
+# Подсказка «Возможно, вы имели в виду» — только если исправление меняет
+# столько первых результатов поиска (их показывает бот)
+SPELLING_SUGGESTION_DEPTH = 3
+
+# Ветки hybrid_search (для анализа трафика)
+BRANCH_FOLDER_REDIRECT = "folder_redirect"
+BRANCH_KNX_CABLE = "knx_cable"
+BRANCH_SCORED = "scored"
+BRANCH_OLD_FALLBACK = "old_fallback"
+BRANCH_NOT_FOUND = "not_found"
+SEARCH_BRANCHES = (BRANCH_FOLDER_REDIRECT, BRANCH_KNX_CABLE, BRANCH_SCORED, BRANCH_OLD_FALLBACK, BRANCH_NOT_FOUND)
+
+HEADERS = {
+    "Authorization": f"OAuth {YANDEX_DISK_TOKEN}"
+}
 
 def get_folder_contents(path: str) -> List[Dict]:
-    """Получение содержимого папки Яндекс.Диска"""
+    """Получение содержимого папки Яндекс.Диска (все страницы листинга)"""
     url = f"{BASE_URL}/resources"
-    params = {"path": path, "limit": 1000}
-    response = requests.get(url, headers=HEADERS, params=params)
-    response.raise_for_status()
-    data = response.json()
-    return data.get("_embedded", {}).get("items", [])
+    limit = 1000
+    items: List[Dict] = []
+    while True:
+        params = {"path": path, "limit": limit, "offset": len(items)}
+        response = requests.get(url, headers=HEADERS, params=params)
+        response.raise_for_status()
+        page = response.json().get("_embedded", {}).get("items", [])
+        items.extend(page)
+        if len(page) < limit:
+            return items
 
 def build_docs_url(file_path: str) -> str:
     """Построение URL для просмотра документа"""
@@ -76,142 +123,72 @@ def build_docs_url(file_path: str) -> str:
         f"&name={encoded_name}&nosw=1"
     )
 
+def read_index_file(index_file: str) -> List[Dict[str, Any]]:
+    """Чтение индекса файлов; ошибки разбора пробрасываются вызывающему"""
+    with open(index_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return list(data.values())
+    return data
+
+def load_search_index(index_file: str) -> SearchIndex:
+    """Бинарный индекс (mmap), если он не старее JSON; иначе разбор file_index.json"""
+    binary_file = binary_index_path(index_file)
+    if os.path.exists(binary_file) and (
+        not os.path.exists(index_file) or os.path.getmtime(binary_file) >= os.path.getmtime(index_file)
+    ):
+        try:
+            return SearchIndex.open(binary_file)
+        except Exception as e:
+            logging.warning(f"Binary index {binary_file} skipped: {e}")
+    return SearchIndex.build(read_index_file(index_file), TextStore(texts_dir(index_file)))
+
+class SearchPlan:
+    """Разобранный запрос: варианты, совпадения по тексту PDF и по звучанию, кандидаты"""
+
+    def __init__(self, variants: List[str], content: Dict[int, float], phonetic: Dict[int, int],
+                 candidates: List[int]):
+        self.variants = variants
+        self.content = content
+        self.phonetic = phonetic
+        self.candidates = candidates
+
+
 class SearchEngine:
     """Оптимизированный поисковый движок для документации"""
 
-    def __init__(self, index_file: str = "data/cache/file_index.json"):
+    def __init__(self, index_file: str = SEARCH_INDEX_FILE,
+                 file_index: Optional[List[Dict[str, Any]]] = None, generation: int = 0,
+                 search_index: Optional[SearchIndex] = None, router: Optional[Router] = None,
+                 signature: Optional[tuple] = None):
         self.index_file = index_file
-        self.file_index = self.load_index()
+        if search_index is None:
+            search_index = SearchIndex.build(
+                file_index if file_index is not None else self.load_index(),
+                TextStore(texts_dir(index_file)),
+            )
+        self.index = search_index
+        self.file_index = search_index.documents
+        self.token_index = search_index.token_index
+        self.generation = generation
+        # mtime и размер файлов, из которых собран снимок: в отличие от номера
+        # поколения, одинаковы в процессе бота и в процессах пула поиска
+        self.signature = signature
         self._normalize_cache = {}
 
-        self.synonyms = {
-            "кабель": ["cable", "провод", "wire", "кабел"],
-            "knx": ["кникс", "кнх", "knx"],
-            "датчик": ["sensor", "сенсор", "детектор"],
-            "реле": ["relay", "рел", "переключатель"],
-            "контроллер": ["controller", "control", "управляющий"],
-            "панель": ["panel", "панел"],
-            "инструкция": ["manual", "instruction", "руководство"],
-            "паспорт": ["datasheet", "technical", "технический"],
-            "карниз": ["curtain", "track", "штора", "рельс"],
-            "радиусный": ["изогнутый", "дуговой", "curved"],
-            "спецификация": ["spec", "технические характеристики", "техничка"],
-            "кондиционер": ["ac", "air conditioner", "климат", "сплит"],
-            "совместимость": ["совместим", "работает с", "поддержка", "интеграция"],
-            "модель": ["модели", "артикул", "серия"],
-            "urri": ["урри", "юрии"],
-            "hdl": ["хдл"],
-            "buspro": ["баспро", "баспр"],
-            "matech": ["матек", "матеч"],
-            "yeelight": ["йилайт", "yee light"],
-            "easycool": ["изикул", "easy cool", "изи кул"],
-            "кабел": ["кабель", "cable"],
-            "замок": ["lock", "дверной замок", "door lock"],
-            "кулплаг": ["кулплаг", "кул плаг", "кулплаг техничка", "кулплаг мануал"],
-            "замки": ["locks", "дверные замки", "door locks"],
-            "дверной": ["door", "дверной"],
-            "iot": ["иот", "iot systems", "айоти"],
-            "техничка": ["техническая", "technical", "документация", "паспорт"]
-        }
+        self.synonyms = QUERY_EXPANSIONS
 
-        self.folder_links = {
-            # Кабели
-            "кабель": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/02.%20iOT%20%D0%9A%D0%B0%D0%B1%D0%B5%D0%BB%D1%8C",
-            "кабели": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/02.%20iOT%20%D0%9A%D0%B0%D0%B1%D0%B5%D0%BB%D1%8C",
-            "cable": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/02.%20iOT%20%D0%9A%D0%B0%D0%B1%D0%B5%D0%BB%D1%8C",
-            "техничка на кабель": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/02.%20iOT%20%D0%9A%D0%B0%D0%B1%D0%B5%D0%BB%D1%8C",
-            "кабель иот": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/02.%20iOT%20%D0%9A%D0%B0%D0%B1%D0%B5%D0%BB%D1%8C",
-            "кабель iot": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/02.%20iOT%20%D0%9A%D0%B0%D0%B1%D0%B5%D0%BB%D1%8C",
-            "iot кабель": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/02.%20iOT%20%D0%9A%D0%B0%D0%B1%D0%B5%D0%BB%D1%8C",
-
-            # Замки
-            "замок": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/04.%20%D0%94%D0%B2%D0%B5%D1%80%D0%BD%D1%8B%D0%B5%20%D0%B7%D0%B0%D0%BC%D0%BA%D0%B8%20iOT%20Systems",
-            "замки": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/04.%20%D0%94%D0%B2%D0%B5%D1%80%D0%BD%D1%8B%D0%B5%20%D0%B7%D0%B0%D0%BC%D0%BA%D0%B8%20iOT%20Systems",
-            "дверной замок": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/04.%20%D0%94%D0%B2%D0%B5%D1%80%D0%BD%D1%8B%D0%B5%20%D0%B7%D0%B0%D0%BC%D0%BA%D0%B8%20iOT%20Systems",
-            "дверные замки": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/04.%20%D0%94%D0%B2%D0%B5%D1%80%D0%BD%D1%8B%D0%B5%20%D0%B7%D0%B0%D0%BC%D0%BA%D0%B8%20iOT%20Systems",
-            "замки iot": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/04.%20%D0%94%D0%B2%D0%B5%D1%80%D0%BD%D1%8B%D0%B5%20%D0%B7%D0%B0%D0%BC%D0%BA%D0%B8%20iOT%20Systems",
-            "замки иот": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/04.%20%D0%94%D0%B2%D0%B5%D1%80%D0%BD%D1%8B%D0%B5%20%D0%B7%D0%B0%D0%BC%D0%BA%D0%B8%20iOT%20Systems",
-            "iot замок": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/04.%20%D0%94%D0%B2%D0%B5%D1%80%D0%BD%D1%8B%D0%B5%20%D0%B7%D0%B0%D0%BC%D0%BA%D0%B8%20iOT%20Systems",
-            "door lock": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/04.%20%D0%94%D0%B2%D0%B5%D1%80%D0%BD%D1%8B%D0%B5%20%D0%B7%D0%B0%D0%BC%D0%BA%D0%B8%20iOT%20Systems",
-
-            # Алиса
-            "алиса": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/02.%20HDL/09.%20%D0%98%D0%BD%D1%82%D0%B5%D0%B3%D1%80%D0%B0%D1%86%D0%B8%D1%8F%20%D1%81%20%D0%B3%D0%BE%D0%BB%D0%BE%D1%81%D0%BE%D0%B2%D1%8B%D0%BC%D0%B8%20%D0%B0%D1%81%D1%81%D0%B8%D1%81%D1%82%D0%B5%D0%BD%D1%82%D0%B0%D0%BC%D0%B8.%20Buspro%20%D0%B8%20KNX",
-            "яндекс алиса": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/02.%20HDL/09.%20%D0%98%D0%BD%D1%82%D0%B5%D0%B3%D1%80%D0%B0%D1%86%D0%B8%D1%8F%20%D1%81%20%D0%B3%D0%BE%D0%BB%D0%BE%D1%81%D0%BE%D0%B2%D1%8B%D0%BC%D0%B8%20%D0%B0%D1%81%D1%81%D0%B8%D1%81%D1%82%D0%B5%D0%BD%D1%82%D0%B0%D0%BC%D0%B8.%20Buspro%20%D0%B8%20KNX",
-            "голосовой ассистент": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/02.%20HDL/09.%20%D0%98%D0%BD%D1%82%D0%B5%D0%B3%D1%80%D0%B0%D1%86%D0%B8%D1%8F%20%D1%81%20%D0%B3%D0%BE%D0%BB%D0%BE%D1%81%D0%BE%D0%B2%D1%8B%D0%BC%D0%B8%20%D0%B0%D1%81%D1%81%D0%B8%D1%81%D1%82%D0%B5%D0%BD%D1%82%D0%B0%D0%BC%D0%B8.%20Buspro%20%D0%B8%20KNX",
-            "mgwip": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/02.%20HDL/09.%20%D0%98%D0%BD%D1%82%D0%B5%D0%B3%D1%80%D0%B0%D1%86%D0%B8%D1%8F%20%D1%81%20%D0%B3%D0%BE%D0%BB%D0%BE%D1%81%D0%BE%D0%B2%D1%8B%D0%BC%D0%B8%20%D0%B0%D1%81%D1%81%D0%B8%D1%81%D1%82%D0%B5%D0%BD%D1%82%D0%B0%D0%BC%D0%B8.%20Buspro%20%D0%B8%20KNX",
-
-            # Карнизы — точные совпадения
-            "карниз buspro": "https://disk.360.yandex.ru/d/20Q51Ey5rDMXqA",
-            "карниз баспро": "https://disk.360.yandex.ru/d/20Q51Ey5rDMXqA",
-            "карниз бас про": "https://disk.360.yandex.ru/d/20Q51Ey5rDMXqA",
-            "карнизы buspro": "https://disk.360.yandex.ru/d/20Q51Ey5rDMXqA",
-            "карнизы баспро": "https://disk.360.yandex.ru/d/20Q51Ey5rDMXqA",
-            "карниз knx": "https://disk.360.yandex.ru/d/x1w6XEUthCgTVg",
-            "карниз кникс": "https://disk.360.yandex.ru/d/x1w6XEUthCgTVg",
-            "карнизы knx": "https://disk.360.yandex.ru/d/x1w6XEUthCgTVg",
-            "карнизы кникс": "https://disk.360.yandex.ru/d/x1w6XEUthCgTVg",
-            "карниз по протоколу knx": "https://disk.360.yandex.ru/d/x1w6XEUthCgTVg",
-
-            # Кондиционеры — точные совпадения
-            "кондиционеры easycool": "https://disk.360.yandex.ru/d/EuWsEkI__LPmIQ",
-            "easycool кондиционеры": "https://disk.360.yandex.ru/d/EuWsEkI__LPmIQ",
-            "кондиционеры coolautomation": "https://disk.360.yandex.ru/d/UVzihaR7eRIRmw",
-            "coolautomation кондиционеры": "https://disk.360.yandex.ru/d/UVzihaR7eRIRmw",
-            
-            # === НОВОЕ: CoolPlug ===
-            "кулплаг": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/03.%20Coolautomation/3.%20CooLink%20Hub%20%26%20Coolplug  ",
-            "техничка на кулплаг": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/03.%20Coolautomation/3.%20CooLink%20Hub%20%26%20Coolplug  ",
-            "отправь на кулплаг": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/03.%20Coolautomation/3.%20CooLink%20Hub%20%26%20Coolplug  ",
-            "Пришли техничку на кулплаг": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/03.%20Coolautomation/3.%20CooLink%20Hub%20%26%20Coolplug  ",
-            "кулплаг техничка": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/03.%20Coolautomation/3.%20CooLink%20Hub%20%26%20Coolplug  ",
-            "кулплаг мануал": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/03.%20Coolautomation/3.%20CooLink%20Hub%20%26%20Coolplug  ",
-            "кулплагтехничка": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/03.%20Coolautomation/3.%20CooLink%20Hub%20%26%20Coolplug  ",
-            "кулплагмануал": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/03.%20Coolautomation/3.%20CooLink%20Hub%20%26%20Coolplug  ",
-        
-
-            # EasyCool
-            "изикул": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/03.%20iOT%20EasyCool",
-            "easycool": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/03.%20iOT%20EasyCool",
-            "изи кул": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/03.%20iOT%20EasyCool",
-            "техничка на изикул": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/03.%20iOT%20EasyCool",
-            "документация изикул": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/03.%20iOT%20EasyCool",
-            "паспорт на изикул": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/03.%20iOT%20EasyCool",
-            "нужна техничка на изикул": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/03.%20iOT%20EasyCool",
-            "изикул баспро": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/03.%20iOT%20EasyCool",
-            "изикул knx": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/03.%20iOT%20EasyCool",
-            "изикул buspro": "https://disk.360.yandex.ru/d/xJi6eEXBTq01sw/01.%20iOT%20Systems/03.%20iOT%20EasyCool",
-        }
+        # Словарь опечаток: слова имён и путей файлов и ключи синонимов без основ
+        self.spelling = SpellChecker.build(
+            self.token_index.tokens, without_stems(list(SYNONYMS) + list(QUERY_EXPANSIONS))
+        )
 
-        # Ключевые слова
-        self._alisa_keywords = {"алис", "яндекс алис", "yandex alice", "alisa", "mgwip", "голосов", "голосовой", "ассистент"}
-        self._integration_keywords = {"интеграци", "настрои", "подключи", "связк", "связать", "объединить"}
-        self._cable_keywords = {"кабель", "cable", "техничка на кабель", "кабель иот", "кабель iot", "iot кабель"}
-        self._lock_keywords = {"замок", "замки", "дверной замок", "дверные замки", "замки iot", "замки иот", "iot замок"}
-        self._easycool_keywords = {
-            "изикул", "easycool", "изи кул", "техничка на изикул", "документация изикул",
-            "паспорт на изикул", "нужна техничка на изикул", "изикул баспро", "изикул knx", "изикул buspro"
-        }
-        self._curtain_general_keywords = {
-            "карниз", "карнизы", "радиусный карниз", "спецификация на карнизы",
-            "паспорт карнизов", "техничка на карниз", "карниз по протоколу"
-        }
-        self._ac_general_keywords = {
-            "кондиционер", "кондиционеры", "кондиционеры баспро", "кондиционеры совместимы",
-            "кондиционеры модели", "совместимость кондиционеров", "кондиционеры с протоколом",
-            "спецификация кондиционеров", "паспорт кондиционера", "техничка на кондиционер"
-        }
-        self._coolplug_keywords = {
-            "кулплаг", "Пришли техничку на кулплаг",  "кулплуг", "отправь на кулплаг", "техничка на кулплаг", "кулплаг техничка", "кулплаг мануал", "кулплагтехничка", "кулплагмануал"
-        }
+        self.router = router if router is not None else load_router()
 
     def load_index(self) -> List[Dict[str, Any]]:
         try:
             if os.path.exists(self.index_file):
-                with open(self.index_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if isinstance(data, dict):
-                        return list(data.values())
-                    return data
+                return read_index_file(self.index_file)
             else:
                 logging.warning(f"Index file {self.index_file} not found")
                 return []
@@ -225,6 +202,9 @@ class SearchEngine:
         if text in self._normalize_cache:
             return self._normalize_cache[text]
         normalized = normalize_with_synonyms(text)
+        # Движок живёт весь процесс, а ключи — сырой текст пользователей: кэш ограничен
+        if len(self._normalize_cache) >= WORD_CACHE_LIMIT:
+            self._normalize_cache.clear()
         self._normalize_cache[text] = normalized
         return normalized
 
@@ -242,106 +222,119 @@ class SearchEngine:
                     expanded_queries.add(' '.join(new_words))
         return list(expanded_queries)
 
-    def should_redirect_to_folder(self, query: str) -> Tuple[bool, str]:
-        query_lower = query.lower().strip()
-        logging.info(f"🔍 Проверка перенаправления для: '{query}' -> '{query_lower}'")
-
-        # Точное совпадение
-        if query_lower in self.folder_links:
-            logging.info(f"🎯 ТОЧНОЕ СОВПАДЕНИЕ: '{query}' -> папка")
-            return True, self.folder_links[query_lower]
-
-        # Кондиционеры
-        if any(kw in query_lower for kw in self._ac_general_keywords):
-            logging.info(f"🎯 ОБЩИЙ ЗАПРОС ПРО КОНДИЦИОНЕРЫ: '{query}' → обе папки")
-            return True, "__AC_BOTH__"
-
-        # Карнизы
-        if any(kw in query_lower for kw in self._curtain_general_keywords):
-            logging.info(f"🎯 ОБЩИЙ ЗАПРОС ПРО КАРНИЗЫ: '{query}' → обе папки")
-            return True, "__CURTAINS_BOTH__"
-
-        # EasyCool
-        easycool_patterns = ["изикул", "easycool", "изи кул"]
-        if any(pattern in query_lower for pattern in easycool_patterns):
-            logging.info(f"🎯 EASYCOOL ЗАПРОС: '{query}' -> папка Easycool")
-            return True, self.folder_links["изикул"]
-
-        # Исключаем KNX из общих правил (обрабатывается отдельно)
-        if "knx" in query_lower:
-            return False, ""
-
-        # Кабели и замки
-        if any(kw in query_lower for kw in self._cable_keywords) and "knx" not in query_lower:
-            return True, self.folder_links["кабель"]
-        if any(kw in query_lower for kw in self._lock_keywords):
-            return True, self.folder_links["замки"]
-
-        logging.info(f"❌ Перенаправление не требуется для: '{query}'")
-        return False, ""
-
-    def is_knx_cable_query(self, query: str) -> bool:
-        query_lower = query.lower().strip()
-        exact_knx_queries = {
-            "кабель knx", "knx кабель", "cable knx", "knx cable",
-            "knx кабел", "ye00820", "j-y(st)y", "2x2x0,8"
-        }
-        if any(exact_query in query_lower for exact_query in exact_knx_queries):
+    def _is_known_word(self, word: str) -> bool:
+        """
+        Слово не опечатка: оно есть в имени или пути файла как есть или после
+        нормализации, либо встречается в тексте PDF (так не «исправляются»
+        падежные формы)
+        """
+        if self.index.content is not None and self.index.content.term_id(word) is not None:
             return True
-        words = set(query_lower.split())
-        has_knx = any("knx" in word for word in words)
-        has_cable = any(word in {"кабель", "cable", "кабел"} for word in words)
-        return has_knx and has_cable
-
-    def is_alisa_integration_query(self, query: str) -> bool:
-        query_lower = query.lower()
-        has_alisa = any(keyword in query_lower for keyword in self._alisa_keywords)
-        has_integration = any(keyword in query_lower for keyword in self._integration_keywords)
-        return has_alisa and has_integration
+        if self.token_index.docs_containing(word):
+            return True
+        normalized = self.normalize_text(word).split()
+        return any(self.token_index.docs_containing(part) for part in normalized)
+
+    def correct_query(self, query: str) -> Tuple[str, bool]:
+        """Запрос с исправленными опечатками в неизвестных словах и признак исправления"""
+        return self.spelling.correct(query, self._is_known_word)
+
+    def spelling_suggestion(self, query: str) -> Optional[str]:
+        """
+        «Возможно, вы имели в виду»: исправленный запрос или None.
+        Исправление, после которого находятся те же файлы, не предлагается.
+        """
+        corrected, changed = self.correct_query(query)
+        if not changed:
+            return None
+        found = [d["path"] for d in self.search(query, SPELLING_SUGGESTION_DEPTH)]
+        as_typed = [d["path"] for d in self.search(query, SPELLING_SUGGESTION_DEPTH, correct=False)]
+        return corrected if found != as_typed else None
 
-    def get_alisa_integration_link(self) -> str:
-        return self.folder_links["алиса"]
+    def is_knx_cable_query(self, query: str) -> bool:
+        return self.router.match(query, {ROUTE_KNX_CABLE}) is not None
 
     def find_knx_cable_files(self) -> List[Dict[str, Any]]:
         knx_cable_keywords = [
             "ye00820", "j-y(st)y", "2x2x0,8", "knx кабель", "кабель knx", "кабель j-y", "j-y st y"
         ]
+        candidates = set()
+        for keyword in knx_cable_keywords:
+            candidates |= self.token_index.docs_containing_phrase(keyword, ("name", "path"))
         scored_files = []
-        for file_data in self.file_index:
-            file_name = file_data.get("name", "").lower()
-            file_path = file_data.get("path", "").lower()
+        for doc_id in sorted(candidates):
+            file_name, file_path, _ = self.index.fields(doc_id)
             search_text = f"{file_name} {file_path}"
             score = 0
             for i, keyword in enumerate(knx_cable_keywords):
                 if keyword in search_text:
                     score += (len(knx_cable_keywords) - i) * 100
             if score > 0:
-                scored_files.append((score, file_data))
+                scored_files.append((score, doc_id))
         scored_files.sort(key=lambda x: x[0], reverse=True)
-        return [file_data for score, file_data in scored_files]
+        return [self.file_index[doc_id] for score, doc_id in scored_files]
+
+    def _filter_flags(self, query: str) -> Tuple[bool, bool]:
+        """Какие фильтры filter_irrelevant_results сработают для запроса"""
+        query_lower = query.lower()
+        skip_datasheets = any(w in query_lower for w in ['интеграц', 'протокол', 'api', 'настройк', 'как'])
+        skip_non_controllers = 'контроллер' in query_lower or 'controller' in query_lower
+        return skip_datasheets, skip_non_controllers
 
     def filter_irrelevant_results(self, results: List[Dict], query: str) -> List[Dict]:
         if not results:
             return []
-        query_lower = query.lower()
+        skip_datasheets, skip_non_controllers = self._filter_flags(query)
         filtered_results = []
         for result in results:
             name = result.get('name', '').lower()
-            if any(w in query_lower for w in ['интеграц', 'протокол', 'api', 'настройк', 'как']):
+            if skip_datasheets:
                 if any(t in name for t in ['паспорт', 'datasheet', 'техническ', 'r5-', 'технический']):
                     continue
-            if 'контроллер' in query_lower or 'controller' in query_lower:
+            if skip_non_controllers:
                 if any(irr in name for irr in ['датчик', 'sensor', 'реле', 'relay', 'кабель', 'cable']):
                     continue
             filtered_results.append(result)
         return filtered_results
 
-    def calculate_relevance(self, file_data: Dict[str, Any], query_variants: List[str]) -> float:
+    def result_cache_key(self, query: str, limit: int) -> tuple:
+        """
+        Ключ кэша результатов hybrid_search(route=False).
+
+        Ранжирование по именам зависит только от нормализованного запроса, но ветка
+        KNX-кабеля, фильтр нерелевантных файлов и поиск по тексту PDF смотрят
+        на исходный текст — их признаки тоже в ключе. Первым идёт сигнатура
+        снимка индекса: результаты прежнего снимка под новый ключ не попадут.
+        """
+        return (self.signature, self.normalize_text(self.correct_query(query)[0]), limit,
+                self.is_knx_cable_query(query), self._filter_flags(query),
+                tuple(sorted(set(query_terms(query)))))
+
+    def fuzzy_scores(self, query_variants: List[str]) -> np.ndarray:
+        """
+        Оценки сверху нечёткой похожести (SequenceMatcher.ratio()) каждого
+        варианта запроса на имя и на путь каждого файла, форма (варианты, 2, N) —
+        для отсечения в _rank
+        """
+        similarity = self.index.ngrams.similarity_batch(query_variants)
+        return similarity.reshape(len(query_variants), 2, len(self.file_index))
+
+    def calculate_relevance(self, file_data: Optional[Dict[str, Any]], query_variants: List[str],
+                            fields: Optional[Tuple[str, str, str]] = None) -> float:
+        if fields is None:
+            fields = tuple(str(file_data.get(field, "")).lower() for field in INDEX_FIELDS)
+        file_name, file_path, _ = fields
         max_score = 0
-        file_name = file_data.get("name", "").lower()
-        file_path = file_data.get("path", "").lower()
-        norm_name = file_data.get("norm_name", "").lower()
+        for query, score in zip(query_variants, self.relevance_parts(query_variants, fields)):
+            score += max(similarity(query, file_name), similarity(query, file_path)) * 5
+            max_score = max(max_score, score)
+        return max_score
+
+    def relevance_parts(self, query_variants: List[str], fields: Tuple[str, str, str]) -> List[float]:
+        """Оценка каждого варианта запроса без нечёткой похожести (её calculate_relevance добавляет последней)"""
+        file_name, file_path, norm_name = fields
         search_text = f"{file_name} {file_path} {norm_name}"
+        parts = []
         for query in query_variants:
             score = 0
             query_words = set(query.split())
@@ -353,9 +346,6 @@ class SearchEngine:
                 score += 7
             if query in file_path:
                 score += 6
-            name_similarity = SequenceMatcher(None, query, file_name).ratio()
-            path_similarity = SequenceMatcher(None, query, file_path).ratio()
-            score += max(name_similarity, path_similarity) * 5
             for word in query_words:
                 if word in file_name:
                     score += 2
@@ -364,83 +354,276 @@ class SearchEngine:
                 if word in file_path:
                     score += 1
             if "кабель" in query and "knx" in query:
-                knx_bonus = {
-                    "ye00820": 100,
-                    "j-y(st)y": 80,
-                    "2x2x0,8": 60,
-                    "knx кабель": 40,
-                    "кабель knx": 40
-                }
-                for kw, bonus in knx_bonus.items():
+                for kw, bonus in KNX_CABLE_BONUS.items():
                     if kw in search_text:
                         score += bonus
                 if "датчик" in search_text:
                     score -= 50
-            max_score = max(max_score, score)
+            parts.append(score)
+        return parts
+
+    def _bounded_relevance(self, query_variants: List[str], fields: Tuple[str, str, str],
+                           limits: np.ndarray, floor: float) -> float:
+        """
+        calculate_relevance, в которой SequenceMatcher вызывается только для
+        вариантов, ещё способных дать больше лучшего найденного и больше floor.
+        limits — оценки сверху похожести на имя и путь (fuzzy_scores[:, :, doc_id]).
+        Если документ не наберёт floor, возвращается оценка сверху ниже floor.
+        """
+        file_name, file_path, _ = fields
+        parts = self.relevance_parts(query_variants, fields)
+        upper = [part + 5 * (max(name_limit, path_limit) + RELEVANCE_BOUND_EPSILON)
+                 for part, (name_limit, path_limit) in zip(parts, limits.tolist())]
+        max_score = 0
+        for i in sorted(range(len(query_variants)), key=upper.__getitem__, reverse=True):
+            if upper[i] <= max_score:
+                break
+            if upper[i] < floor:
+                return max(max_score, upper[i])
+            query = query_variants[i]
+            fuzzy = similarity(query, file_name)
+            if limits[i][1] + RELEVANCE_BOUND_EPSILON > fuzzy:
+                fuzzy = max(fuzzy, similarity(query, file_path))
+            max_score = max(max_score, parts[i] + fuzzy * 5)
         return max_score
 
-    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    def relevance_bounds(self, query_variants: List[str], fuzzy: np.ndarray) -> np.ndarray:
+        """
+        Верхняя оценка calculate_relevance для всех документов сразу.
+
+        Слово без пробелов входит подстрокой в поле тогда и только тогда, когда
+        его находит token_index, поэтому по спискам документов слов известно,
+        какие бонусы за слова документ может получить. Бонусы за вхождение
+        всего варианта запроса возможны, только если в поле есть все его слова.
+        Веса те же, что в calculate_relevance, и должны меняться вместе с ними.
+        """
+        size = len(self.file_index)
+        bounds = np.zeros(size)
+        for i, query in enumerate(query_variants):
+            words = set(query.split())
+            hits = {field: np.zeros(size, dtype=np.int32) for field in INDEX_FIELDS}
+            for word in words:
+                for field in INDEX_FIELDS:
+                    hits[field][self.token_index.docs_array(word, (field,))] += 1
+            name_hits, path_hits, norm_hits = hits["name"], hits["path"], hits["norm_name"]
+            bound = 5 * fuzzy[i].max(axis=0) + 2 * name_hits + 3 * norm_hits + path_hits
+            bound += 18 * (name_hits == len(words)) + 7 * (norm_hits == len(words)) + 6 * (path_hits == len(words))
+            if "кабель" in query and "knx" in query:
+                for kw, bonus in KNX_CABLE_BONUS.items():
+                    # Фраза может попасть на стык полей, поэтому для неё — все её слова где угодно
+                    docs = self.token_index.docs_containing_phrase(kw)
+                    bound[np.fromiter(docs, dtype=np.int64, count=len(docs))] += bonus
+            np.maximum(bounds, bound, out=bounds)
+        return bounds
+
+    def _relevance_candidates(self, query_variants: List[str]) -> set:
+        """Документы, у которых есть хотя бы одно слово запроса или его вариант"""
+        candidates = self.token_index.candidates(query_variants)
+        if any("кабель" in query and "knx" in query for query in query_variants):
+            for keyword in ("ye00820", "j-y(st)y", "2x2x0,8"):
+                candidates |= self.token_index.docs_containing(keyword)
+        return candidates
+
+    def content_matches(self, query: str, query_variants: List[str]) -> Dict[int, float]:
+        """
+        Документы, найденные по тексту PDF: doc_id -> доля полного веса (0..1).
+        Оценка BM25 абсолютная, а не относительно лучшего документа: слабое
+        совпадение не получает полный вес только потому, что лучше нет.
+        """
+        if self.index.content is None:
+            return {}
+        terms = query_terms(query) + query_terms(" ".join(query_variants))
+        if not terms:
+            return {}
+        return {
+            doc_id: min(1.0, score / CONTENT_FULL_SCORE)
+            for doc_id, score in self.index.content.top(terms, CONTENT_CANDIDATES)
+            if score >= CONTENT_MIN_SCORE
+        }
+
+    def phonetic_matches(self, query: str) -> Dict[int, int]:
+        """Документы, в имени которых есть слова, звучащие как кириллические слова запроса"""
+        max_docs = max(1, int(len(self.file_index) * PHONETIC_MAX_SHARE))
+        return self.index.phonetic.matches(cyrillic_phonetic_keys(query), max_docs)
+
+    def _name_stem(self, word: str) -> str:
+        """Слово или, если его нет в именах и путях, его первые SPELLING_PREFIX_LENGTH букв"""
+        if len(word) <= SPELLING_PREFIX_LENGTH or self.token_index.docs_containing(word):
+            return word
+        return word[:SPELLING_PREFIX_LENGTH]
+
+    def _plan(self, query: str, correct: bool = True) -> Optional["SearchPlan"]:
+        """
+        Разбор запроса до подсчёта оценок; None, если оценивать некого.
+        correct=False — без исправления опечаток (для сравнения в spelling_suggestion)
+        """
         if not query or not self.file_index:
+            return None
+        # Опечатки исправляются для поиска по именам; текст PDF ищется по словам как есть
+        corrected = self.correct_query(query)[0] if correct else query.lower().strip()
+        query_variants = [variant for variant in self.expand_synonyms(corrected) if variant]
+        if not query_variants and query_terms(corrected):
+            # Нормализация убрала все слова (кириллица без синонима): имена и
+            # пути сравниваются со словами запроса, а слова, которого нет ни
+            # в одном имени, — с его началом (подключения -> подключ)
+            query_variants = [" ".join(self._name_stem(term) for term in query_terms(corrected))]
+        content = self.content_matches(query, query_variants)
+        phonetic = self.phonetic_matches(corrected)
+        candidates = sorted(self._relevance_candidates(query_variants) | content.keys() | phonetic.keys())
+        if not candidates:
+            return None
+        return SearchPlan(query_variants, content, phonetic, candidates)
+
+    def _rank(self, plan: "SearchPlan", fuzzy: Optional[np.ndarray], limit: int) -> List[Dict[str, Any]]:
+        """
+        k лучших кандидатов плана с разными именами (копии файла из разных
+        папок не занимают топ); fuzzy — оценки похожести (fuzzy_scores)
+        """
+        query_variants, content, phonetic, candidates = plan.variants, plan.content, plan.phonetic, plan.candidates
+
+        # MaxScore: кандидаты по убыванию верхней оценки; как только оценка
+        # следующего не выше худшего из k лучших, остальные уже не войдут в топ
+        candidate_ids = np.asarray(candidates, dtype=np.int64)
+        bounds = np.zeros(len(candidate_ids))
+        if query_variants:
+            bounds += self.relevance_bounds(query_variants, fuzzy)[candidate_ids] + RELEVANCE_BOUND_EPSILON
+        if content:
+            bounds += CONTENT_WEIGHT * np.array([content.get(doc_id, 0.0) for doc_id in candidates])
+        if phonetic:
+            bounds += PHONETIC_WEIGHT * np.array([phonetic.get(doc_id, 0) for doc_id in candidates])
+        order = np.lexsort((candidate_ids, -bounds))
+
+        # Лучший документ каждого имени: (релевантность, -doc_id); при равной
+        # релевантности выше документ с меньшим doc_id, как при устойчивой сортировке.
+        # threshold — худший из k лучших, когда их уже k
+        best: Dict[str, Tuple[float, int]] = {}
+        threshold: Optional[Tuple[float, int]] = None
+        for doc_id, bound in zip(candidate_ids[order].tolist(), bounds[order].tolist()):
+            if threshold is not None and bound < threshold[0]:
+                break
+            fields = self.index.fields(doc_id)
+            extra = CONTENT_WEIGHT * content.get(doc_id, 0.0) + PHONETIC_WEIGHT * phonetic.get(doc_id, 0)
+            relevance = 0.0
+            if query_variants:
+                floor = threshold[0] - extra - RELEVANCE_BOUND_EPSILON if threshold is not None else -np.inf
+                relevance = self._bounded_relevance(query_variants, fields, fuzzy[:, :, doc_id], floor)
+            relevance += extra
+            if relevance <= 0:
+                continue
+            entry = (relevance, -doc_id)
+            file_name = fields[0]
+            if file_name in best and best[file_name] >= entry:
+                continue
+            if threshold is not None and entry <= threshold and file_name not in best:
+                continue
+            best[file_name] = entry
+            if len(best) > limit:
+                del best[min(best, key=best.get)]
+            if len(best) == limit:
+                threshold = min(best.values())
+
+        # Словари результатов собираются только для победителей
+        return [
+            {**self.file_index[-neg_doc_id], "relevance": relevance}
+            for relevance, neg_doc_id in sorted(best.values(), reverse=True)
+        ]
+
+    def search(self, query: str, limit: int = 10, correct: bool = True) -> List[Dict[str, Any]]:
+        plan = self._plan(query, correct)
+        if plan is None or limit <= 0:
             return []
-        query_variants = self.expand_synonyms(query)
-        scored_results = []
-        for file_data in self.file_index:
-            relevance = self.calculate_relevance(file_data, query_variants)
-            if relevance > 0:
-                scored_results.append({**file_data, "relevance": relevance})
-        scored_results.sort(key=lambda x: x["relevance"], reverse=True)
-        return scored_results[:limit]
-
-    def hybrid_search(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
-        # Алиса
-        if self.is_alisa_integration_query(query):
-            return [{
-                "name": "📁 Документация по интеграции с Яндекс Алисой",
-                "path": self.get_alisa_integration_link(),
-                "is_folder_link": True,
-                "folder_link": self.get_alisa_integration_link()
-            }]
+        fuzzy = self.fuzzy_scores(plan.variants) if plan.variants else None
+        return self._rank(plan, fuzzy, limit)
+
+    def search_batch(self, queries: Sequence[str], limit: int = 10) -> List[List[Dict[str, Any]]]:
+        """
+        search для многих запросов: сначала разбираются все запросы, затем
+        похожесть n-грамм считается сразу для вариантов пачки запросов.
+        """
+        plans = [self._plan(query) if limit > 0 else None for query in queries]
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        pending = [i for i, plan in enumerate(plans) if plan is not None]
+        for chunk_start in range(0, len(pending), SEARCH_BATCH_SIZE):
+            chunk = pending[chunk_start:chunk_start + SEARCH_BATCH_SIZE]
+            variants = [variant for i in chunk for variant in plans[i].variants]
+            fuzzy = self.fuzzy_scores(variants) if variants else None
+            row = 0
+            for i in chunk:
+                count = len(plans[i].variants)
+                results[i] = self._rank(plans[i], fuzzy[row:row + count] if count else None, limit)
+                row += count
+        return results
+
+    def route_query(self, query: str, below: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Дешёвые ответы без ранжирования (Алиса и ссылки на папки) по таблице
+        правил. below — учитывать только правила с приоритетом ниже этого.
+        None — запросу нужен полный поиск по индексу.
+        """
+        rule = self.router.match(query, below=below)
+        if rule is None or rule.action != ROUTE_LINKS:
+            return None
+        logging.info(f"🎯 Маршрут '{query}' -> {rule.name}")
+        return rule.results(query)
+
+    def hybrid_search(self, query: str, limit: int = 3, route: bool = True) -> List[Dict[str, Any]]:
+        return self.hybrid_search_branch(query, limit, route)[1]
+
+    def hybrid_search_branch(self, query: str, limit: int = 3,
+                             route: bool = True) -> Tuple[str, List[Dict[str, Any]]]:
+        """hybrid_search и ветка, давшая ответ (одна из SEARCH_BRANCHES)"""
+        answered = self._branch_before_search(query, limit, route)
+        if answered is not None:
+            return answered
+        return self._branch_after_search(query, limit, self.search(query, limit * 2))
+
+    def search_many(self, queries: Sequence[str], limit: int = 3,
+                    route: bool = True) -> List[List[Dict[str, Any]]]:
+        """
+        hybrid_search для многих запросов сразу (прогрев кэша, прогон журналов,
+        оценка качества). Результаты те же, что у hybrid_search по одному,
+        но запросы, дошедшие до поиска, оцениваются одним search_batch.
+        """
+        answered = [self._branch_before_search(query, limit, route) for query in queries]
+        to_search = [i for i, branch in enumerate(answered) if branch is None]
+        scored = self.search_batch([queries[i] for i in to_search], limit * 2)
+        for i, results in zip(to_search, scored):
+            answered[i] = self._branch_after_search(queries[i], limit, results)
+        return [results for _, results in answered]
+
+    def _branch_before_search(self, query: str, limit: int,
+                              route: bool) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """Ветки, отвечающие без оценки файлов: ссылки на папки и кабель KNX"""
+        if route:
+            routed = self.route_query(query)
+            if routed is not None:
+                return BRANCH_FOLDER_REDIRECT, routed
 
         # KNX кабель
-        if self.is_knx_cable_query(query):
+        knx_rule = self.router.match(query, {ROUTE_KNX_CABLE})
+        if knx_rule is not None:
             knx_results = self.find_knx_cable_files()
             if knx_results:
-                return knx_results[:limit]
-
-        # Перенаправления
-        should_redirect, folder_link = self.should_redirect_to_folder(query)
-        if should_redirect:
-            if folder_link == "__CURTAINS_BOTH__":
-                return [
-                    {"name": "Buspro", "path": "https://disk.360.yandex.ru/d/20Q51Ey5rDMXqA", "is_folder_link": True, "folder_link": "https://disk.360.yandex.ru/d/20Q51Ey5rDMXqA"},
-                    {"name": "KNX", "path": "https://disk.360.yandex.ru/d/x1w6XEUthCgTVg", "is_folder_link": True, "folder_link": "https://disk.360.yandex.ru/d/x1w6XEUthCgTVg"}
-                ]
-            elif folder_link == "__AC_BOTH__":
-                return [
-                    {"name": "Для EasyCool", "path": "https://disk.360.yandex.ru/d/EuWsEkI__LPmIQ", "is_folder_link": True, "folder_link": "https://disk.360.yandex.ru/d/EuWsEkI__LPmIQ"},
-                    {"name": "Для CoolAutomation", "path": "https://disk.360.yandex.ru/d/UVzihaR7eRIRmw", "is_folder_link": True, "folder_link": "https://disk.360.yandex.ru/d/UVzihaR7eRIRmw"}
-                ]
-            else:
-                return [{
-                    "name": f"📁 Папка с документацией: {query}",
-                    "path": folder_link,
-                    "is_folder_link": True,
-                    "folder_link": folder_link
-                }]
-
-        # Обычный поиск
-        improved_results = self.search(query, limit * 2)
+                return BRANCH_KNX_CABLE, knx_results[:limit]
+            redirect = self.route_query(query, below=knx_rule.priority)
+            if redirect is not None:
+                return BRANCH_FOLDER_REDIRECT, redirect
+        return None
+
+    def _branch_after_search(self, query: str, limit: int,
+                             improved_results: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Обычный поиск (improved_results — search(query, limit * 2)) и старый поиск как запасной"""
         improved_results = self.filter_irrelevant_results(improved_results, query)
         if improved_results:
-            return improved_results[:limit]
+            return BRANCH_SCORED, improved_results[:limit]
 
         # Fallback на старый поиск
         try:
             old_results = self.old_smart_search(query)
-            return old_results[:limit]
+            return (BRANCH_OLD_FALLBACK if old_results else BRANCH_NOT_FOUND), old_results[:limit]
         except Exception as e:
             logging.error(f"❌ Ошибка в старом поиске: {e}")
-            return []
+            return BRANCH_NOT_FOUND, []
 
     def old_smart_search(self, query: str, limit: int = 3) -> List[Dict]:
         if not self.file_index:
@@ -463,58 +646,239 @@ class SearchEngine:
         keywords = [word for word in query_norm.split() if len(word) >= 2]
         if not keywords:
             return []
-        results = []
-        for file_data in self.file_index:
-            norm_name = file_data.get("norm_name", "")
-            if all(kw in norm_name for kw in keywords):
-                results.append(file_data)
-        return results
+        candidates = self.token_index.docs_containing_phrase(" ".join(keywords), ("norm_name",))
+        return [self.file_index[doc_id] for doc_id in sorted(candidates)]
 
     def _old_search_keyword_combinations(self, query_norm: str) -> List[Dict]:
         keywords = [word for word in query_norm.split() if len(word) >= 2]
         if len(keywords) < 2:
             return []
+        candidates = self.token_index.candidates(keywords, ("norm_name", "name"))
         scored_files = []
-        for file_data in self.file_index:
-            norm_name = file_data.get("norm_name", "")
-            file_name = file_data.get("name", "").lower()
+        for doc_id in sorted(candidates):
+            file_name, _, norm_name = self.index.fields(doc_id)
             score = sum(20 for kw in keywords if kw in norm_name)
             score += sum(10 for kw in keywords if kw in file_name)
             if score > 0:
-                scored_files.append((score, file_data))
+                scored_files.append((score, doc_id))
         scored_files.sort(key=lambda x: x[0], reverse=True)
-        return [fd for _, fd in scored_files]
+        return [self.file_index[doc_id] for _, doc_id in scored_files]
 
     def _old_search_important_keywords(self, query_norm: str) -> List[Dict]:
         important_keywords = {"alisa", "knx", "integration", "connect", "gateway", "voice"}
         found = [kw for kw in important_keywords if kw in query_norm]
         if not found:
             return []
+        candidates = self.token_index.candidates(found, ("norm_name",))
         scored = []
-        for file_data in self.file_index:
-            norm_name = file_data.get("norm_name", "")
+        for doc_id in sorted(candidates):
+            norm_name = self.index.fields(doc_id)[2]
             score = sum(30 for kw in found if kw in norm_name)
             if score > 0:
-                scored.append((score, file_data))
+                scored.append((score, doc_id))
         scored.sort(key=lambda x: x[0], reverse=True)
-        return [fd for _, fd in scored]
+        return [self.file_index[doc_id] for _, doc_id in scored]
+
+
+class SearchEngineHolder:
+    """Один движок на процесс: индекс читается один раз, а фоновый поток
+    следит за mtime файлов индекса и правил маршрутизации и атомарно
+    подменяет снимок при их изменении"""
+
+    def __init__(self, index_file: str = SEARCH_INDEX_FILE,
+                 reload_interval: float = SEARCH_INDEX_RELOAD_INTERVAL,
+                 rules_file: str = ROUTING_RULES_FILE):
+        self.index_file = index_file
+        self.binary_file = binary_index_path(index_file)
+        self.rules_file = rules_file
+        self.reload_interval = reload_interval
+        self._engine: Optional[SearchEngine] = None
+        self._signature: Optional[tuple] = None
+        self._failed_signature: Optional[tuple] = None
+        self._generation = 0
+        # Кэш результатов поиска по снимку; очищается при подмене снимка
+        self.results = LRUTTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    def get(self) -> SearchEngine:
+        engine = self._engine
+        if engine is not None:
+            return engine
+        with self._lock:
+            if self._engine is None:
+                self._engine = self._build_snapshot(self._file_signature()) or SearchEngine(
+                    self.index_file, [], 0, router=load_router(self.rules_file)
+                )
+                self._start_watcher()
+            return self._engine
+
+    def _file_signature(self) -> Optional[tuple]:
+        """mtime и размер JSON- и бинарного индекса и таблицы правил"""
+        stats = []
+        for path in (self.index_file, self.binary_file, self.rules_file):
+            try:
+                stat = os.stat(path)
+                stats.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stats.append(None)
+        if not any(stats[:2]):
+            return None
+        return tuple(stats)
+
+    def _build_snapshot(self, signature: Optional[tuple]) -> Optional[SearchEngine]:
+        """Строит новый движок целиком, не трогая текущий"""
+        if signature is None:
+            logging.warning(f"Index file {self.index_file} not found")
+            return None
+        try:
+            search_index = load_search_index(self.index_file)
+            router = load_router(self.rules_file)
+        except Exception as e:
+            # Файл мог быть пойман в процессе записи — оставляем прежний снимок
+            logging.error(f"Error loading index: {e}")
+            self._failed_signature = signature
+            return None
+        if self._file_signature() != signature:
+            return None
+        self._signature = signature
+        self._generation += 1
+        logging.info(f"📚 Индекс загружен: {len(search_index)} файлов (поколение {self._generation})")
+        return SearchEngine(self.index_file, generation=self._generation, search_index=search_index,
+                            router=router, signature=signature)
+
+    def reload_if_changed(self) -> bool:
+        signature = self._file_signature()
+        if signature is None or signature in (self._signature, self._failed_signature):
+            return False
+        with self._lock:
+            engine = self._build_snapshot(signature)
+            if engine is None:
+                return False
+            # Присваивание ссылки атомарно: текущие поиски дорабатывают на старом снимке
+            self._engine = engine
+        self.results.clear()
+        return True
+
+    def _start_watcher(self):
+        if self._watcher is not None or self.reload_interval <= 0:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="search-index-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                logging.error(f"❌ Ошибка перезагрузки индекса: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+    def reset(self):
+        """Сброс после fork: потоки родителя в дочернем процессе не существуют"""
+        self._engine = None
+        self._signature = None
+        self._failed_signature = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+
+_engine_holder = SearchEngineHolder()
+
+
+def get_search_engine() -> SearchEngine:
+    """Текущий снимок поискового движка процесса"""
+    return _engine_holder.get()
+
+
+def get_search_cache_stats() -> Dict[str, Any]:
+    return _engine_holder.results.stats()
+
+
+def reset_search_engine():
+    """Вызывается в дочерних процессах пула поиска"""
+    _engine_holder.reset()
+
+
+async def start_search_engine():
+    """Хук запуска: первый движок строится в потоке, а не в цикле событий при первом запросе"""
+    engine = await asyncio.to_thread(get_search_engine)
+    logging.info(f"🔎 Поисковый движок готов: {len(engine.file_index)} файлов")
+
+
+async def stop_search_pool():
+    """Хук остановки: завершает пул поиска"""
+    get_search_pool().shutdown()
+
+
+def _prepare_search(query: str, limit: int) -> Tuple[SearchEngine, Optional[List[Dict[str, Any]]], Optional[tuple]]:
+    """Движок, готовый ответ по маршруту или ключ кэша (исправление опечаток — не в цикле событий)"""
+    search_engine = get_search_engine()
+    # Ссылки на папки отдаём сразу, без очереди пула
+    routed = search_engine.route_query(query)
+    if routed is not None:
+        return search_engine, routed, None
+    return search_engine, None, search_engine.result_cache_key(query, limit)
 
 
 # Функции для обратной совместимости
 async def smart_document_search(query: str, limit: int = 3) -> List[Dict[str, Any]]:
     try:
-        search_engine = SearchEngine()
-        return search_engine.hybrid_search(query, limit)
+        search_engine, routed, cache_key = await asyncio.to_thread(_prepare_search, query, limit)
+        if routed is not None:
+            return routed
+
+        result_cache = _engine_holder.results
+        results = result_cache.get(cache_key)
+        if results is None:
+            results, signature = await get_search_pool().run(query, limit)
+            # Пул мог искать по другому снимку (процесс пула ещё не перечитал индекс
+            # или уже перечитал) — такой результат под этот ключ не кладём
+            if signature == search_engine.signature:
+                result_cache.set(cache_key, results)
+        else:
+            logging.info(f"⚡ Результат из кэша для '{query}' ({result_cache.stats()})")
+        return list(results)
+    except SearchQueueFull as e:
+        logging.warning(f"⏳ {e}")
+        return []
     except Exception as e:
         logging.error(f"❌ Ошибка в smart_document_search: {e}")
         return []
 
 
-def search_in_file_index(query: str, index_path: str = "data/cache/file_index.json") -> List[Dict]:
-    search_engine = SearchEngine(index_path)
+def search_in_file_index(query: str, index_path: str = SEARCH_INDEX_FILE) -> List[Dict]:
+    if os.path.abspath(index_path) == os.path.abspath(_engine_holder.index_file):
+        search_engine = get_search_engine()
+    else:
+        search_engine = SearchEngine(index_path)
     return search_engine.search(query)
 
 
+_passage_search = PassageSearch(passage_index_path(SEARCH_INDEX_FILE), TextStore(texts_dir(SEARCH_INDEX_FILE)))
+
+
+def find_passages(query: str) -> List[Dict[str, Any]]:
+    """Фрагменты документации, относящиеся к вопросу (для контекста ИИ)"""
+    try:
+        return _passage_search.find(query)
+    except Exception as e:
+        logging.error(f"Ошибка поиска фрагментов: {e}")
+        return []
+
+
+def spelling_suggestion(query: str) -> Optional[str]:
+    try:
+        return get_search_engine().spelling_suggestion(query)
+    except Exception as e:
+        logging.error(f"Ошибка исправления опечаток: {e}")
+        return None
+
+
 def has_only_technical_files(results: List[Dict[str, Any]]) -> bool:
     if results and results[0].get("is_folder_link"):
         return False
@@ -527,18 +891,4 @@ def has_only_technical_files(results: List[Dict[str, Any]]) -> bool:
 
 
 def should_use_ai_directly(query: str) -> bool:
-    query_lower = query.lower()
-    alisa_keywords = {
-        "алис", "яндекс алис", "yandex alice", "alisa", "mgwip",
-        "голосов", "голосовой", "ассистент", "шлюз", "интеграци"
-    }
-    if any(kw in query_lower for kw in alisa_keywords):
-        return False
-    complex_question_words = {
-        "почему", "какой лучше", "что выбрать", "сравни", "отличия",
-        "проблема", "ошибка", "не работает", "не подключается", "сломал"
-    }
-    is_complex = any(w in query_lower for w in complex_question_words)
-    if is_complex and not any(kw in query_lower for kw in alisa_keywords):
-        return True
-    return False
\ No newline at end of file
+    return get_intent_classifier().use_ai_directly(query)
@@ -0,0 +1,218 @@
+# bot/utils/search_index.py
+import mmap
+import os
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bot.utils.bm25 import BM25Index
+from bot.utils.ngram_similarity import NgramMatrix
+from bot.utils.phonetic import PhoneticIndex, name_keys
+from bot.utils.text_store import TextStore
+from bot.utils.token_index import INDEX_FIELDS, TokenIndex
+
+# Бинарный индекс: заголовок, таблица секций и выровненные массивы NumPy.
+# Любое несовместимое изменение раскладки требует увеличить версию.
+BINARY_INDEX_MAGIC = b"HDLIDX\x00\x00"
+BINARY_INDEX_VERSION = 2
+
+_HEADER = struct.Struct("<8sIIQ")          # magic, version, число секций, число документов
+_SECTION = struct.Struct("<24s4sQQ")       # имя, dtype, смещение, число элементов
+_ALIGN = 8
+
+
+class StringTable(Sequence[str]):
+    """Строки, упакованные в один UTF-8 буфер и массив смещений"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings: Sequence[str]) -> "StringTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+
+class MappedDocuments(Sequence[Dict[str, Any]]):
+    """Документы бинарного индекса: словарь собирается только при обращении"""
+
+    def __init__(self, columns: Dict[str, StringTable]):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.columns["name"])
+
+    def __getitem__(self, doc_id: int) -> Dict[str, Any]:
+        return {field: column[doc_id] for field, column in self.columns.items()}
+
+
+class SearchIndex:
+    """
+    Всё, что движку нужно для поиска: документы, их поля в нижнем регистре,
+    инвертированный индекс токенов, матрица символов имён и путей, ключи
+    звучания слов имён и (если тексты PDF извлечены) полнотекстовый индекс BM25.
+
+    Строится из списка словарей file_index.json (SearchIndex.build) или
+    открывается из бинарного файла через mmap (SearchIndex.open). Во втором
+    случае все массивы — представления над отображённой памятью, поэтому
+    загрузка почти бесплатна, а несколько процессов делят одну копию в кеше ОС.
+    """
+
+    def __init__(self, documents: Sequence[Dict[str, Any]], lowered: Dict[str, Sequence[str]],
+                 token_index: TokenIndex, ngrams: NgramMatrix, content: Optional[BM25Index] = None,
+                 phonetic: Optional[PhoneticIndex] = None):
+        self.documents = documents
+        self.lowered = lowered
+        self.token_index = token_index
+        self.ngrams = ngrams
+        self.content = content
+        if phonetic is None:
+            # Индекс собран до появления ключей: считаем их по именам
+            phonetic = PhoneticIndex.build([name_keys(name) for name in lowered["name"]])
+        self.phonetic = phonetic
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def fields(self, doc_id: int) -> Tuple[str, str, str]:
+        """name, path и norm_name документа в нижнем регистре"""
+        return tuple(self.lowered[field][doc_id] for field in INDEX_FIELDS)
+
+    @classmethod
+    def build(cls, file_index: List[Dict[str, Any]], text_store: Optional[TextStore] = None) -> "SearchIndex":
+        lowered = {
+            field: [str(f.get(field, "")).lower() for f in file_index]
+            for field in INDEX_FIELDS
+        }
+        token_index = TokenIndex.build(lowered, len(file_index))
+        # Строки 0..N-1 — имена файлов, N..2N-1 — пути
+        ngrams = NgramMatrix.build(lowered["name"] + lowered["path"])
+        content = None
+        if text_store is not None and len(text_store):
+            # Тексты читаются с диска по одному, а не все сразу
+            content = BM25Index.build(text_store.load(f.get("path", "")) for f in file_index)
+        phonetic = PhoneticIndex.build([
+            f["keys"] if "keys" in f else name_keys(str(f.get("name", ""))) for f in file_index
+        ])
+        return cls(file_index, lowered, token_index, ngrams, content, phonetic)
+
+    def _sections(self) -> List[Tuple[str, np.ndarray]]:
+        sections = []
+
+        def add_strings(name: str, strings: Sequence[str]):
+            table = strings if isinstance(strings, StringTable) else StringTable.from_strings(strings)
+            sections.append((f"{name}.blob", table.blob))
+            sections.append((f"{name}.offsets", table.offsets))
+
+        for field in INDEX_FIELDS:
+            add_strings(f"doc.{field}", [str(self.documents[i].get(field, "")) for i in range(len(self))])
+            add_strings(f"low.{field}", self.lowered[field])
+        add_strings("tok.vocab", self.token_index.tokens)
+        for field in INDEX_FIELDS:
+            offsets, doc_ids = self.token_index.postings[field]
+            sections.append((f"tok.{field}.offsets", offsets))
+            sections.append((f"tok.{field}.docs", doc_ids))
+        sections.append(("tok.gram.offsets", self.token_index.gram_offsets))
+        sections.append(("tok.gram.tokens", self.token_index.gram_tokens))
+        sections.append(("ngram.offsets", self.ngrams.offsets))
+        sections.append(("ngram.rows", self.ngrams.rows))
+        sections.append(("ngram.counts", self.ngrams.counts))
+        sections.append(("ngram.lengths", self.ngrams.lengths))
+        add_strings("ph.vocab", self.phonetic.vocab)
+        sections.append(("ph.offsets", self.phonetic.offsets))
+        sections.append(("ph.docs", self.phonetic.docs))
+        if self.content is not None:
+            add_strings("bm25.vocab", self.content.vocab)
+            sections.append(("bm25.offsets", self.content.offsets))
+            sections.append(("bm25.docs", self.content.docs))
+            sections.append(("bm25.tfs", self.content.tfs))
+            sections.append(("bm25.lengths", self.content.doc_lengths))
+        return sections
+
+    def write(self, path: str):
+        """Запись бинарного индекса (через временный файл и атомарную подмену)"""
+        sections = self._sections()
+        table_size = _HEADER.size + _SECTION.size * len(sections)
+        offset = _aligned(table_size)
+        entries = []
+        for name, array in sections:
+            array = np.ascontiguousarray(array)
+            entries.append((name, array, offset))
+            offset = _aligned(offset + array.nbytes)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(BINARY_INDEX_MAGIC, BINARY_INDEX_VERSION, len(sections), len(self)))
+            for name, array, data_offset in entries:
+                f.write(_SECTION.pack(name.encode("ascii"), array.dtype.str.encode("ascii"), data_offset, array.size))
+            for name, array, data_offset in entries:
+                f.seek(data_offset)
+                f.write(array.tobytes())
+            f.truncate(offset)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, path: str) -> "SearchIndex":
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, section_count, doc_count = _HEADER.unpack_from(buffer, 0)
+        if magic != BINARY_INDEX_MAGIC:
+            raise ValueError(f"{path}: не бинарный индекс")
+        if version != BINARY_INDEX_VERSION:
+            raise ValueError(f"{path}: версия индекса {version}, ожидается {BINARY_INDEX_VERSION}")
+
+        arrays: Dict[str, np.ndarray] = {}
+        for i in range(section_count):
+            name, dtype, data_offset, count = _SECTION.unpack_from(buffer, _HEADER.size + i * _SECTION.size)
+            name = name.rstrip(b"\x00").decode("ascii")
+            dtype = np.dtype(dtype.rstrip(b"\x00").decode("ascii"))
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_offset)
+
+        def strings(name: str) -> StringTable:
+            return StringTable(arrays[f"{name}.blob"], arrays[f"{name}.offsets"])
+
+        documents = MappedDocuments({field: strings(f"doc.{field}") for field in INDEX_FIELDS})
+        lowered = {field: strings(f"low.{field}") for field in INDEX_FIELDS}
+        postings = {
+            field: (arrays[f"tok.{field}.offsets"], arrays[f"tok.{field}.docs"])
+            for field in INDEX_FIELDS
+        }
+        token_index = TokenIndex(
+            doc_count, strings("tok.vocab"), postings,
+            arrays["tok.gram.offsets"], arrays["tok.gram.tokens"],
+        )
+        ngrams = NgramMatrix(arrays["ngram.offsets"], arrays["ngram.rows"], arrays["ngram.counts"],
+                             arrays["ngram.lengths"])
+        content = None
+        if "bm25.offsets" in arrays:
+            content = BM25Index(strings("bm25.vocab"), arrays["bm25.offsets"], arrays["bm25.docs"],
+                                arrays["bm25.tfs"], arrays["bm25.lengths"])
+        phonetic = None
+        if "ph.offsets" in arrays:
+            phonetic = PhoneticIndex(strings("ph.vocab"), arrays["ph.offsets"], arrays["ph.docs"])
+        return cls(documents, lowered, token_index, ngrams, content, phonetic)
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def binary_index_path(index_file: str) -> str:
+    """Путь бинарного индекса рядом с file_index.json"""
+    return f"{os.path.splitext(index_file)[0]}.bin"
+
+
+def texts_dir(index_file: str) -> str:
+    """Каталог извлечённых текстов рядом с file_index.json"""
+    return os.path.join(os.path.dirname(index_file), "texts")
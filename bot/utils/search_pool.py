@@ -0,0 +1,107 @@
+# bot/utils/search_pool.py
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+# Пул для поиска: "thread" или "process", число исполнителей и предел очереди
+SEARCH_POOL_KIND = os.getenv("SEARCH_POOL_KIND", "thread")
+SEARCH_POOL_WORKERS = int(os.getenv("SEARCH_POOL_WORKERS", "2"))
+SEARCH_POOL_MAX_PENDING = int(os.getenv("SEARCH_POOL_MAX_PENDING", "32"))
+
+logger = logging.getLogger(__name__)
+
+
+class SearchQueueFull(Exception):
+    """В очереди поиска нет места"""
+
+
+def _init_process_worker():
+    from bot.utils.search_engine import reset_search_engine
+    reset_search_engine()
+
+
+def _run_search(query: str, limit: int) -> Tuple[List[Dict[str, Any]], Optional[tuple], float]:
+    """Выполняется в пуле; возвращает результаты, сигнатуру снимка индекса и момент начала работы"""
+    from bot.utils.search_engine import get_search_engine
+    started_at = time.time()
+    engine = get_search_engine()
+    return engine.hybrid_search(query, limit, route=False), engine.signature, started_at
+
+
+class SearchPool:
+    """
+    Поиск вне цикла событий aiogram.
+
+    Ранжирование выполняется в пуле потоков или процессов, поэтому долгий
+    нечёткий поиск одного пользователя не задерживает апдейты остальных.
+    Число ожидающих задач ограничено, время ожидания в очереди учитывается.
+    """
+
+    def __init__(self, kind: str = SEARCH_POOL_KIND, workers: int = SEARCH_POOL_WORKERS,
+                 max_pending: int = SEARCH_POOL_MAX_PENDING):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_process_worker)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="search")
+            logger.info(f"🧵 Пул поиска: {self.kind}, исполнителей {self.workers}, очередь {self.max_pending}")
+        return self._executor
+
+    async def run(self, query: str, limit: int) -> Tuple[List[Dict[str, Any]], Optional[tuple]]:
+        """Результаты hybrid_search(route=False) и сигнатура снимка, по которому они найдены"""
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise SearchQueueFull(f"Очередь поиска заполнена ({self._pending}), запрос '{query}' отклонён")
+        self._pending += 1
+        submitted_at = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            results, signature, started_at = await loop.run_in_executor(self._get_executor(), _run_search, query, limit)
+        finally:
+            self._pending -= 1
+        wait = max(0.0, started_at - submitted_at)
+        self.completed += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        logger.info(f"⏱ Поиск '{query}': ожидание в очереди {wait * 1000:.1f} мс, "
+                    f"всего {(time.time() - submitted_at) * 1000:.1f} мс")
+        return results, signature
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": self.total_wait / self.completed * 1000 if self.completed else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_search_pool: Optional[SearchPool] = None
+
+
+def get_search_pool() -> SearchPool:
+    global _search_pool
+    if _search_pool is None:
+        _search_pool = SearchPool()
+    return _search_pool
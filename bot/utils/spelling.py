@@ -0,0 +1,174 @@
+# bot/utils/spelling.py
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Наибольшее исправляемое расстояние и длина префикса, по которому строятся удаления
+SPELLING_MAX_DISTANCE = 2
+SPELLING_PREFIX_LENGTH = 7
+
+# Слова короче не исправляются; до SPELLING_LONG_WORD символов допускается одна ошибка
+SPELLING_MIN_WORD = 5
+SPELLING_LONG_WORD = 8
+
+_WORD_RE = re.compile(r"[a-zа-яё]+")
+# Нормализация оставляет от имён файлов только латиницу, поэтому кириллические
+# слова имён в словарь не берутся: исправление на них ничего бы не нашло
+_TEXT_WORD_RE = re.compile(r"[a-z]+")
+_QUERY_WORD_RE = re.compile(r"[0-9a-zа-яё]+")
+
+
+def dictionary_words(text: str) -> List[str]:
+    """Слова текста, пригодные для словаря исправлений (латиница без цифр и знаков)"""
+    return [word for word in _TEXT_WORD_RE.findall(text.lower()) if len(word) >= SPELLING_MIN_WORD]
+
+
+def without_stems(words: Iterable[str]) -> List[str]:
+    """
+    Слова без основ: слово, которое короче другого слова списка на один-два
+    последних символа (баспр → баспро, кабел → кабель), в подсказку не годится
+    """
+    unique = {word.lower() for word in words if _WORD_RE.fullmatch(word.lower())}
+    stems = {word[:-cut] for word in unique for cut in range(1, SPELLING_MAX_DISTANCE + 1)}
+    return sorted(unique - stems)
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """Все строки, получаемые из слова удалением не больше max_distance символов"""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {item[:i] + item[i + 1:] for item in frontier for i in range(len(item))}
+        result |= frontier
+    return result
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Расстояние Дамерау-Левенштейна (с перестановкой соседних символов); больше limit — limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        # Перестановка смотрит на две строки назад, поэтому выходим, только когда обе вне предела
+        if min(current) > limit and (not previous_previous or min(previous) > limit):
+            return limit + 1
+        previous_previous, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class SpellChecker:
+    """
+    Исправление опечаток по словарю симметричных удалений (SymSpell).
+
+    Для каждого слова словаря заранее записаны все варианты его префикса
+    с удалёнными одним-двумя символами. Для слова запроса строятся такие же
+    удаления, и кандидаты находятся поиском в словаре, а не перебором всех
+    слов; расстояние проверяется только у найденных кандидатов.
+
+    Слово длиннее префикса, совпадающее со словом словаря во всём префиксе,
+    считается другой формой этого слова (инструкцию — инструкция), а не опечаткой:
+    для поиска оно приводится к слову словаря, но исправлением не считается.
+    """
+
+    def __init__(self, frequencies: Dict[str, int], max_distance: int = SPELLING_MAX_DISTANCE,
+                 prefix_length: int = SPELLING_PREFIX_LENGTH):
+        self.frequencies = frequencies
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._deletes: Dict[str, List[str]] = {}
+        # Префикс -> самое частое слово словаря с этим префиксом
+        self._stems: Dict[str, str] = {}
+        for word in sorted(frequencies, key=lambda w: (-frequencies[w], w)):
+            if len(word) >= prefix_length:
+                self._stems.setdefault(word[:prefix_length], word)
+        for word in frequencies:
+            for delete in _deletes(word[:prefix_length], max_distance):
+                self._deletes.setdefault(delete, []).append(word)
+
+    @classmethod
+    def build(cls, texts: Iterable[str], extra_words: Iterable[str] = (), **kwargs) -> "SpellChecker":
+        """Словарь из текстов (частота — число вхождений) и дополнительных слов"""
+        frequencies: Dict[str, int] = {}
+        for text in texts:
+            for word in dictionary_words(text):
+                frequencies[word] = frequencies.get(word, 0) + 1
+        for word in extra_words:
+            word = word.lower()
+            if _WORD_RE.fullmatch(word) and len(word) >= SPELLING_MIN_WORD:
+                frequencies[word] = frequencies.get(word, 0) + 1
+        return cls(frequencies, **kwargs)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.frequencies
+
+    def word_form(self, word: str) -> Optional[str]:
+        """Слово словаря, формой которого является word (окончание после префикса другое), или None"""
+        word = word.lower()
+        if word in self.frequencies:
+            return word
+        if len(word) <= self.prefix_length:
+            return None
+        return self._stems.get(word[:self.prefix_length])
+
+    def allowed_distance(self, word: str) -> int:
+        if len(word) < SPELLING_MIN_WORD:
+            return 0
+        if len(word) < SPELLING_LONG_WORD:
+            return min(1, self.max_distance)
+        return self.max_distance
+
+    def lookup(self, word: str) -> Optional[Tuple[str, int]]:
+        """Ближайшее слово словаря и расстояние до него; при равенстве — более частое"""
+        word = word.lower()
+        if word in self.frequencies:
+            return word, 0
+        limit = self.allowed_distance(word)
+        if not limit:
+            return None
+        best: Optional[Tuple[int, int, str]] = None
+        seen: Set[str] = set()
+        for delete in _deletes(word[:self.prefix_length], limit):
+            for candidate in self._deletes.get(delete, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(word, candidate, limit)
+                if distance > limit:
+                    continue
+                key = (distance, -self.frequencies[candidate], candidate)
+                if best is None or key < best:
+                    best = key
+        if best is None:
+            return None
+        return best[2], best[0]
+
+    def correct(self, text: str, known: Callable[[str], bool]) -> Tuple[str, bool]:
+        """
+        Текст в нижнем регистре с исправленными словами и признак, было ли исправление.
+        Слова словаря, слова с цифрами и слова, для которых known() истинно,
+        не меняются; формы слов словаря приводятся к ним без признака исправления.
+        """
+        changed = False
+
+        def replace(match: "re.Match") -> str:
+            nonlocal changed
+            word = match.group(0)
+            if word in self.frequencies or not _WORD_RE.fullmatch(word) or known(word):
+                return word
+            form = self.word_form(word)
+            if form is not None:
+                return form
+            found = self.lookup(word)
+            if found is None:
+                return word
+            changed = True
+            return found[0]
+
+        corrected = _QUERY_WORD_RE.sub(replace, text.lower().strip())
+        return corrected, changed
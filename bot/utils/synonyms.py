@@ -1,37 +1,106 @@
-SYNONYMS = {
-    # Бренды
-    "изикул": "easycool",
-    "баспро": "buspro",
-    "хдл": "hdl",
-    "урри": "urri",
-    "матек": "matech",
-    "мутек": "matech",
-    "йилайт": "yeelight",
-    "дайли": "dali",
-    "дале": "dali",
-    "далли": "dali",
-    "гранит": "granit",
-    "алиса": "alisa",
-    "я.алиса": "alisa",
-    "яндекс": "yandex",
-    # Типы устройств
-    "модуль": "module",
-    "контроллер": "controller",
-    "панель": "panel",
-    "датчик": "sensor",
-    "ресивер": "receiver",
-    "усилитель": "amplifier",
-    "шлюз": "gateway",
-    "техничка": "manual",
-    "документация": "manual",
-    "инструкция": "manual",
-    # Протоколы
-    "кникс": "",
-    "кнс": "",
-    # Глаголы (игнорируем)
-    "сбрось": "",
-    "отправь": "",
-    "найди": "",
-    "дай": "",
-    "скинь": "",
-}
\ No newline at end of file
+# bot/utils/synonyms.py
+import re
+from typing import Dict, List
+
+# Словарь расширения запроса: слово -> варианты написания (SearchEngine.expand_synonyms)
+QUERY_EXPANSIONS: Dict[str, List[str]] = {
+    "кабель": ["cable", "провод", "wire", "кабел"],
+    "knx": ["кникс", "кнх", "knx"],
+    "датчик": ["sensor", "сенсор", "детектор"],
+    "реле": ["relay", "рел", "переключатель"],
+    "контроллер": ["controller", "control", "управляющий"],
+    "панель": ["panel", "панел"],
+    "инструкция": ["manual", "instruction", "руководство"],
+    "паспорт": ["datasheet", "technical", "технический"],
+    "карниз": ["curtain", "track", "штора", "рельс"],
+    "радиусный": ["изогнутый", "дуговой", "curved"],
+    "спецификация": ["spec", "технические характеристики", "техничка"],
+    "кондиционер": ["ac", "air conditioner", "климат", "сплит"],
+    "совместимость": ["совместим", "работает с", "поддержка", "интеграция"],
+    "модель": ["модели", "артикул", "серия"],
+    "urri": ["урри", "юрии"],
+    "hdl": ["хдл"],
+    "buspro": ["баспро", "баспр"],
+    "matech": ["матек", "матеч"],
+    "yeelight": ["йилайт", "yee light"],
+    "easycool": ["изикул", "easy cool", "изи кул"],
+    "кабел": ["кабель", "cable"],
+    "замок": ["lock", "дверной замок", "door lock"],
+    "кулплаг": ["кулплаг", "кул плаг", "кулплаг техничка", "кулплаг мануал"],
+    "замки": ["locks", "дверные замки", "door locks"],
+    "дверной": ["door", "дверной"],
+    "iot": ["иот", "iot systems", "айоти"],
+    "техничка": ["техническая", "technical", "документация", "паспорт"]
+}
+
+# Замены при нормализации запросов и имён: русское написание -> латинское
+SYNONYMS: Dict[str, str] = {
+    "кабель": "cable", "кникс": "knx", "кнх": "knx", "датчик": "sensor",
+    "реле": "relay", "контроллер": "controller", "панель": "panel",
+    "инструкция": "manual", "паспорт": "datasheet", "урри": "urri",
+    "юрии": "urri", "хдл": "hdl", "баспро": "buspro", "баспр": "buspro",
+    "матек": "matech", "матеч": "matech", "йилайт": "yeelight",
+    "изикул": "easycool", "кабел": "cable", "замок": "lock",
+    "дверной": "door", "иот": "iot", "айоти": "iot", "техничка": "technical",
+    "кулплуг": "coolplug",
+    "кулплаг": "coolplug",
+    "кулплаг техничка": "coolplug manual",
+    "кулплаг мануал": "coolplug manual","кулплагтехничка": "coolplug manual","кулплагмануал": "coolplug manual",
+}
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """Регулярка-префиксное дерево: ветки различаются первым символом, длинное совпадение приоритетнее"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class SynonymNormalizer:
+    """
+    Нормализация текста с синонимами за один проход.
+
+    Все ключи таблицы компилируются в одну регулярку-дерево, поэтому замены
+    делаются одним re.sub слева направо (на каждой позиции — самое длинное
+    совпадение), а не отдельным str.replace на каждую запись.
+    """
+
+    _cleanup_re = re.compile(r"[^a-z0-9\s]+")
+    _spaces_re = re.compile(r"\s+")
+
+    def __init__(self, synonyms: Dict[str, str]):
+        self.synonyms = dict(synonyms)
+        self._pattern = re.compile(_trie_pattern(list(self.synonyms))) if self.synonyms else None
+
+    def _replace(self, match: "re.Match") -> str:
+        return self.synonyms[match.group(0)]
+
+    def normalize(self, text: str) -> str:
+        text = text.lower().strip()
+        if self._pattern is not None:
+            text = self._pattern.sub(self._replace, text)
+        text = self._cleanup_re.sub(" ", text)
+        return self._spaces_re.sub(" ", text).strip()
+
+
+_normalizer = SynonymNormalizer(SYNONYMS)
+
+
+def normalize_with_synonyms(query: str) -> str:
+    """Нормализация текста с синонимами (общая для индексации и поиска)"""
+    return _normalizer.normalize(query)
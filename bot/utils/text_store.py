@@ -0,0 +1,99 @@
+# bot/utils/text_store.py
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+TEXTS_DIR = "data/cache/texts"
+MANIFEST_NAME = "manifest.json"
+# Прежнее имя манифеста: путалось с data/cache/file_index.json, читается для миграции
+LEGACY_MANIFEST_NAME = "file_index.json"
+
+# Поля ресурса Яндекс.Диска, по которым определяется, что файл изменился
+RESOURCE_META_FIELDS = ("size", "md5", "modified")
+
+
+class TextStore:
+    """
+    Хранилище извлечённого из PDF текста: по файлу .txt на документ
+    и манифест manifest.json «путь на Диске -> запись о тексте».
+
+    В записи манифеста хранятся size, md5 и modified ресурса на момент
+    извлечения, поэтому при пересборке скачиваются только новые
+    и изменённые файлы.
+    """
+
+    def __init__(self, directory: str = TEXTS_DIR):
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, MANIFEST_NAME)
+        self.manifest: Dict[str, Dict[str, Any]] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        manifest_file = self.manifest_file
+        if not os.path.exists(manifest_file):
+            manifest_file = os.path.join(self.directory, LEGACY_MANIFEST_NAME)
+        try:
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def save_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.manifest_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_file)
+
+    @staticmethod
+    def text_name(path: str) -> str:
+        return hashlib.sha1(path.encode("utf-8")).hexdigest() + ".txt"
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.manifest
+
+    def __len__(self) -> int:
+        return len(self.manifest)
+
+    def is_current(self, path: str, meta: Dict[str, Any]) -> bool:
+        """Текст извлечён из той же версии файла, что сейчас лежит на Диске"""
+        entry = self.manifest.get(path)
+        if not entry or not meta.get("md5") and not meta.get("modified"):
+            return False
+        if any(entry.get(field) != meta.get(field) for field in RESOURCE_META_FIELDS):
+            return False
+        return os.path.exists(os.path.join(self.directory, entry["text_file"]))
+
+    def text_path(self, path: str) -> str:
+        """Куда записывать текст документа (для записи напрямую из процесса извлечения)"""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, self.text_name(path))
+
+    def register(self, path: str, chars: int, **meta: Any):
+        """Учитывает в манифесте текст, уже записанный в text_path(path)"""
+        self.manifest[path] = {"text_file": self.text_name(path), "chars": chars, **meta}
+
+    def save(self, path: str, text: str, **meta: Any):
+        """Сохраняет текст документа; манифест записывается отдельно через save_manifest"""
+        with open(self.text_path(path), "w", encoding="utf-8") as f:
+            f.write(text)
+        self.register(path, len(text), **meta)
+
+    def load(self, path: str) -> Optional[str]:
+        entry = self.manifest.get(path)
+        if not entry:
+            return None
+        try:
+            with open(os.path.join(self.directory, entry["text_file"]), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def remove(self, path: str):
+        entry = self.manifest.pop(path, None)
+        if entry:
+            try:
+                os.remove(os.path.join(self.directory, entry["text_file"]))
+            except OSError:
+                pass
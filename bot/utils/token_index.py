@@ -0,0 +1,164 @@
+# bot/utils/token_index.py
+import zlib
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+
+# Поля документа, которые попадают в индекс
+INDEX_FIELDS = ("name", "path", "norm_name")
+
+# Размер n-граммы для поиска подстрок в словаре токенов
+GRAM_SIZE = 3
+
+# n-граммы словаря хешируются в корзины, как и в ngram_similarity
+GRAM_BUCKETS = 1 << 16
+
+# Сколько разрешённых слов запроса держать в памяти
+WORD_CACHE_LIMIT = 10000
+
+
+def iter_grams(text: str, size: int = GRAM_SIZE) -> Iterable[str]:
+    for i in range(len(text) - size + 1):
+        yield text[i:i + size]
+
+
+def gram_buckets(text: str) -> List[int]:
+    return sorted({zlib.crc32(gram.encode("utf-8")) % GRAM_BUCKETS for gram in iter_grams(text)})
+
+
+def to_csr(keys: List[int], values: List[int], key_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Пары (ключ, значение) -> смещения и значения CSR; порядок значений внутри ключа сохраняется"""
+    keys_array = np.asarray(keys, dtype=np.int64)
+    values_array = np.asarray(values, dtype=np.int32)
+    order = np.argsort(keys_array, kind="stable")
+    offsets = np.zeros(key_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys_array, minlength=key_count), out=offsets[1:])
+    return offsets, values_array[order]
+
+
+class TokenIndex:
+    """
+    Инвертированный индекс: токен (по пробелам) из name/path/norm_name -> документы.
+
+    Поиск в движке проверяет вхождение слова запроса подстрокой в поле файла.
+    Слово без пробелов входит в поле тогда и только тогда, когда оно входит
+    в один из токенов поля, поэтому кандидатов достаточно искать по словарю
+    токенов: через n-граммы словаря находим токены, содержащие слово, и
+    объединяем их списки документов. Стоимость запроса зависит от числа
+    совпадений, а не от размера корпуса.
+
+    Списки хранятся как CSR-массивы NumPy, чтобы индекс можно было
+    записать в бинарный файл и открыть через mmap без разбора.
+    """
+
+    def __init__(self, size: int, tokens: Sequence[str],
+                 postings: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                 gram_offsets: np.ndarray, gram_tokens: np.ndarray):
+        self.size = size
+        self.tokens = tokens
+        self.postings = postings
+        self.gram_offsets = gram_offsets
+        self.gram_tokens = gram_tokens
+        self._word_cache: Dict[Tuple[str, Tuple[str, ...]], Set[int]] = {}
+        self._array_cache: Dict[Tuple[str, Tuple[str, ...]], np.ndarray] = {}
+
+    @classmethod
+    def build(cls, fields: Dict[str, Sequence[str]], size: int) -> "TokenIndex":
+        """Построение по значениям полей (уже в нижнем регистре)"""
+        vocab: Dict[str, int] = {}
+        tokens: List[str] = []
+        postings = {}
+        for field in INDEX_FIELDS:
+            token_ids: List[int] = []
+            doc_ids: List[int] = []
+            for doc_id, value in enumerate(fields[field]):
+                for token in sorted(set(value.split())):
+                    token_id = vocab.get(token)
+                    if token_id is None:
+                        token_id = vocab[token] = len(tokens)
+                        tokens.append(token)
+                    token_ids.append(token_id)
+                    doc_ids.append(doc_id)
+            postings[field] = (token_ids, doc_ids)
+
+        postings = {
+            field: to_csr(token_ids, doc_ids, len(tokens))
+            for field, (token_ids, doc_ids) in postings.items()
+        }
+        bucket_keys: List[int] = []
+        bucket_tokens: List[int] = []
+        for token_id, token in enumerate(tokens):
+            for bucket in gram_buckets(token):
+                bucket_keys.append(bucket)
+                bucket_tokens.append(token_id)
+        gram_offsets, gram_tokens = to_csr(bucket_keys, bucket_tokens, GRAM_BUCKETS)
+        return cls(size, tokens, postings, gram_offsets, gram_tokens)
+
+    def _tokens_containing(self, word: str) -> List[int]:
+        """Токены словаря, в которые слово входит подстрокой"""
+        if len(word) < GRAM_SIZE:
+            return [token_id for token_id in range(len(self.tokens)) if word in self.tokens[token_id]]
+        slices = []
+        for bucket in gram_buckets(word):
+            token_ids = self.gram_tokens[self.gram_offsets[bucket]:self.gram_offsets[bucket + 1]]
+            if not len(token_ids):
+                return []
+            slices.append(token_ids)
+        slices.sort(key=len)
+        candidates = slices[0]
+        for token_ids in slices[1:]:
+            candidates = np.intersect1d(candidates, token_ids, assume_unique=True)
+            if not len(candidates):
+                return []
+        return [token_id for token_id in candidates.tolist() if word in self.tokens[token_id]]
+
+    def docs_containing(self, word: str, fields: Tuple[str, ...] = INDEX_FIELDS) -> Set[int]:
+        """Документы, у которых слово входит подстрокой хотя бы в одно из полей"""
+        key = (word, fields)
+        cached = self._word_cache.get(key)
+        if cached is not None:
+            return cached
+        docs: Set[int] = set()
+        if word:
+            token_ids = self._tokens_containing(word)
+            for field in fields:
+                offsets, doc_ids = self.postings[field]
+                for token_id in token_ids:
+                    docs.update(doc_ids[offsets[token_id]:offsets[token_id + 1]].tolist())
+        if len(self._word_cache) >= WORD_CACHE_LIMIT:
+            self._word_cache.clear()
+        self._word_cache[key] = docs
+        return docs
+
+    def docs_array(self, word: str, fields: Tuple[str, ...] = INDEX_FIELDS) -> np.ndarray:
+        """docs_containing в виде массива NumPy (для векторных подсчётов по всем документам)"""
+        key = (word, fields)
+        cached = self._array_cache.get(key)
+        if cached is not None:
+            return cached
+        docs = self.docs_containing(word, fields)
+        array = np.fromiter(docs, dtype=np.int64, count=len(docs))
+        if len(self._array_cache) >= WORD_CACHE_LIMIT:
+            self._array_cache.clear()
+        self._array_cache[key] = array
+        return array
+
+    def docs_containing_phrase(self, phrase: str, fields: Tuple[str, ...] = INDEX_FIELDS) -> Set[int]:
+        """Надмножество документов, содержащих фразу: пересечение по её словам"""
+        words = phrase.split()
+        if not words:
+            return set()
+        result = set(self.docs_containing(words[0], fields))
+        for word in words[1:]:
+            result &= self.docs_containing(word, fields)
+            if not result:
+                break
+        return result
+
+    def candidates(self, phrases: Iterable[str], fields: Tuple[str, ...] = INDEX_FIELDS) -> Set[int]:
+        """Документы, разделяющие с запросом хотя бы одно слово"""
+        result: Set[int] = set()
+        for phrase in phrases:
+            for word in phrase.split():
+                result |= self.docs_containing(word, fields)
+        return result
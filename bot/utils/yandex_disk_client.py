@@ -0,0 +1,250 @@
+# bot/utils/yandex_disk_client.py
+import asyncio
+import json
+import logging
+import os
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+YANDEX_DISK_TOKEN = os.getenv("YANDEX_DISK_TOKEN")
+BASE_URL = "https://cloud-api.yandex.net/v1/disk"
+
+# Одновременные запросы к API, размер страницы листинга и повторы при 429/5xx
+YANDEX_DISK_CONCURRENCY = int(os.getenv("YANDEX_DISK_CONCURRENCY", "8"))
+YANDEX_DISK_PAGE_LIMIT = int(os.getenv("YANDEX_DISK_PAGE_LIMIT", "1000"))
+YANDEX_DISK_MAX_RETRIES = int(os.getenv("YANDEX_DISK_MAX_RETRIES", "5"))
+YANDEX_DISK_TIMEOUT = float(os.getenv("YANDEX_DISK_TIMEOUT", "30"))
+
+# Как часто (в обработанных папках) сохранять контрольную точку обхода
+CHECKPOINT_EVERY = 20
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+
+# Поля ресурса, которые нужны индексу (остальное API не присылает)
+RESOURCE_FIELDS = ("name", "type", "size", "md5", "modified")
+LIST_FIELDS = ",".join([f"_embedded.items.{field}" for field in RESOURCE_FIELDS] + ["_embedded.total"])
+
+
+def _join(folder: str, name: str) -> str:
+    return f"{folder.rstrip('/')}/{name}"
+
+
+class YandexDiskClient:
+    """
+    Асинхронный клиент REST API Яндекс.Диска.
+
+    Один пул соединений httpx на всё время работы, не больше
+    YANDEX_DISK_CONCURRENCY запросов одновременно, повтор с экспоненциальной
+    задержкой при 429/5xx и сетевых ошибках. Используется как
+    асинхронный контекстный менеджер.
+    """
+
+    def __init__(self, token: Optional[str] = None, concurrency: int = YANDEX_DISK_CONCURRENCY,
+                 page_limit: int = YANDEX_DISK_PAGE_LIMIT, max_retries: int = YANDEX_DISK_MAX_RETRIES,
+                 timeout: float = YANDEX_DISK_TIMEOUT):
+        token = token or YANDEX_DISK_TOKEN
+        if not token:
+            raise ValueError("❌ YANDEX_DISK_TOKEN не найден в .env")
+        self.headers = {"Authorization": f"OAuth {token}"}
+        self.concurrency = concurrency
+        self.page_limit = page_limit
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> "YandexDiskClient":
+        self._client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            headers=self.headers,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), RETRY_MAX_DELAY)
+        delay = min(RETRY_BASE_DELAY * (2 ** attempt), RETRY_MAX_DELAY)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _get(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """GET с повторами; задержка между попытками не занимает слот конкурентности"""
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                async with self._semaphore:
+                    response = await self._client.get(url, params=params)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.json()
+                error: Exception = httpx.HTTPStatusError(
+                    f"HTTP {response.status_code}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            delay = self._retry_delay(attempt, response)
+            logger.warning(f"⚠️ {url} {params.get('path')}: {error}, повтор через {delay:.1f} с")
+            await asyncio.sleep(delay)
+
+    async def list_folder(self, path: str) -> List[Dict[str, Any]]:
+        """Всё содержимое папки: страницы по page_limit через offset"""
+        items: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            data = await self._get("/resources", {
+                "path": path,
+                "limit": self.page_limit,
+                "offset": offset,
+                "fields": LIST_FIELDS,
+            })
+            embedded = data.get("_embedded", {})
+            page = embedded.get("items", [])
+            items.extend(page)
+            offset += len(page)
+            total = embedded.get("total")
+            if not page or len(page) < self.page_limit or (total is not None and offset >= total):
+                return items
+
+    async def crawl(self, base_path: str,
+                    checkpoint_file: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Обход дерева папок; возвращает все файлы (dict с полями RESOURCE_FIELDS
+        и путём, собранным от base_path) и папки, которые не удалось прочитать
+        и после повторов: их файлов (и файлов их подпапок) в списке нет.
+
+        С checkpoint_file готовые папки периодически сохраняются на диск,
+        и прерванный обход продолжается с того же места. После успешного
+        завершения файл контрольной точки удаляется.
+        """
+        done = _load_checkpoint(checkpoint_file, base_path)
+        if done:
+            logger.info(f"♻️ Продолжаю обход: {len(done)} папок уже просмотрено")
+        queue: asyncio.Queue = asyncio.Queue()
+        seen = {base_path}
+        failed: List[str] = []
+        processed = 0
+
+        def expand(folder: str):
+            for item in done[folder]:
+                if item.get("type") == "dir":
+                    child = _join(folder, item["name"])
+                    if child not in seen:
+                        seen.add(child)
+                        queue.put_nowait(child)
+
+        queue.put_nowait(base_path)
+
+        async def worker():
+            nonlocal processed
+            while True:
+                folder = await queue.get()
+                try:
+                    if folder not in done:
+                        try:
+                            done[folder] = await self.list_folder(folder)
+                        except Exception as e:
+                            logger.error(f"❌ Ошибка {folder}: {e}")
+                            failed.append(folder)
+                            continue
+                        processed += 1
+                        if checkpoint_file and processed % CHECKPOINT_EVERY == 0:
+                            _save_checkpoint(checkpoint_file, base_path, done)
+                    expand(folder)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if checkpoint_file and (failed or queue.qsize()):
+                _save_checkpoint(checkpoint_file, base_path, done)
+
+        if checkpoint_file and not failed:
+            _remove_checkpoint(checkpoint_file)
+
+        files = []
+        for folder in sorted(seen):
+            for item in done.get(folder, []):
+                if item.get("type") != "dir":
+                    files.append({**item, "path": _join(folder, item["name"])})
+        logger.info(f"✅ Обход завершён: {len(seen)} папок, {len(files)} файлов, ошибок {len(failed)}")
+        return files, sorted(failed)
+
+
+def download_to_file(path: str, destination: str, token: Optional[str] = None,
+                     chunk_size: int = 1 << 20, timeout: float = YANDEX_DISK_TIMEOUT):
+    """Скачивание файла с Яндекс.Диска потоком на локальный диск (синхронно, для процессов извлечения)"""
+    token = token or YANDEX_DISK_TOKEN
+    if not token:
+        raise ValueError("❌ YANDEX_DISK_TOKEN не найден в .env")
+    with httpx.Client(timeout=timeout, follow_redirects=True) as client:
+        response = client.get(f"{BASE_URL}/resources/download",
+                              headers={"Authorization": f"OAuth {token}"}, params={"path": path})
+        response.raise_for_status()
+        with client.stream("GET", response.json()["href"]) as file_response:
+            file_response.raise_for_status()
+            with open(destination, "wb") as f:
+                for chunk in file_response.iter_bytes(chunk_size):
+                    f.write(chunk)
+
+
+def _load_checkpoint(checkpoint_file: Optional[str], base_path: str) -> Dict[str, List[Dict[str, Any]]]:
+    if not checkpoint_file:
+        return {}
+    try:
+        with open(checkpoint_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("base_path") != base_path:
+        return {}
+    return data.get("folders", {})
+
+
+def _save_checkpoint(checkpoint_file: str, base_path: str, folders: Dict[str, List[Dict[str, Any]]]):
+    os.makedirs(os.path.dirname(checkpoint_file) or ".", exist_ok=True)
+    tmp_path = f"{checkpoint_file}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"base_path": base_path, "folders": folders}, f, ensure_ascii=False)
+    os.replace(tmp_path, checkpoint_file)
+
+
+def _remove_checkpoint(checkpoint_file: str):
+    try:
+        os.remove(checkpoint_file)
+    except OSError:
+        pass
+
+
+async def crawl_folder_tree(base_path: str,
+                            checkpoint_file: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Все файлы дерева base_path на Яндекс.Диске и папки, которые прочитать не удалось"""
+    async with YandexDiskClient() as client:
+        return await client.crawl(base_path, checkpoint_file)
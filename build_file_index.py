@@ -50,53 +50,134 @@
 #     build_index(base)
 
 # build_file_index.py
+import asyncio
 import os
 import json
-from bot.utils.yandex_disk_client import search_in_file_index, get_folder_contents, normalize_with_synonyms 
+from bot.utils.synonyms import normalize_with_synonyms
+from bot.utils.phonetic import name_keys
+from bot.utils.search_index import SearchIndex, binary_index_path, texts_dir
+from bot.utils.pdf_text_cahe import extract_documents
+from bot.utils.passages import PassageIndex, passage_index_path
+from bot.utils.text_store import RESOURCE_META_FIELDS, TextStore
+from bot.utils.yandex_disk_client import crawl_folder_tree
 
 INDEX_PATH = "data/cache/file_index.json"
+# Контрольная точка обхода Диска: прерванная сборка продолжит с неё
+CRAWL_CHECKPOINT_PATH = "data/cache/crawl_checkpoint.json"
+# Как часто (в извлечённых документах) сохранять манифест текстов: прерванная сборка не теряет готовое
+MANIFEST_SAVE_EVERY = 50
 os.makedirs("data/cache", exist_ok=True)
 
+def under_folders(path: str, folders) -> bool:
+    """Лежит ли файл в одной из папок (или их подпапках)"""
+    return any(path.startswith(folder.rstrip("/") + "/") for folder in folders)
+
+def previous_files(folders):
+    """Записи прежнего индекса из папок, которые не удалось прочитать при обходе"""
+    try:
+        with open(INDEX_PATH, "r", encoding="utf-8") as f:
+            return [file_data for file_data in json.load(f) if under_folders(file_data["path"], folders)]
+    except (OSError, ValueError):
+        return []
+
+def extract_texts(files, resources, text_store: TextStore, failed_folders=()):
+    """
+    Извлекает текст только из новых и изменённых PDF (по size/md5/modified
+    из листинга Диска); записи удалённых файлов убираются из манифеста.
+    Файлы из непрочитанных папок (их нет в resources) не трогаются: их
+    тексты не извлекаются заново и не считаются удалёнными.
+    """
+    changed = [
+        f for f in files
+        if f["path"] in resources and not text_store.is_current(f["path"], resources[f["path"]])
+    ]
+    print(f"📄 Извлекаю текст: {len(changed)} новых или изменённых PDF из {len(files)}")
+
+    registered = 0
+
+    def on_done(path, chars, pages):
+        nonlocal registered
+        text_store.register(path, chars, pages=pages, **resources.get(path, {}))
+        registered += 1
+        if registered % MANIFEST_SAVE_EVERY == 0:
+            text_store.save_manifest()
+
+    def on_error(path, error):
+        print(f"⚠️ Ошибка {path}: {error}")
+
+    if changed:
+        try:
+            stats = extract_documents(
+                ((f["path"], text_store.text_path(f["path"])) for f in changed), on_done, on_error
+            )
+        finally:
+            text_store.save_manifest()
+        print(f"📄 Готово: {stats['done']}, ошибок {stats['failed']}")
+
+    # Тексты файлов, которых больше нет на Диске, не нужны
+    known_paths = {file_data["path"] for file_data in files}
+    deleted = [
+        path for path in text_store.manifest
+        if path not in known_paths and not under_folders(path, failed_folders)
+    ]
+    for path in deleted:
+        text_store.remove(path)
+    text_store.save_manifest()
+    print(f"✅ Тексты сохранены: {len(text_store)} документов, удалено {len(deleted)}")
+
 def build_index(base_path: str):
     print(f"🔍 Строю индекс файлов из: {base_path}")
     all_files = []
-    stack = [base_path]
-    visited = set()
-
-    while stack:
-        current = stack.pop()
-        if current in visited:
-            continue
-        visited.add(current)
-
-        try:
-            items = get_folder_contents(current)
-        except Exception as e:
-            print(f"⚠️ Ошибка {current}: {e}")
-            continue
-
-        for item in items:
-            if item["type"] == "dir":
-                full_path = f"{current.rstrip('/')}/{item['name']}"
-                stack.append(full_path)
-            elif item["name"].lower().endswith(".pdf"):
-                filename = item["name"]
-                # Удаляем .pdf для нормализации
-                name_without_ext = filename.rsplit(".", 1)[0] if "." in filename else filename
-                norm_name = normalize_with_synonyms(name_without_ext)
-
-                all_files.append({
-                    "name": filename,
-                    "path": f"{current.rstrip('/')}/{filename}",
-                    "norm_name": norm_name
-                })
-
-    with open(INDEX_PATH, "w", encoding="utf-8") as f:
+    resources = {}
+
+    items, failed_folders = asyncio.run(crawl_folder_tree(base_path, CRAWL_CHECKPOINT_PATH))
+    for item in items:
+        if item["name"].lower().endswith(".pdf"):
+            filename = item["name"]
+            # Удаляем .pdf для нормализации
+            name_without_ext = filename.rsplit(".", 1)[0] if "." in filename else filename
+            norm_name = normalize_with_synonyms(name_without_ext)
+
+            path = item["path"]
+            all_files.append({
+                "name": filename,
+                "path": path,
+                "norm_name": norm_name,
+                # Ключи звучания слов имени: «изикул» и «EasyCool» совпадают без синонимов
+                "keys": name_keys(filename)
+            })
+            resources[path] = {field: item.get(field) for field in RESOURCE_META_FIELDS}
+
+    if failed_folders:
+        # Непрочитанная папка не значит, что её файлы удалены: оставляем их из прежнего индекса
+        kept = previous_files(failed_folders)
+        all_files.extend(kept)
+        print(f"⚠️ Не удалось прочитать папок: {len(failed_folders)}; "
+              f"из прежнего индекса оставлено {len(kept)} PDF")
+
+    # Пишем во временный файл и подменяем атомарно, чтобы бот не прочитал индекс наполовину
+    tmp_path = f"{INDEX_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(all_files, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, INDEX_PATH)
     print(f"✅ Индекс сохранён: {len(all_files)} PDF")
 
+    text_store = TextStore(texts_dir(INDEX_PATH))
+    extract_texts(all_files, resources, text_store, failed_folders)
+
+    # Бинарная копия для бота: открывается через mmap без разбора JSON
+    SearchIndex.build(all_files, text_store).write(binary_index_path(INDEX_PATH))
+    print(f"✅ Бинарный индекс сохранён: {binary_index_path(INDEX_PATH)}")
+
+    # Фрагменты текстов для контекста ИИ
+    passages = PassageIndex.build([f["path"] for f in all_files], text_store)
+    passages.save(passage_index_path(INDEX_PATH))
+    print(f"✅ Индекс фрагментов сохранён: {len(passages)} фрагментов")
+
 if __name__ == "__main__":
+    import logging
     from dotenv import load_dotenv
     load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
     base = os.getenv("YANDEX_DISK_FOLDER_PATH", "/")
     build_index(base)
\ No newline at end of file
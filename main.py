@@ -1,5 +1,6 @@
 import os
 import asyncio
+import html
 import logging
 import sys
 import re
@@ -16,8 +17,10 @@ from aiohttp import web
 from dotenv import load_dotenv
 
 # Обновленные импорты после объединения файлов
-from bot.utils.search_engine import smart_document_search, build_docs_url, should_use_ai_directly, has_only_technical_files
-from bot.utils.ai_fallback import ask_ai
+from bot.utils.search_engine import smart_document_search, build_docs_url, should_use_ai_directly, has_only_technical_files, spelling_suggestion, find_passages, start_search_engine, stop_search_pool
+from bot.utils.ai_fallback import ai_answer_key, close_ai_client, forget_ai_answer, start_ai_client, stream_ai
+from bot.utils.intent_classifier import classify_intent, extract_brands, is_greeting
+from bot.utils.message_stream import ThrottledEditor
 from keyboards import (
     main_reply_keyboard,
     docs_inline_keyboard,
@@ -47,11 +50,6 @@ logging.basicConfig(level=logging.INFO, stream=sys.stdout)
 bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 dp = Dispatcher()
 
-GREETINGS = {
-    "привет", "здравствуйте", "добрый день", "доброе утро", "добрый вечер",
-    "доброй ночи", "доброго дня", "приятного обеда", "приветствую", "хай", "hello", "hi"
-}
-
 SIMPLE_QUERIES = {"урри", "urri", "hdl", "баспро", "buspro", "матек", "matech", "йилайт", "yeelight"}
 
 class SupportForm(StatesGroup):
@@ -66,123 +64,11 @@ def should_use_ai_improved(query: str) -> bool:
     """
     Улучшенная логика определения когда использовать ИИ
     """
-    query_lower = query.lower().strip()
-    
-    # ВЫСШИЙ ПРИОРИТЕТ: Запросы, которые НИКОГДА не идут к ИИ (документация и бренды)
-    never_use_ai_keywords = {
-        # Бренды и продукты
-        "изикул", "easycool", "урри", "urri", "хдл", "hdl", "баспро", "buspro", 
-        "матек", "matech", "йилайт", "yeelight", "изи кул", "карниз", "карнизы", "радиусный", "спецификация карнизов", "паспорт карнизов",
-        
-        # Документация
-        "техничка", "документация", "паспорт", "инструкция", "руководство", "manual",
-        "скачать", "файл", "pdf", "схема", "чертеж", "техническ",
-        
-        # Конкретные запросы документации
-        "техничка на", "документация на", "паспорт на", "инструкция на"
-    }
-    
-    # Если запрос содержит ключевые слова документации - НЕ использовать ИИ
-    if any(keyword in query_lower for keyword in never_use_ai_keywords):
-        logging.info(f"❌ Решение: запрос документации '{query}' → обычный поиск")
-        return False
-    
-    # Запросы, которые сразу идут к ИИ (сложные технические вопросы)
-    ai_direct_keywords = {
-        # Общие технические вопросы
-        "как интегрировать", "как подключить", "как настроить", "как работает",
-        "как сделать", "как использовать", "как реализовать", "как объединить",
-        
-        # Сравнения и выбор
-        "какой лучше", "что выбрать", "сравните", "отличия", "разница между",
-        "преимущества", "недостатки", "плюсы и минусы",
-        
-        # Проблемы и ошибки
-        "проблема с", "ошибка", "не работает", "не подключается", 
-        "не настраивается", "сломал", "не отвечает",
-        
-        # Объяснения
-        "почему", "зачем", "как устроен", "принцип работы", "объясните",
-        "расскажите о", "что такое", "в чем разница",
-        
-        # Сложные технические темы
-        "протокол", "интеграци", "api", "rest api", "websocket", "mqtt",
-        "knx ip", "bacnet", "modbus", "zigbee", "z-wave", "wi-fi",
-        "автоматизаци", "сценарий", "сценар", "логика"
-    }
-    
-    # Проверяем, содержит ли запрос ключевые слова для прямого подключения к ИИ
-    has_ai_keywords = any(keyword in query_lower for keyword in ai_direct_keywords)
-    
-    # Особые случаи для Алисы
-    alisa_keywords = {
-        "алис", "яндекс алис", "yandex alice", "alisa", "mgwip", 
-        "голосов", "голосовой", "ассистент", "шлюз"
-    }
-    
-    if any(keyword in query_lower for keyword in alisa_keywords):
-        # Для Алисы с интеграцией - поиск, для сложных вопросов - ИИ
-        if any(word in query_lower for word in ["интеграци", "настрои", "подключи"]):
-            logging.info(f"❌ Решение: запрос про интеграцию Алисы '{query}' → обычный поиск")
-            return False
-        else:
-            logging.info(f"✅ Решение: сложный вопрос про Алису '{query}' → к ИИ")
-            return True
-    
-    # Логика принятия решения
-    if has_ai_keywords:
-        logging.info(f"✅ Решение: сложный технический запрос '{query}' → к ИИ")
-        return True
-    
-    # Для коротких запросов - обычный поиск
-    if len(query_lower.split()) <= 2:
-        logging.info(f"❌ Решение: короткий запрос '{query}' → обычный поиск")
-        return False
-    
-    # По умолчанию для сложных запросов используем ИИ
-    words_count = len(query_lower.split())
-    if words_count >= 4:  # Длинные запросы скорее всего сложные вопросы
-        # Но проверяем, не является ли это запросом документации
-        if any(doc_word in query_lower for doc_word in ["найди", "скинь", "дай", "сбрось", "отправь"]):
-            logging.info(f"❌ Решение: запрос на поиск документации '{query}' → обычный поиск")
-            return False
-        logging.info(f"✅ Решение: длинный сложный запрос '{query}' → к ИИ")
-        return True
-    
-    logging.info(f"❌ Решение: обычный запрос '{query}' → обычный поиск")
-    return False
+    return classify_intent(query).use_ai
 
 def extract_brands_from_query(query: str) -> str:
     """Извлекает бренды из запроса для контекста ИИ"""
-    query_lower = query.lower()
-    brands = []
-    
-    brand_keywords = {
-        "hdl": "HDL",
-        "урри": "URRI", 
-        "urri": "URRI",
-        "баспро": "Buspro",
-        "buspro": "Buspro",
-        "матек": "Matech",
-        "matech": "Matech",
-        "иот": "iOT Systems",
-        "iot": "iOT Systems",
-        "алис": "Яндекс Алиса",
-        "alisa": "Яндекс Алиса",
-        "yeelight": "Yeelight Pro",
-        "йилайт": "Yeelight Pro",
-        "coolautomation": "CoolAutomation",
-        "dali": "Dali",
-        "дали": "Dali",
-        "easycool": "Easycool",
-        "изикул": "Easycool"
-    }
-    
-    for keyword, brand in brand_keywords.items():
-        if keyword in query_lower:
-            brands.append(brand)
-    
-    return ", ".join(set(brands)) if brands else ""
+    return ", ".join(extract_brands(query))
 
 def format_search_results(results: List[Dict], query: str) -> str:
     """Форматирует результаты поиска в читаемый вид"""
@@ -354,6 +240,24 @@ async def process_phone(message: Message, state: FSMContext):
         await message.answer("Не удалось отправить заявку. Напишите напрямую: https://t.me/hdl_support")
     await state.clear()
 
+def format_sources(passages: List[Dict]) -> str:
+    """Ссылки на документы, фрагменты которых ушли в запрос к ИИ (экранированы для HTML)"""
+    if not passages:
+        return ""
+    links = dict.fromkeys((p["name"], build_docs_url(p["path"])) for p in passages)
+    return "\n\n📎 Источники:\n" + "\n".join(f"• {html.escape(name)}: {html.escape(url)}" for name, url in links)
+
+async def stream_ai_answer(thinking_msg: Message, query: str, context: str, passages: List[Dict]) -> str:
+    """
+    Ответ ИИ с показом текста по мере генерации в сообщении «Анализирую...».
+    Возвращается экранированным: окончательная правка идёт с HTML-разметкой
+    """
+    editor = ThrottledEditor(thinking_msg, prefix="🧠 ")
+    answer = ""
+    async for answer in stream_ai(query, context=context, passages=passages):
+        await editor.update(answer)
+    return html.escape(answer)
+
 async def handle_ai_with_context(message: Message, query: str, state: FSMContext):
     """Обработка ИИ с сохранением контекста"""
     thinking_msg = await message.answer("🤔 Анализирую ваш вопрос...")
@@ -386,13 +290,15 @@ async def handle_ai_with_context(message: Message, query: str, state: FSMContext
         "Рекомендую обратиться к технической документации или специалисту.'"
     )
     
-    ai_response = await ask_ai(query, context=context)
+    # Фрагменты документации по вопросу: ИИ отвечает по ним, а не по общим знаниям
+    passages = await asyncio.to_thread(find_passages, query)
+    ai_response = await stream_ai_answer(thinking_msg, query, context, passages) + format_sources(passages)
     
-    # Формируем кнопки
+    # Формируем кнопки («Нет» несёт ключ ответа, чтобы убрать его из кэша)
     inline_buttons = [
         [
             InlineKeyboardButton(text="✅ Да", callback_data="info_helpful:yes"),
-            InlineKeyboardButton(text="❌ Нет", callback_data="info_helpful:no")
+            InlineKeyboardButton(text="❌ Нет", callback_data=f"info_helpful:no:{ai_answer_key(query, passages)}")
         ]
     ]
     
@@ -402,7 +308,7 @@ async def handle_ai_with_context(message: Message, query: str, state: FSMContext
             InlineKeyboardButton(text="📞 Тех. Специалист", callback_data="support_form")
         ])
     
-    await thinking_msg.edit_text(
+    await ThrottledEditor(thinking_msg).finish(
         f"🧠 {ai_response}\n\nПолученная информация вам помогла?",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=inline_buttons)
     )
@@ -434,6 +340,9 @@ async def handle_search_with_context(message: Message, query: str, state: FSMCon
             
             # Стандартный вывод результатов поиска
             response = f"🔍 Результаты поиска по: <b>{query}</b>\n\n"
+            suggestion = await asyncio.to_thread(spelling_suggestion, query)
+            if suggestion:
+                response += f"✏️ Возможно, вы имели в виду: <b>{suggestion}</b>\n\n"
             response += f"✅ Найдено документов: {len(results)}\n\n"
             
             for i, file_data in enumerate(results[:3], 1):
@@ -542,7 +451,7 @@ async def handle_document_request(message: Message, state: FSMContext) -> None:
         return
 
     # Проверяем приветствия
-    if text.lower().strip(".,!?") in GREETINGS:
+    if is_greeting(text):
         await message.answer(
             "Здравствуйте! 👋\n\n"
             "Используйте кнопки ниже или напишите запрос вручную — я с радостью помогу!",
@@ -583,7 +492,10 @@ async def handle_clarification_message(message: Message, clarification: str, sta
 async def handle_info_helpful_callback(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     
-    action = callback.data.split(":")[1]
+    # info_helpful:<да/нет>[:<ключ ответа ИИ в кэше>]
+    parts = callback.data.split(":")
+    action = parts[1]
+    answer_key = parts[2] if len(parts) > 2 else ""
     data = await state.get_data()
     original_query = data.get("original_query", "запрос")
     clarification_count = data.get("clarification_count", 0)
@@ -602,6 +514,10 @@ async def handle_info_helpful_callback(callback: CallbackQuery, state: FSMContex
         await state.clear()
         
     elif action == "no":
+        # Ответ ИИ, который не помог, больше не отдаётся из кэша
+        if answer_key:
+            await asyncio.to_thread(forget_ai_answer, answer_key)
+        
         clarification_count += 1
         
         if clarification_count <= 2:  # Максимум 2 попытки уточнения
@@ -669,15 +585,16 @@ async def handle_ask_ai_callback(callback: CallbackQuery, state: FSMContext):
         "Отвечай кратко и по делу. Если не знаешь ответа - предложи связаться со специалистом."
     )
     
-    ai_response = await ask_ai(original_query, context=context)
+    passages = await asyncio.to_thread(find_passages, original_query)
+    ai_response = await stream_ai_answer(thinking_msg, original_query, context, passages) + format_sources(passages)
     
-    await thinking_msg.edit_text(
+    await ThrottledEditor(thinking_msg).finish(
         f"🧠 {ai_response}\n\n"
         f"Полученная информация вам помогла?",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
             [
                 InlineKeyboardButton(text="✅ Да", callback_data="info_helpful:yes"),
-                InlineKeyboardButton(text="❌ Нет", callback_data="info_helpful:no")
+                InlineKeyboardButton(text="❌ Нет", callback_data=f"info_helpful:no:{ai_answer_key(original_query, passages)}")
             ]
         ])
     )
@@ -708,6 +625,13 @@ async def on_shutdown(bot: Bot):
 
 def main():
     """Запуск приложения"""
+    # Общий пул соединений с OpenRouter и пул поиска живут столько же, сколько диспетчер
+    # (оба режима — вебхук и polling — вызывают его хуки запуска и остановки)
+    dp.startup.register(start_search_engine)
+    dp.startup.register(start_ai_client)
+    dp.shutdown.register(close_ai_client)
+    dp.shutdown.register(stop_search_pool)
+
     if RENDER_EXTERNAL_URL:
         # Режим вебхука для продакшена
         app = web.Application()
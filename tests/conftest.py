@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+# search_engine при импорте требует настройки Яндекс.Диска; тесты в сеть не ходят
+os.environ.setdefault("YANDEX_DISK_TOKEN", "test-token")
+os.environ.setdefault("DOCS_PUBLIC_KEY", "test-key")
+
+
+class FakeClock:
+    """Часы, которые тест переводит сам: clock.now += 10"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from bot.utils import ai_fallback
+from bot.utils.ai_fallback import StableAIService
+from bot.utils.answer_cache import AnswerCache
+
+QUESTION = "как подключить реле"
+
+
+class ScriptedService(StableAIService):
+    """
+    Модели вместо OpenRouter: script[model] — шаги (задержка, вид, текст),
+    которые _attempt кладёт в очередь событий по одному.
+    """
+
+    def __init__(self, script, cache: AnswerCache):
+        super().__init__()
+        self.script = script
+        self.cache = cache
+        self.model_stats = {model: {"requests": 0, "hedges": 0, "wins": 0} for model in script}
+
+    def _hedge_order(self):
+        return list(self.script)
+
+    async def _attempt(self, model, system_prompt, user_message, events):
+        for delay, kind, text in self.script[model]:
+            await asyncio.sleep(delay)
+            await events.put((model, kind, text))
+            if kind != "partial":
+                return
+
+
+@pytest.fixture
+def make_service(tmp_path, monkeypatch):
+    monkeypatch.setattr(ai_fallback, "AI_HEDGE_DELAY", 0.05)
+    services = []
+
+    def make(script) -> ScriptedService:
+        service = ScriptedService(script, AnswerCache(str(tmp_path / "answers.sqlite3")))
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.cache.close()
+
+
+def collect(service: StableAIService):
+    async def run():
+        return [answer async for answer in service.stream_ai(QUESTION)]
+    return asyncio.run(run())
+
+
+def test_fast_leader_is_not_hedged(make_service):
+    service = make_service({
+        "a": [(0.01, "partial", "A1"), (0.01, "done", "A")],
+        "b": [(0.01, "done", "B")],
+    })
+    assert collect(service) == ["A1", "A"]
+    assert service.model_stats["b"]["hedges"] == 0
+    assert service.model_stats["a"]["wins"] == 1
+    assert service.cache.get(service.answer_key(QUESTION)) == "A"
+
+
+def test_silent_model_is_hedged_and_first_valid_stream_wins(make_service):
+    service = make_service({
+        "a": [(0.5, "done", "A")],
+        "b": [(0.02, "done", "B")],
+    })
+    assert collect(service) == ["B"]
+    assert service.model_stats["b"]["hedges"] == 1
+    assert service.model_stats["b"]["wins"] == 1
+    assert service.model_stats["a"]["wins"] == 0
+
+
+def test_finished_answer_is_used_when_leader_fails(make_service):
+    # a ведёт (первый текст на 0.1 с), b дописывает ответ к 0.2 с, a обрывается на 0.4 с
+    service = make_service({
+        "a": [(0.1, "partial", "A1"), (0.3, "failed", "обрыв")],
+        "b": [(0.1, "partial", "B1"), (0.05, "done", "B")],
+    })
+    assert collect(service) == ["A1", "B"]
+    assert service.model_stats["b"]["wins"] == 1
+    assert service.cache.get(service.answer_key(QUESTION)) == "B"
+
+
+def test_running_stream_takes_over_when_leader_fails(make_service):
+    service = make_service({
+        "a": [(0.1, "partial", "A1"), (0.05, "failed", "обрыв")],
+        "b": [(0.15, "partial", "B1"), (0.1, "done", "B")],
+    })
+    assert collect(service) == ["A1", "B1", "B"]
+    assert service.model_stats["b"]["wins"] == 1
+
+
+def test_failed_model_is_replaced_and_fallback_closes_stream(make_service):
+    service = make_service({
+        "a": [(0.01, "failed", "ошибка")],
+        "b": [(0.01, "failed", "ошибка")],
+    })
+    assert collect(service) == [service._get_smart_fallback(QUESTION)]
+    # b запущен сразу после отказа a, а не по таймеру хеджирования
+    assert service.model_stats["b"]["hedges"] == 0
+    assert service.cache.get(service.answer_key(QUESTION)) is None
+
+
+def test_cached_answer_skips_models(make_service):
+    service = make_service({"a": [(0.01, "done", "A")]})
+    service.cache.set(service.answer_key(QUESTION), QUESTION, "a", "из кэша")
+    assert collect(service) == ["из кэша"]
+    assert service.model_stats["a"]["wins"] == 0
@@ -0,0 +1,62 @@
+import pytest
+
+from bot.utils import answer_cache
+from bot.utils.answer_cache import AnswerCache, answer_key
+
+
+@pytest.fixture
+def fake_time(monkeypatch, clock):
+    clock.now = 1000.0
+    monkeypatch.setattr(answer_cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+
+    def make(**kwargs) -> AnswerCache:
+        cache = AnswerCache(str(tmp_path / "answers.sqlite3"), **kwargs)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def test_answer_expires_after_ttl(make_cache, fake_time):
+    cache = make_cache(ttl=60, max_entries=10)
+    cache.set("k", "вопрос", "model", "ответ")
+    fake_time.now += 59
+    assert cache.get("k") == "ответ"
+    fake_time.now += 1
+    assert cache.get("k") is None
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted(make_cache, fake_time):
+    cache = make_cache(ttl=3600, max_entries=2)
+    cache.set("a", "a", "model", "A")
+    fake_time.now += 1
+    cache.set("b", "b", "model", "B")
+    fake_time.now += 1
+    assert cache.get("a") == "A"
+    fake_time.now += 1
+    cache.set("c", "c", "model", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.evictions == 1
+
+
+def test_answers_survive_reopen(make_cache):
+    make_cache().set("k", "вопрос", "model", "ответ")
+    assert make_cache().get("k") == "ответ"
+
+
+def test_key_ignores_case_punctuation_and_brand_order():
+    assert answer_key("Как подключить HDL?", ["hdl", "dali"], "1") == answer_key("как подключить hdl", ["dali", "hdl"], "1")
+    assert answer_key("как подключить", [], "1") != answer_key("как подключить", [], "2")
+    assert answer_key("как подключить", [], "1", ["a\x1eтекст"]) != answer_key("как подключить", [], "1", ["a\x1eдругой"])
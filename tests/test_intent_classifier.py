@@ -0,0 +1,44 @@
+import pytest
+
+from bot.utils.intent_classifier import classify_intent, extract_brands, get_intent_classifier, is_greeting
+
+
+@pytest.mark.parametrize("query, use_ai, rule", [
+    ("техничка на изикул", False, "never_ai"),
+    ("как подключить hdl к knx", False, "never_ai"),  # бренд — это запрос документации
+    ("как подключить реле к шине", True, "ai_direct"),
+    ("настроить интеграцию с алисой", False, "alisa_integration"),
+    ("алиса не понимает команды", True, "alisa"),
+    ("датчик движения", False, "short"),
+    ("найди что-нибудь про датчики движения", False, "doc_verbs"),
+    ("нужен совет по выбору датчиков движения", True, "long"),
+    ("датчик движения потолочный", False, "default"),
+])
+def test_decision_rules(query, use_ai, rule):
+    decision = classify_intent(query)
+    assert (decision.use_ai, decision.rule) == (use_ai, rule)
+
+
+def test_trace_lists_matched_patterns():
+    trace = classify_intent("Почему не работает Buspro").trace()
+    assert trace["rule"] == "never_ai"
+    assert trace["hits"]["complex"] == ["не работает", "почему"]
+    assert trace["brands"] == ["Buspro"]
+    assert trace["word_count"] == 4
+
+
+def test_use_ai_directly_skips_alisa_and_integrations():
+    classifier = get_intent_classifier()
+    assert classifier.use_ai_directly("почему не работает реле")
+    assert not classifier.use_ai_directly("почему не работает алиса")
+    assert not classifier.use_ai_directly("как подключить реле")
+
+
+def test_brands_follow_table_order_without_duplicates():
+    assert extract_brands("dali и HDL, ещё раз hdl") == ("HDL", "Dali")
+    assert extract_brands("реле") == ()
+
+
+def test_greetings():
+    assert is_greeting("Привет!")
+    assert not is_greeting("привет, нужна техничка")
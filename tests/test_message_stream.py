@@ -0,0 +1,85 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import EditMessageText
+
+from bot.utils import message_stream
+from bot.utils.message_stream import STREAM_CURSOR, ThrottledEditor
+
+
+class FakeMessage:
+    """Сообщение Telegram: запоминает правки; errors — исключения для следующих правок"""
+
+    def __init__(self, *errors: Exception):
+        self.edits = []
+        self.errors = list(errors)
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append((text, kwargs))
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+def bad_request(message: str) -> TelegramBadRequest:
+    return TelegramBadRequest(method=EditMessageText(text="x"), message=message)
+
+
+@pytest.fixture
+def editor_clock(monkeypatch, clock):
+    # Подменяется только time внутри message_stream: цикл событий asyncio идёт по настоящим часам
+    monkeypatch.setattr(message_stream, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def test_updates_are_throttled_and_batched(editor_clock):
+    message = FakeMessage()
+    editor = ThrottledEditor(message, prefix="🤖 ", interval=1.0, min_growth=5)
+
+    async def run():
+        await editor.update("Привет")
+        await editor.update("Привет, мир")  # раньше интервала
+        editor_clock.now = 1.0
+        await editor.update("Привет, мир")
+        editor_clock.now = 2.0
+        await editor.update("Привет, мир!")  # выросло меньше чем на min_growth
+        await editor.update("Другой ответ")  # новый текст показывается сразу
+
+    asyncio.run(run())
+    assert [text for text, _ in message.edits] == [
+        f"🤖 Привет{STREAM_CURSOR}", f"🤖 Привет, мир{STREAM_CURSOR}", f"🤖 Другой ответ{STREAM_CURSOR}",
+    ]
+    assert all(kwargs == {"parse_mode": None} for _, kwargs in message.edits)
+    assert editor.edits == 3
+
+
+def test_retry_after_postpones_next_update(editor_clock):
+    message = FakeMessage(TelegramRetryAfter(method=EditMessageText(text="x"), message="flood", retry_after=5))
+    editor = ThrottledEditor(message, interval=1.0, min_growth=0)
+
+    async def run():
+        await editor.update("раз")
+        editor_clock.now = 4.0
+        await editor.update("раз два")
+        editor_clock.now = 5.0
+        await editor.update("раз два три")
+
+    asyncio.run(run())
+    assert [text for text, _ in message.edits] == [f"раз{STREAM_CURSOR}", f"раз два три{STREAM_CURSOR}"]
+    assert editor.edits == 1
+
+
+def test_finish_falls_back_to_plain_text_and_keeps_buttons():
+    message = FakeMessage(bad_request("Bad Request: can't parse entities"))
+    asyncio.run(ThrottledEditor(message).finish("<b>ответ", reply_markup="кнопки", parse_mode="HTML"))
+    assert message.edits == [
+        ("<b>ответ", {"reply_markup": "кнопки", "parse_mode": "HTML"}),
+        ("<b>ответ", {"reply_markup": "кнопки", "parse_mode": None}),
+    ]
+
+
+def test_finish_ignores_unchanged_message():
+    message = FakeMessage(bad_request("Bad Request: message is not modified"))
+    asyncio.run(ThrottledEditor(message).finish("ответ", reply_markup="кнопки"))
+    assert len(message.edits) == 1
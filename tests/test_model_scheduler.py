@@ -0,0 +1,71 @@
+from typing import Callable
+
+from bot.utils.model_scheduler import CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, ModelScheduler
+
+
+def make_scheduler(clock: Callable[[], float]) -> ModelScheduler:
+    return ModelScheduler(["a", "b"], threshold=2, cooldown=10, clock=clock)
+
+
+def test_faster_model_goes_first(clock):
+    scheduler = make_scheduler(clock)
+    scheduler.record_success("a", 3.0)
+    scheduler.record_success("b", 1.0)
+    assert scheduler.order() == ["b", "a"]
+
+
+def test_circuit_opens_after_threshold_failures(clock):
+    scheduler = make_scheduler(clock)
+    scheduler.record_failure("a")
+    assert scheduler.health["a"].state == CIRCUIT_CLOSED
+    scheduler.record_failure("a")
+    assert scheduler.health["a"].state == CIRCUIT_OPEN
+    clock.now = 9.9
+    assert scheduler.order() == ["b"]
+
+
+def test_half_open_probe_goes_first_and_success_closes(clock):
+    scheduler = make_scheduler(clock)
+    scheduler.record_failure("a")
+    scheduler.record_failure("a")
+    clock.now = 10.0
+    assert scheduler.order() == ["a", "b"]
+    assert scheduler.health["a"].state == CIRCUIT_HALF_OPEN
+    scheduler.started("a")
+    # Пока идёт проба, второй пробный запрос не выдаётся
+    assert scheduler.order() == ["b"]
+    scheduler.record_success("a", 1.0)
+    assert scheduler.health["a"].state == CIRCUIT_CLOSED
+
+
+def test_failed_probe_reopens_circuit(clock):
+    scheduler = make_scheduler(clock)
+    scheduler.record_failure("a")
+    scheduler.record_failure("a")
+    clock.now = 10.0
+    scheduler.order()
+    scheduler.started("a")
+    scheduler.record_failure("a")
+    assert scheduler.health["a"].state == CIRCUIT_OPEN
+    assert scheduler.health["a"].opened_at == 10.0
+    clock.now = 15.0
+    assert scheduler.order() == ["b"]
+
+
+def test_cancelled_probe_is_offered_again(clock):
+    scheduler = make_scheduler(clock)
+    scheduler.record_failure("a")
+    scheduler.record_failure("a")
+    clock.now = 10.0
+    scheduler.order()
+    scheduler.started("a")
+    scheduler.cancelled("a")
+    assert scheduler.order()[0] == "a"
+
+
+def test_all_open_returns_every_model(clock):
+    scheduler = make_scheduler(clock)
+    for model in ("a", "b"):
+        scheduler.record_failure(model)
+        scheduler.record_failure(model)
+    assert sorted(scheduler.order()) == ["a", "b"]
@@ -0,0 +1,30 @@
+import pytest
+
+from bot.utils.phonetic import PhoneticIndex, cyrillic_phonetic_keys, name_keys, phonetic_key
+
+
+@pytest.mark.parametrize("russian, latin", [
+    ("изикул", "easycool"),
+    ("матек", "matech"),
+    ("йилайт", "yeelight"),
+    ("баспро", "buspro"),
+])
+def test_phonetic_key_matches_transliteration(russian, latin):
+    assert phonetic_key(russian) == phonetic_key(latin)
+
+
+def test_query_keys_skip_latin_words():
+    assert cyrillic_phonetic_keys("изикул easycool") == [phonetic_key("изикул")]
+
+
+def test_index_counts_matched_keys_and_skips_common_ones():
+    index = PhoneticIndex.build([
+        name_keys("EasyCool KNX manual.pdf"),
+        name_keys("Yeelight EasyCool.pdf"),
+        name_keys("Yeelight lamp.pdf"),
+    ])
+    keys = cyrillic_phonetic_keys("изикул йилайт")
+    assert index.matches(keys) == {0: 1, 1: 2, 2: 1}
+    # Оба ключа есть в двух документах — при max_docs=1 они не учитываются
+    assert index.matches(keys, max_docs=1) == {}
+    assert index.matches([phonetic_key("матек")]) == {}
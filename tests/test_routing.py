@@ -0,0 +1,76 @@
+import pytest
+
+from bot.utils.routing import (
+    ROUTE_KNX_CABLE, ROUTE_LINKS, ROUTE_SEARCH, AhoCorasick, RouteRule, Router, load_router,
+)
+
+LINK = [{"name": "Папка по запросу «{query}»", "url": "https://disk.example/folder"}]
+
+
+@pytest.fixture
+def router() -> Router:
+    return Router.from_config({"rules": [
+        {"name": "alisa", "priority": 100, "action": ROUTE_LINKS, "links": LINK,
+         "when": [[{"contains": ["алис"]}, {"contains": ["интеграци", "подключи"]}]]},
+        {"name": "cable", "priority": 50, "action": ROUTE_KNX_CABLE,
+         "when": [[{"contains": ["ye00820"]}], [{"contains": ["knx"]}, {"words": ["кабель"]}]]},
+        {"name": "cable_exact", "priority": 40, "action": ROUTE_LINKS, "links": LINK,
+         "when": [[{"exact": ["Кабели"]}]]},
+        {"name": "knx", "priority": 10, "action": ROUTE_SEARCH, "when": [[{"contains": ["knx"]}]]},
+    ]})
+
+
+def test_automaton_finds_overlapping_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    found = {automaton.patterns[i] for i in automaton.find("ushers")}
+    assert found == {"he", "she", "hers"}
+
+
+@pytest.mark.parametrize("query, rule", [
+    ("интеграция Алисы", "alisa"),
+    ("алиса", None),  # нужны оба условия
+    ("кабель KNX", "cable"),
+    ("YE00820", "cable"),
+    ("кабельный канал knx", "knx"),  # «кабель» — только целым словом
+    ("  кабели ", "cable_exact"),
+    ("кабели knx", "knx"),
+    ("реле", None),
+])
+def test_match_picks_highest_priority_satisfied_rule(router, query, rule):
+    found = router.match(query)
+    assert (found.name if found else None) == rule
+
+
+def test_match_filters_by_action_and_priority(router):
+    assert router.match("интеграция алисы knx", {ROUTE_SEARCH}).name == "knx"
+    assert router.match("кабель knx", below=50).name == "knx"
+    assert router.match("кабель knx", below=10) is None
+
+
+def test_links_substitute_query(router):
+    assert router.match("подключить алису").results("подключить алису") == [{
+        "name": "Папка по запросу «подключить алису»",
+        "path": "https://disk.example/folder",
+        "is_folder_link": True,
+        "folder_link": "https://disk.example/folder",
+    }]
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError):
+        RouteRule("x", 1, "redirect", [[{"contains": ["a"]}]])
+    with pytest.raises(ValueError):
+        RouteRule("x", 1, ROUTE_LINKS, [[{"contains": ["a"]}]])
+    with pytest.raises(ValueError):
+        Router([RouteRule("x", 1, ROUTE_SEARCH, [[{"regex": ["a"]}]])])
+
+
+def test_missing_rules_file_disables_routing(tmp_path):
+    assert load_router(str(tmp_path / "missing.json")).match("кабель knx") is None
+
+
+def test_project_rules_keep_special_cases():
+    router = load_router()
+    assert router.match("кабель knx").action == ROUTE_KNX_CABLE
+    assert router.match("документация knx").action == ROUTE_SEARCH
+    assert router.match("пришли техничку на кулплаг").action == ROUTE_LINKS
@@ -0,0 +1,80 @@
+import struct
+
+import numpy as np
+import pytest
+
+from bot.utils.phonetic import cyrillic_phonetic_keys
+from bot.utils.search_engine import SearchEngine
+from bot.utils.search_index import BINARY_INDEX_VERSION, SearchIndex
+from bot.utils.text_store import TextStore
+from bot.utils.token_index import INDEX_FIELDS
+
+FILES = [
+    {"name": "HDL-MR0810.433 Модуль реле.pdf", "path": "/HDL/Реле/HDL-MR0810.433 Модуль реле.pdf", "norm_name": "hdlmr0810433"},
+    {"name": "Coolplug manual.pdf", "path": "/Coolplug/Coolplug manual.pdf", "norm_name": "coolplugmanual"},
+    {"name": "EasyCool KNX.pdf", "path": "/EasyCool/EasyCool KNX.pdf", "norm_name": "easycoolknx"},
+]
+TEXTS = {
+    "/HDL/Реле/HDL-MR0810.433 Модуль реле.pdf": "Восьмиканальный модуль реле, нагрузка 10 А на канал",
+    "/Coolplug/Coolplug manual.pdf": "Подключение кондиционера к шине, адрес устройства",
+}
+
+
+@pytest.fixture
+def built(tmp_path) -> SearchIndex:
+    store = TextStore(str(tmp_path / "texts"))
+    for path, text in TEXTS.items():
+        store.save(path, text)
+    return SearchIndex.build(FILES, store)
+
+
+@pytest.fixture
+def opened(built, tmp_path) -> SearchIndex:
+    path = str(tmp_path / "file_index.bin")
+    built.write(path)
+    return SearchIndex.open(path)
+
+
+def test_documents_and_fields_survive_round_trip(built, opened):
+    assert len(opened) == len(FILES)
+    for doc_id, document in enumerate(FILES):
+        assert {field: opened.documents[doc_id][field] for field in INDEX_FIELDS} == document
+        assert opened.fields(doc_id) == built.fields(doc_id)
+
+
+def test_indexes_answer_the_same_after_round_trip(built, opened):
+    for word in ("реле", "coolplug", "knx", "нет такого"):
+        assert opened.token_index.docs_containing(word) == built.token_index.docs_containing(word)
+    queries = ["модуль реле", "coolplug"]
+    assert np.array_equal(opened.ngrams.similarity_batch(queries), built.ngrams.similarity_batch(queries))
+    assert opened.content is not None
+    assert np.array_equal(opened.content.scores(["реле", "шине"]), built.content.scores(["реле", "шине"]))
+    keys = cyrillic_phonetic_keys("изикул кулплаг")
+    assert opened.phonetic.matches(keys) == built.phonetic.matches(keys) == {1: 1, 2: 1}
+
+
+def test_search_results_match_built_index(built, opened, tmp_path):
+    index_file = str(tmp_path / "file_index.json")
+    from_json = SearchEngine(index_file, search_index=built)
+    from_binary = SearchEngine(index_file, search_index=opened)
+    for query in ("модуль реле", "coolplug manual", "изикул"):
+        assert from_binary.search(query) == from_json.search(query) != []
+
+
+def test_index_without_texts_has_no_content(tmp_path):
+    path = str(tmp_path / "file_index.bin")
+    SearchIndex.build(FILES).write(path)
+    assert SearchIndex.open(path).content is None
+
+
+def test_other_version_is_rejected(built, tmp_path):
+    path = tmp_path / "file_index.bin"
+    built.write(str(path))
+    data = bytearray(path.read_bytes())
+    struct.pack_into("<I", data, 8, BINARY_INDEX_VERSION - 1)
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        SearchIndex.open(str(path))
+    path.write_bytes(b"not an index" + bytes(32))
+    with pytest.raises(ValueError):
+        SearchIndex.open(str(path))
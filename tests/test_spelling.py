@@ -0,0 +1,82 @@
+import pytest
+
+from bot.utils.search_engine import SearchEngine
+from bot.utils.spelling import SpellChecker, edit_distance, without_stems
+
+FILES = [
+    {"name": "HDL-MR0810.433 Модуль реле.pdf", "path": "/HDL/Модули реле/HDL-MR0810.433 Модуль реле.pdf"},
+    {"name": "Coolplug manual.pdf", "path": "/Coolplug/Coolplug manual.pdf"},
+    {"name": "Технический паспорт Датчик MINI-HCS.pdf", "path": "/Датчики/Технический паспорт Датчик MINI-HCS.pdf"},
+    {"name": "Инструкция Zennio Z41.pdf", "path": "/Zennio/Инструкция Zennio Z41.pdf"},
+]
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory) -> SearchEngine:
+    return SearchEngine(str(tmp_path_factory.mktemp("index") / "file_index.json"), file_index=FILES)
+
+
+@pytest.fixture
+def checker() -> SpellChecker:
+    return SpellChecker.build(
+        ["HDL panel controller relay", "buspro panel"],
+        without_stems(["кабель", "кабел", "паспорт", "баспро", "баспр"]),
+    )
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("controler", "controller"),
+    ("pannel", "panel"),
+    ("паспрот", "паспорт"),
+    ("кабелл", "кабель"),
+    ("баспор", "баспро"),
+])
+def test_lookup_corrects_typos(checker, word, expected):
+    assert checker.lookup(word) == (expected, 1)
+
+
+def test_short_and_far_words_are_not_corrected(checker):
+    assert checker.lookup("рле") is None
+    assert checker.lookup("xyzzy") is None
+
+
+def test_correct_keeps_known_words_and_numbers(checker):
+    corrected, changed = checker.correct("Pannel HDL-MPL8 релле", known=lambda word: word == "релле")
+    assert corrected == "panel hdl-mpl8 релле"
+    assert changed
+    assert checker.correct("panel", known=lambda word: False) == ("panel", False)
+
+
+def test_word_forms_are_normalized_without_correction():
+    checker = SpellChecker.build([], ["инструкция", "техничка"])
+    assert checker.word_form("инструкцию") == "инструкция"
+    assert checker.word_form("модуль") is None
+    assert checker.correct("пришли техничку", known=lambda word: False) == ("пришли техничка", False)
+
+
+@pytest.mark.parametrize("query", [
+    "инструкцию",
+    "инструкции на датчик",
+    "пришли техничку на кулплаг",
+    "модуль",
+])
+def test_valid_words_get_no_suggestion(engine, query):
+    assert engine.spelling_suggestion(query) is None
+
+
+def test_typo_is_suggested_only_when_results_change(engine):
+    assert engine.spelling_suggestion("кулплак") == "кулплаг"
+    # «датчек» исправляется для поиска, но находит тот же файл, что и без исправления
+    assert engine.correct_query("датчек") == ("датчик", True)
+    assert engine.spelling_suggestion("датчек") is None
+
+
+def test_without_stems_drops_truncated_words():
+    assert without_stems(["баспр", "баспро", "кулплаг", "кулплагмануал", "кулплаг мануал"]) == [
+        "баспро", "кулплаг", "кулплагмануал",
+    ]
+
+
+def test_edit_distance_counts_transposition_once():
+    assert edit_distance("паспрот", "паспорт", 2) == 1
+    assert edit_distance("abc", "xyz", 1) == 2